@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import UploadedFile
+from .models import UploadedFile, Equipment, AlertRule
 
 @admin.register(UploadedFile)
 class UploadedFileAdmin(admin.ModelAdmin):
@@ -8,3 +8,17 @@ class UploadedFileAdmin(admin.ModelAdmin):
     search_fields = ['user__username', 'file']
     readonly_fields = ['uploaded_at', 'summary', 'processed_data']
     ordering = ['-uploaded_at']
+
+@admin.register(Equipment)
+class EquipmentAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'equipment_type', 'user', 'created_at']
+    list_filter = ['equipment_type', 'user']
+    search_fields = ['name', 'user__username']
+    ordering = ['name']
+
+@admin.register(AlertRule)
+class AlertRuleAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'user', 'severity', 'enabled', 'updated_at']
+    list_filter = ['severity', 'enabled', 'user']
+    search_fields = ['name', 'expression', 'user__username']
+    ordering = ['user', 'id']
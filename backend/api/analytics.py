@@ -0,0 +1,1243 @@
+"""
+Vectorized analytics shared by the upload view, the serializer recompute
+path and the comparison endpoints.
+
+Everything here works on whole columns (pandas/NumPy masks) rather than
+looping over rows, so cost grows linearly with the number of rows.
+"""
+import warnings
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from .instrumentation import span
+
+NUMERIC_COLUMNS = ['Flowrate', 'Pressure', 'Temperature']
+TEXT_COLUMNS = ['Equipment Name', 'Type']
+
+# A numeric column to analyse: its unit, optional per-parameter threshold
+# overrides (None = the user's setting) and the physically possible range
+# (None = unbounded, only used by the data-quality profile). See
+# api.parameters for the schema.
+Parameter = namedtuple(
+    'Parameter', 'name unit required warning_percentile outlier_iqr_multiplier physical_min physical_max',
+    defaults=('', True, None, None, None, None),
+)
+# Flow can't be negative and nothing is colder than absolute zero (deg C)
+PHYSICAL_RANGES = {'Flowrate': {'physical_min': 0.0}, 'Temperature': {'physical_min': -273.15}}
+DEFAULT_PARAMETERS = [Parameter(col, **PHYSICAL_RANGES.get(col, {})) for col in NUMERIC_COLUMNS]
+THRESHOLD_KEYS = ('warning_percentile', 'outlier_iqr_multiplier')
+
+# Rejected rows listed individually in a validation report; the rest are only counted
+VALIDATION_ERROR_LIMIT = 100
+
+HEALTH_COLORS = {
+    'normal': '#10b981',    # green
+    'warning': '#f59e0b',   # yellow
+    'critical': '#ef4444',  # red
+}
+
+HEALTH_LEVELS = ['normal', 'warning', 'critical']
+
+
+def _float_or(value, default=None):
+    """Plain float, or `default` for NaN (which is not valid JSON)."""
+    return default if pd.isna(value) else float(value)
+
+
+def validate_rows(df, columns=NUMERIC_COLUMNS, limit=VALIDATION_ERROR_LIMIT, timestamp=None, optional=()):
+    """
+    Stage 0: coerce the numeric columns (and the `timestamp` column, if
+    any, to UTC datetimes) and set aside rows that can't be analysed, using
+    whole-column masks. A row is rejected when a required value is missing,
+    a numeric cell isn't a number or a timestamp doesn't parse, or it
+    repeats an earlier row exactly. `optional` numeric columns are coerced
+    too, but may be left empty.
+
+    Returns (valid_df, report). `report` has per-reason row counts and the
+    first `limit` rejected rows with their CSV line numbers and reasons.
+    """
+    coerced = {}
+    problems = {}
+    optional = list(optional)
+    for col in TEXT_COLUMNS + list(columns) + optional + ([timestamp] if timestamp else []):
+        missing = df[col].isna()
+        if col not in optional:
+            problems[('missing', col)] = missing.to_numpy()
+        if col == timestamp:
+            coerced[col] = pd.to_datetime(df[col], errors='coerce', utc=True)
+            problems[('invalid', col)] = (coerced[col].isna() & ~missing).to_numpy()
+        elif col not in TEXT_COLUMNS and not pd.api.types.is_numeric_dtype(df[col]):
+            coerced[col] = pd.to_numeric(df[col], errors='coerce')
+            problems[('invalid', col)] = (coerced[col].isna() & ~missing).to_numpy()
+    raw, df = df, (df.assign(**coerced) if coerced else df)
+    problems[('duplicate', None)] = df.duplicated(keep='first').to_numpy()
+
+    masks = np.column_stack(list(problems.values()))
+    rejected = masks.any(axis=1)
+    counts = {'missing': 0, 'invalid': 0, 'duplicate': 0}
+    for kind in counts:
+        kind_columns = [i for i, (k, _) in enumerate(problems) if k == kind]
+        if kind_columns:
+            counts[kind] = int(masks[:, kind_columns].any(axis=1).sum())
+
+    positions = np.flatnonzero(rejected)
+    errors = []
+    for pos in positions[:limit].tolist():
+        reasons = []
+        for (kind, col), hit in zip(problems, masks[pos].tolist()):
+            if not hit:
+                continue
+            if kind == 'invalid':
+                reasons.append(f"invalid {col}: {str(raw[col].iat[pos])!r}")
+            elif kind == 'missing':
+                reasons.append(f"missing {col}")
+            else:
+                reasons.append("duplicate row")
+        name = df['Equipment Name'].iat[pos]
+        errors.append({
+            'row': pos + 2,  # 1-based CSV line number, after the header
+            'equipment': None if pd.isna(name) else str(name),
+            'reasons': reasons,
+        })
+
+    report = {
+        'total_rows': int(len(df)),
+        'valid_rows': int(len(df) - len(positions)),
+        'rejected_rows': int(len(positions)),
+        'counts': counts,
+        'errors': errors,
+        'errors_truncated': len(positions) > limit,
+    }
+    if len(positions):
+        df = df.loc[~rejected].reset_index(drop=True)
+    return df, report
+
+
+# Repeated equipment names listed by name in a data-quality profile
+QUALITY_EXAMPLE_LIMIT = 5
+# Rows checked for a second distinct value before a full constant-column scan
+QUALITY_HEAD_ROWS = 1000
+
+
+def _is_constant(series):
+    """Whether a column holds a single distinct non-null value; most columns vary within the first rows."""
+    if series.iloc[:QUALITY_HEAD_ROWS].nunique() > 1:
+        return False
+    values = series.dropna()
+    return bool(len(values)) and bool((values == values.iat[0]).all())
+
+
+def data_quality(df, parameters=DEFAULT_PARAMETERS):
+    """
+    Profile of the parsed CSV before any row is set aside.
+
+    Every column gets its dtype, null count and whether it is constant.
+    Parameters also get the cells that aren't numbers, zeros, negatives,
+    readings outside their physical range and frozen readings (equal to
+    the previous reading of the same equipment, in file order). These are
+    reductions over one (rows x parameters) matrix. Equipment names that
+    appear on more than one row are counted too; in time-series uploads
+    that is expected.
+    """
+    n = len(df)
+    nulls = df.isna().sum().to_dict()
+    parameters = [p for p in parameters if p.name in df.columns]
+    columns = [p.name for p in parameters]
+
+    non_numeric = np.zeros(len(columns), dtype=np.int64)
+    X = np.empty((n, len(columns)))
+    for j, col in enumerate(columns):
+        if pd.api.types.is_numeric_dtype(df[col]):
+            X[:, j] = df[col].to_numpy(dtype=float)
+        else:
+            coerced = pd.to_numeric(df[col], errors='coerce')
+            non_numeric[j] = int((coerced.isna() & df[col].notna()).sum())
+            X[:, j] = coerced.to_numpy(dtype=float)
+
+    low = np.array([-np.inf if p.physical_min is None else p.physical_min for p in parameters])
+    high = np.array([np.inf if p.physical_max is None else p.physical_max for p in parameters])
+    present = ~np.isnan(X)
+    counts = {
+        'non_numeric': non_numeric,
+        'zeros': (X == 0).sum(axis=0),
+        'negatives': (X < 0).sum(axis=0),
+        'out_of_range': ((X < low) | (X > high)).sum(axis=0),
+    }
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # all-NaN columns
+        constant = (np.fmin.reduce(X, axis=0) == np.fmax.reduce(X, axis=0)) if n else np.zeros(len(columns), dtype=bool)
+
+    # Frozen readings: consecutive rows of the same equipment, grouped with a stable sort
+    codes, uniques = pd.factorize(df['Equipment Name']) if 'Equipment Name' in df.columns else (np.full(n, -1), [])
+    frozen = np.zeros(len(columns), dtype=np.int64)
+    if len(uniques) < n:
+        order = np.argsort(codes, kind='stable')
+        same = (codes[order][1:] == codes[order][:-1]) & (codes[order][1:] >= 0)
+        Xs = X[order]
+        frozen = ((Xs[1:] == Xs[:-1]) & same[:, None]).sum(axis=0)
+    counts['frozen'] = frozen
+
+    profile = {}
+    for col in df.columns:
+        entry = {'dtype': str(df[col].dtype), 'nulls': int(nulls[col])}
+        if col in columns:
+            j = columns.index(col)
+            entry.update({key: int(values[j]) for key, values in counts.items()})
+            entry['physical_range'] = [parameters[j].physical_min, parameters[j].physical_max]
+            entry['constant'] = bool(constant[j] and present[:, j].any())
+        else:
+            entry['constant'] = _is_constant(df[col])
+        profile[col] = entry
+
+    repeats = np.bincount(codes[codes >= 0], minlength=len(uniques)) if n else np.zeros(0, dtype=np.int64)
+    repeated = np.flatnonzero(repeats > 1)
+    return {
+        'rows': n,
+        'columns': profile,
+        'constant_columns': [col for col, entry in profile.items() if entry['constant']],
+        'duplicate_names': {
+            'names': int(len(repeated)),
+            'rows': int(repeats[repeated].sum()),
+            'examples': [str(uniques[i]) for i in repeated[:QUALITY_EXAMPLE_LIMIT].tolist()],
+        },
+        'totals': {
+            'nulls': int(sum(nulls.values())),
+            **{key: int(values.sum()) for key, values in counts.items()},
+        },
+    }
+
+
+# Column names (case-insensitive) that can switch an upload into time-series mode
+TIMESTAMP_COLUMNS = ('timestamp', 'datetime', 'time', 'date', 'recorded_at')
+
+# Values checked when deciding whether a candidate column holds timestamps
+TIMESTAMP_SAMPLE_SIZE = 1000
+
+# Candidate bucket sizes for resampled aggregates, smallest first
+RESAMPLE_FREQUENCIES = ['1min', '5min', '15min', '1h', '6h', '1D', '7D', '30D']
+
+
+def timestamp_column(df, column=None, min_parsed=0.9):
+    """
+    The reading-timestamp column of `df`, or None.
+
+    With `column` (the TIMESERIES_COLUMN setting) only that column is used,
+    if present. Otherwise the first column named like TIMESTAMP_COLUMNS
+    whose values are mostly dates: at least `min_parsed` of up to
+    TIMESTAMP_SAMPLE_SIZE evenly spaced non-empty values must parse.
+    Numeric columns never qualify, so a `Time` column of elapsed seconds
+    or a `Date` of shift numbers stays an ordinary column.
+    """
+    if column:
+        return column if column in df.columns else None
+    for col in df.columns:
+        if str(col).strip().lower() not in TIMESTAMP_COLUMNS or pd.api.types.is_numeric_dtype(df[col]):
+            continue
+        values = df[col].dropna()
+        if values.empty:
+            continue
+        sample = values.iloc[::max(len(values) // TIMESTAMP_SAMPLE_SIZE, 1)]
+        parsed = pd.to_datetime(sample, errors='coerce', utc=True).notna().mean()
+        if parsed >= min_parsed:
+            return col
+    return None
+
+
+def resample_frequency(start, end, max_points):
+    """Smallest RESAMPLE_FREQUENCIES bucket that covers start..end in at most `max_points` buckets."""
+    span = end - start
+    for freq in RESAMPLE_FREQUENCIES:
+        if span / pd.Timedelta(freq) < max_points:
+            return freq
+    return RESAMPLE_FREQUENCIES[-1]
+
+
+def timeseries_snapshot(df, timestamp, window='1h', max_points=500, columns=NUMERIC_COLUMNS):
+    """
+    Time-series mode for exports with many readings per equipment.
+
+    Each equipment's latest window is the readings within `window` of its
+    last timestamp (the trailing rolling window at its latest reading).
+    The rows are collapsed into one row per equipment, typed by its latest
+    reading (a retyped tag takes its current type), and the rest of the
+    analysis judges health on that. Each row holds the window mean per
+    parameter (under the parameter's own name), its std, and its rate of
+    change per hour (least-squares slope). All of it comes from grouped
+    sums over integer equipment codes. Only the in-window rows are copied,
+    and nothing is sorted, so memory stays proportional to the input.
+
+    Fleet-wide means are also resampled into at most `max_points` buckets.
+    Returns (snapshot_df, summary).
+    """
+    codes, _ = pd.factorize(df['Equipment Name'], sort=False)
+    t = df[timestamp].dt.tz_convert(None).to_numpy().astype('datetime64[ns]').astype('int64')
+    last = pd.Series(t).groupby(codes).transform('max').to_numpy()
+    in_window = t > last - pd.Timedelta(window).value
+    window_codes = codes[in_window]
+
+    # Hours before the equipment's last reading (<= 0), plus the per-column products for the slope
+    hours = (t[in_window] - last[in_window]) / 3.6e12
+    values = df.loc[in_window, columns].to_numpy(dtype=float)
+    parts = {'n': np.ones(len(hours)), 't': hours, 'tt': hours * hours}
+    # Columns with empty cells (optional parameters) get their own count and time sums
+    gaps = [j for j in range(len(columns)) if not np.isfinite(values[:, j]).all()]
+    for j in gaps:
+        present = np.isfinite(values[:, j])
+        parts[f'n{j}'] = present.astype(float)
+        parts[f't{j}'] = np.where(present, hours, 0.0)
+        parts[f'tt{j}'] = np.where(present, hours * hours, 0.0)
+        values[:, j] = np.where(present, values[:, j], 0.0)
+    for j, col in enumerate(columns):
+        parts[f'x{j}'] = values[:, j]
+        parts[f'xx{j}'] = values[:, j] * values[:, j]
+        parts[f'tx{j}'] = hours * values[:, j]
+    sums = pd.DataFrame(parts).groupby(window_codes, sort=True).sum()
+
+    n = sums['n'].to_numpy()
+    # Each equipment's latest reading (the last one in the file on a tie), in code order
+    latest = np.flatnonzero(t == last)
+    latest_rows = pd.Series(latest).groupby(codes[latest], sort=True).last().to_numpy()
+    snapshot = pd.DataFrame({
+        'Equipment Name': df['Equipment Name'].to_numpy()[latest_rows],
+        'Type': df['Type'].to_numpy()[latest_rows],
+    })
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for j, col in enumerate(columns):
+            key = j if j in gaps else ''
+            cn, ct, ctt = (sums[f'{part}{key}'].to_numpy() for part in ('n', 't', 'tt'))
+            t_var = cn * ctt - ct ** 2
+            total, sumsq = sums[f'x{j}'].to_numpy(), sums[f'xx{j}'].to_numpy()
+            snapshot[col] = total / cn
+            variance = (sumsq - total * total / cn) / (cn - 1)
+            snapshot[f'{col} Std'] = np.where(cn > 1, np.sqrt(np.clip(variance, 0.0, None)), np.where(cn > 0, 0.0, np.nan))
+            slope = (cn * sums[f'tx{j}'].to_numpy() - ct * total) / t_var
+            snapshot[f'{col} Rate/h'] = np.where(t_var > 0, slope, 0.0)
+    last_seen = pd.to_datetime(last[latest_rows], utc=True)
+    snapshot['Last Reading'] = last_seen.strftime('%Y-%m-%dT%H:%M:%SZ')
+    snapshot['Readings'] = np.bincount(codes)
+    snapshot['Window Readings'] = n.astype(int)
+
+    # Fleet-wide resample: integer bucket codes + bincount, no sort
+    start, end = pd.Timestamp(t.min(), tz='UTC'), pd.Timestamp(t.max(), tz='UTC')
+    freq = resample_frequency(start, end, max_points)
+    origin = start.floor(freq)
+    bucket = (t - origin.value) // pd.Timedelta(freq).value
+    counts = np.bincount(bucket)
+    filled = np.flatnonzero(counts)
+    all_values = df[columns].to_numpy(dtype=float)
+    present = np.isfinite(all_values)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = [
+            np.bincount(bucket, weights=np.where(present[:, j], all_values[:, j], 0.0))[filled]
+            / np.bincount(bucket, weights=present[:, j])[filled]
+            for j in range(len(columns))
+        ]
+    periods = origin + pd.to_timedelta(filled * pd.Timedelta(freq).value, unit='ns')
+    resampled = []
+    for i, (period, count) in enumerate(zip(periods, counts[filled].tolist())):
+        point = {'period': period.isoformat(), 'count': count}
+        for j, col in enumerate(columns):
+            point[col] = _float_or(means[j][i])
+        resampled.append(point)
+
+    summary = {
+        'timestamp_column': str(timestamp),
+        'window': window,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'readings': int(len(df)),
+        'equipment': int(len(snapshot)),
+        'resample_freq': freq,
+        'resampled': resampled,
+    }
+    return snapshot, summary
+
+
+def column_stats(df, columns=NUMERIC_COLUMNS):
+    """
+    Count, mean, min, max and sample std of every column as arrays, from
+    NumPy reductions over the (rows x columns) matrix; the NaN-skipping
+    variants only run when some column has gaps. A single reading has no
+    spread, so its std is 0.0; an empty column is NaN throughout.
+    """
+    X = df[columns].to_numpy(dtype=float)
+    count = len(X) - np.isnan(X).sum(axis=0)
+    if not len(X):
+        nan = np.full(len(columns), np.nan)
+        return {'count': count, 'mean': nan, 'min': nan, 'max': nan, 'std': nan}
+    with np.errstate(divide='ignore', invalid='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # all-NaN columns / single readings
+        if (count == len(X)).all():
+            mean, low, high = X.mean(axis=0), X.min(axis=0), X.max(axis=0)
+            std = X.std(axis=0, ddof=1)
+        else:
+            mean, low, high = np.nanmean(X, axis=0), np.nanmin(X, axis=0), np.nanmax(X, axis=0)
+            std = np.nanstd(X, axis=0, ddof=1)
+    std = np.where(count == 1, 0.0, std)
+    return {'count': count, 'mean': mean, 'min': low, 'max': high, 'std': std}
+
+
+def basic_stats(df, columns=NUMERIC_COLUMNS):
+    """
+    Stage 1: count, mean/min/max/std per numeric column and the type
+    distribution. All aggregates come from one pass over the column matrix
+    (column_stats), kept as flat avg_/min_/max_/std_<column> keys.
+    """
+    described = column_stats(df, columns)
+    stats = {"total_count": int(len(df))}
+    for j, col in enumerate(columns):
+        stats[f"avg_{col.lower()}"] = _float_or(described['mean'][j])
+    for j, col in enumerate(columns):
+        stats[f"min_{col.lower()}"] = _float_or(described['min'][j])
+        stats[f"max_{col.lower()}"] = _float_or(described['max'][j])
+        stats[f"std_{col.lower()}"] = _float_or(described['std'][j], 0.0)
+    stats["type_distribution"] = {str(k): int(v) for k, v in df['Type'].value_counts().items()}
+    return stats, described
+
+
+def parameter_summary(parameters, described):
+    """
+    summary['parameters']: one entry per analysed column with its unit,
+    threshold overrides and stats, so the format holds any number of them.
+    """
+    entries = []
+    for j, parameter in enumerate(parameters):
+        entries.append({
+            'name': parameter.name,
+            'unit': parameter.unit,
+            'required': parameter.required,
+            'overrides': {key: getattr(parameter, key) for key in THRESHOLD_KEYS if getattr(parameter, key) is not None},
+            'count': int(described['count'][j]),
+            'mean': _float_or(described['mean'][j]),
+            'min': _float_or(described['min'][j]),
+            'max': _float_or(described['max'][j]),
+            'std': _float_or(described['std'][j], 0.0),
+        })
+    return entries
+
+
+def threshold_overrides(parameters):
+    """{column: {threshold key: value}} for the parameters that override a threshold."""
+    overrides = {}
+    for parameter in parameters:
+        values = {key: getattr(parameter, key) for key in THRESHOLD_KEYS if getattr(parameter, key) is not None}
+        if values:
+            overrides[parameter.name] = values
+    return overrides
+
+
+def per_column(value, columns, overrides, key):
+    """A threshold as a per-column array: `value`, except where `overrides` sets `key`."""
+    overrides = overrides or {}
+    return np.array([overrides.get(col, {}).get(key, value) for col in columns], dtype=float)
+
+
+def type_comparison(df, columns=NUMERIC_COLUMNS):
+    """Stage 2: count and mean per equipment type, in order of first appearance."""
+    grouped = df.groupby('Type', sort=False)[columns]
+    means = grouped.mean()
+    counts = grouped.size()
+    comparison = {}
+    for eq_type in means.index:
+        entry = {"count": int(counts[eq_type])}
+        for col in columns:
+            entry[f"avg_{col.lower()}"] = _float_or(means.at[eq_type, col])
+        comparison[str(eq_type)] = entry
+    return comparison
+
+
+def correlation_matrix(df, columns=NUMERIC_COLUMNS):
+    """
+    Stage 3: Pearson correlation between the numeric columns.
+    Undefined correlations (single row, constant column) are stored as 0.0.
+    """
+    return df[columns].corr().fillna(0.0).to_dict()
+
+
+DETECTION_MODES = ('iqr', 'mahalanobis', 'robust_z')
+
+# Normal-distribution constants: quartiles sit at z = ±0.6745 and IQR = 1.349 sigma
+QUARTILE_Z = 0.6745
+IQR_SIGMAS = 1.349
+
+# Robust covariance is fitted on at most this many rows, with at most this many C-steps
+MCD_SAMPLE_SIZE = 100_000
+MCD_MAX_STEPS = 20
+
+
+def fence_z(iqr_multiplier):
+    """z-score of the IQR fence Q3 + multiplier * IQR for normal data (1.5 -> 2.70)."""
+    return QUARTILE_Z + IQR_SIGMAS * iqr_multiplier
+
+
+def chi2_quantile(z, dof):
+    """Wilson-Hilferty approximation of the chi-square quantile at standard normal `z`."""
+    c = 2.0 / (9.0 * dof)
+    return dof * (1.0 - c + z * np.sqrt(c)) ** 3
+
+
+def mahalanobis_cutoff(iqr_multiplier, dof):
+    """Mahalanobis distance cutoff at the z of the IQR fence (chi-square, `dof` columns)."""
+    return np.sqrt(chi2_quantile(fence_z(iqr_multiplier), dof))
+
+
+def outlier_fences(mode, iqr_multiplier, a, b):
+    """
+    (lower, upper) fences from the group statistics: (a, b) = (Q1, Q3) for
+    'iqr', (median, MAD) for 'robust_z'. outlier_bounds and critical_scores
+    both go through here, so their fences round identically.
+    """
+    if mode == 'robust_z':
+        spread = fence_z(iqr_multiplier) * b / QUARTILE_Z
+        return a - spread, a + spread
+    return a - iqr_multiplier * (b - a), b + iqr_multiplier * (b - a)
+
+
+def mahalanobis_sq(X, location, covariance):
+    """Squared Mahalanobis distance of every row of X, in one matrix product."""
+    diff = X - location
+    return np.einsum('ij,ij->i', diff @ np.linalg.pinv(covariance), diff)
+
+
+def robust_covariance(X, sample_size=MCD_SAMPLE_SIZE, max_steps=MCD_MAX_STEPS, seed=0):
+    """
+    Minimum covariance determinant estimate of (location, covariance) by C-steps.
+
+    Starts from the half of the rows closest to the coordinate-wise median
+    (in MAD units), then refits mean and covariance on the h rows with the
+    smallest distances until that subset stops changing. Large inputs are
+    fitted on a fixed-seed sample. The covariance is rescaled so the median
+    distance matches the chi-square median (consistency under normality).
+    """
+    n, p = X.shape
+    if n > sample_size:
+        X = X[np.random.default_rng(seed).choice(n, sample_size, replace=False)]
+        n = sample_size
+    h = (n + p + 1) // 2
+
+    median = np.median(X, axis=0)
+    mad = np.median(np.abs(X - median), axis=0)
+    scale = np.where(mad > 0, mad / QUARTILE_Z, 1.0)
+    d2 = (((X - median) / scale) ** 2).sum(axis=1)
+    subset = np.zeros(n, dtype=bool)
+    subset[np.argpartition(d2, h - 1)[:h]] = True
+
+    for _ in range(max_steps):
+        location = X[subset].mean(axis=0)
+        covariance = np.atleast_2d(np.cov(X[subset], rowvar=False))
+        d2 = mahalanobis_sq(X, location, covariance)
+        refit = np.zeros(n, dtype=bool)
+        refit[np.argpartition(d2, h - 1)[:h]] = True
+        if np.array_equal(refit, subset):
+            break
+        subset = refit
+
+    median_d2 = np.median(d2)
+    if median_d2 > 0:
+        covariance = covariance * (median_d2 / chi2_quantile(0.0, p))
+    return location, covariance
+
+
+GroupBounds = namedtuple('GroupBounds', 'codes labels lower upper')
+GroupBounds.__doc__ = """
+Per-group limits: `codes` maps each row to a group, `labels` names the
+groups and `lower` / `upper` are (groups x columns) arrays (None if unused).
+"""
+
+
+def type_groups(df, per_type=False):
+    """
+    (codes, labels) for grouping rows: the `Type` values in order of first
+    appearance with `per_type`, otherwise one pooled group labelled 'all'.
+    """
+    if not per_type:
+        return np.zeros(len(df), dtype=np.intp), ['all']
+    codes, labels = pd.factorize(df['Type'], use_na_sentinel=False)
+    return codes, [str(label) for label in labels]
+
+
+def grouped_quantiles(X, codes, n_groups, qs):
+    """
+    Quantiles `qs` of every column within every group from a single grouped
+    quantile call (NaN skipped). Returns an array shaped (len(qs), groups, columns).
+    """
+    if n_groups == 1:
+        return np.nanquantile(X, qs, axis=0)[:, None, :]
+    values = pd.DataFrame(X).groupby(codes, sort=True).quantile(qs).to_numpy()
+    return values.reshape(n_groups, len(qs), X.shape[1]).transpose(1, 0, 2)
+
+
+def outlier_bounds(df, iqr_multiplier, columns=NUMERIC_COLUMNS, mode='iqr', per_type=False):
+    """
+    Outlier fences for the per-column modes, pooled or per `Type`:
+    Q1 - k*IQR .. Q3 + k*IQR for 'iqr', median +/- z * 1.4826 * MAD for
+    'robust_z'. `iqr_multiplier` may be one k per column. Returns GroupBounds.
+    """
+    X = df[columns].to_numpy(dtype=float)
+    codes, labels = type_groups(df, per_type)
+    return GroupBounds(codes, labels, *outlier_fences(mode, iqr_multiplier, *fence_statistics(X, codes, len(labels), mode)))
+
+
+def fence_statistics(X, codes, n_groups, mode):
+    """The per-group (a, b) outlier_fences takes: (median, MAD) for 'robust_z', else (Q1, Q3)."""
+    if mode == 'robust_z':
+        (median,) = grouped_quantiles(X, codes, n_groups, [0.5])
+        (mad,) = grouped_quantiles(np.abs(X - median[codes]), codes, n_groups, [0.5])
+        return median, mad
+    q1, q3 = grouped_quantiles(X, codes, n_groups, [0.25, 0.75])
+    return q1, q3
+
+
+def warning_bounds(df, warning_percentile, columns=NUMERIC_COLUMNS, per_type=False):
+    """
+    Warning thresholds (the `warning_percentile` quantile) as GroupBounds.upper.
+    `warning_percentile` may be one value per column; each distinct value is
+    one more quantile in the same grouped call.
+    """
+    X = df[columns].to_numpy(dtype=float)
+    codes, labels = type_groups(df, per_type)
+    percentiles = np.broadcast_to(np.asarray(warning_percentile, dtype=float), (len(columns),))
+    qs, which = np.unique(percentiles, return_inverse=True)
+    quantiles = grouped_quantiles(X, codes, len(labels), qs)
+    upper = quantiles[which, :, np.arange(len(columns))].T
+    return GroupBounds(codes, labels, None, upper)
+
+
+def _outlier_entries(names, hits, values, parameters, bounds):
+    """
+    Outlier list from a 2-D hit mask: one entry per equipment name, with one
+    parameter item per hit (and the bounds of its group), in column-then-row order.
+    """
+    outliers = {}
+    for j, parameter in enumerate(parameters):
+        rows = np.flatnonzero(hits[:, j])
+        groups = bounds.codes[rows]
+        for name, value, lower, upper in zip(
+            names[rows].tolist(), values[rows, j].tolist(),
+            bounds.lower[groups, j].tolist(), bounds.upper[groups, j].tolist(),
+        ):
+            entry = outliers.setdefault(name, {'equipment': name, 'parameters': []})
+            entry['parameters'].append({
+                'parameter': parameter,
+                'value': float(value),
+                'lower_bound': lower,
+                'upper_bound': upper,
+            })
+    return list(outliers.values())
+
+
+def detect_outliers(df, iqr_multiplier, columns=NUMERIC_COLUMNS, mode='iqr', per_type=False, bounds=None):
+    """
+    Outlier detection over all numeric columns at once.
+
+    - 'iqr': values outside Q1 - k*IQR .. Q3 + k*IQR, per column.
+    - 'robust_z': values whose MAD-based robust z-score exceeds the z of the
+      IQR fence, per column (median +/- z * 1.4826 * MAD).
+    - 'mahalanobis': rows whose robust Mahalanobis distance across all the
+      columns exceeds the chi-square cutoff at that same z, reported as a
+      single 'mahalanobis' parameter.
+
+    k is `iqr_multiplier` in every mode, so one setting means the same
+    sensitivity whichever mode is picked (per-column overrides apply to
+    the per-column modes; pass them in through `bounds`). With `per_type` the per-column
+    fences are computed within each equipment `Type` (`bounds` may pass in
+    precomputed outlier_bounds); the multivariate fit stays pooled.
+    Returns a list of {'equipment', 'parameters': [...]} entries, one per
+    equipment name, in the order the outliers were first found.
+    """
+    X = df[columns].to_numpy(dtype=float)
+    names = df['Equipment Name'].to_numpy()
+    if not len(X):
+        return []
+
+    if mode == 'mahalanobis':
+        finite = np.isfinite(X).all(axis=1)
+        if finite.sum() <= len(columns):
+            return []
+        location, covariance = robust_covariance(X[finite])
+        distance = np.sqrt(mahalanobis_sq(X, location, covariance))
+        cutoff = mahalanobis_cutoff(iqr_multiplier, len(columns))
+        with np.errstate(invalid='ignore'):
+            hits = (distance > cutoff)[:, None]
+        pooled = GroupBounds(np.zeros(len(X), dtype=np.intp), ['all'], np.zeros((1, 1)), np.full((1, 1), cutoff))
+        return _outlier_entries(names, hits, distance[:, None], ['mahalanobis'], pooled)
+
+    if bounds is None:
+        bounds = outlier_bounds(df, iqr_multiplier, columns, mode, per_type)
+    lower, upper = bounds.lower, bounds.upper
+    if len(bounds.labels) > 1:
+        lower, upper = lower[bounds.codes], upper[bounds.codes]
+    with np.errstate(invalid='ignore'):
+        hits = (X < lower) | (X > upper)
+    return _outlier_entries(names, hits, X, columns, bounds)
+
+
+def classify_health(df, outliers, warning_percentile, columns=NUMERIC_COLUMNS, per_type=False, thresholds=None):
+    """
+    Health status per row as a NumPy array of 'normal' / 'warning' / 'critical'.
+
+    Critical: the equipment name has any outlier parameter.
+    Warning: any parameter above the warning percentile of its column
+    (within the row's `Type` when `per_type`; `thresholds` may pass in
+    precomputed warning_bounds).
+    """
+    outlier_names = {o['equipment'] for o in outliers}
+    critical = df['Equipment Name'].isin(outlier_names).to_numpy()
+    if thresholds is None:
+        thresholds = warning_bounds(df, warning_percentile, columns, per_type)
+    limits = thresholds.upper[thresholds.codes] if len(thresholds.labels) > 1 else thresholds.upper
+    with np.errstate(invalid='ignore'):
+        warning = (df[columns].to_numpy(dtype=float) > limits).any(axis=1)
+    return np.where(critical, 'critical', np.where(warning, 'warning', 'normal'))
+
+
+def bounds_summary(fences, thresholds, per_type=False, columns=NUMERIC_COLUMNS):
+    """
+    Stored form of the limits an upload was judged by:
+    {'per_type', 'groups': {type or 'all': {column: {'lower', 'upper', 'warning'}}}}.
+    `fences` is None in the multivariate mode.
+    """
+    groups = {}
+    for g, label in enumerate(thresholds.labels):
+        groups[label] = {
+            col: {
+                'lower': None if fences is None else _float_or(fences.lower[g, j]),
+                'upper': None if fences is None else _float_or(fences.upper[g, j]),
+                'warning': _float_or(thresholds.upper[g, j]),
+            }
+            for j, col in enumerate(columns)
+        }
+    return {'per_type': per_type, 'groups': groups}
+
+
+def judge(df, warning_percentile, iqr_multiplier, mode='iqr', per_type=False, columns=NUMERIC_COLUMNS, overrides=None):
+    """
+    Outliers, per-row health statuses and the bounds summary for a frame,
+    computing each set of grouped quantiles once. `overrides` maps a column
+    to its own warning_percentile / outlier_iqr_multiplier.
+    """
+    fences = None
+    if mode != 'mahalanobis':
+        multipliers = per_column(iqr_multiplier, columns, overrides, 'outlier_iqr_multiplier')
+        fences = outlier_bounds(df, multipliers, columns, mode, per_type)
+    outliers = detect_outliers(df, iqr_multiplier, columns, mode, per_type, bounds=fences)
+    percentiles = per_column(warning_percentile, columns, overrides, 'warning_percentile')
+    thresholds = warning_bounds(df, percentiles, columns, per_type)
+    statuses = classify_health(df, outliers, warning_percentile, columns, thresholds=thresholds)
+    return outliers, statuses, bounds_summary(fences, thresholds, per_type, columns)
+
+
+def health_records(df, warning_percentile, iqr_multiplier, mode='iqr', per_type=False, columns=NUMERIC_COLUMNS, overrides=None):
+    """
+    Run outlier detection and health classification on a frame.
+    Returns (outliers, records, bounds) where records are the rows as dicts
+    with `health_status` and `health_color` added.
+    """
+    outliers, statuses, bounds = judge(df, warning_percentile, iqr_multiplier, mode, per_type, columns, overrides)
+    return outliers, _with_health(df, statuses), bounds
+
+
+# Largest finite double as an int64 bit pattern; non-negative doubles sort like their bits
+MAX_FLOAT_BITS = int(np.array(np.finfo(float).max).view(np.int64))
+
+
+def crossing_multipliers(trips, estimate):
+    """
+    Exact threshold of a fence test per cell: `trips(m, cells)` tells
+    whether each of `cells` is outside its fences at multiplier(s) m, and
+    holds for every m below some point and for none from it on. Returns the
+    smallest m >= 0 at which each cell stops tripping (-inf if it never
+    trips, +inf if it trips at every finite m), so `score > m` is exactly
+    `trips(m)` for any m >= 0.
+
+    Searches the bit patterns of non-negative doubles: one probe at the
+    `estimate`, then galloping away from it until the test flips, then
+    bisection. A close estimate settles a cell in a few probes.
+    """
+    n = len(estimate)
+    scores = np.full(n, -np.inf)
+    cells = np.flatnonzero(trips(np.zeros(n), np.arange(n)))
+    always = trips(np.full(len(cells), np.finfo(float).max), cells)
+    scores[cells[always]] = np.inf
+    cells = cells[~always]
+
+    # Invariant: trips at `lo`, not at `hi` (bit patterns)
+    lo = np.zeros(len(cells), dtype=np.int64)
+    hi = np.full(len(cells), MAX_FLOAT_BITS, dtype=np.int64)
+    guess = np.nan_to_num(estimate[cells], nan=0.0, posinf=np.finfo(float).max, neginf=0.0)
+    guess = np.clip(guess, 0.0, np.finfo(float).max).view(np.int64)
+    up = trips(guess.view(np.float64), cells)
+    lo = np.where(up, guess, lo)
+    hi = np.where(up, hi, guess)
+
+    step = 1
+    galloping = np.flatnonzero(hi - lo > 1)
+    while len(galloping):
+        g, direction = guess[galloping], up[galloping]
+        probe = np.where(direction, g + np.minimum(step, hi[galloping] - g), g - np.minimum(step, g - lo[galloping]))
+        inside = (probe > lo[galloping]) & (probe < hi[galloping])
+        galloping, probe, direction = galloping[inside], probe[inside], direction[inside]
+        hit = trips(probe.view(np.float64), cells[galloping])
+        lo[galloping] = np.where(hit, probe, lo[galloping])
+        hi[galloping] = np.where(hit, hi[galloping], probe)
+        galloping = galloping[hit == direction]
+        step *= 2
+
+    pending = np.flatnonzero(hi - lo > 1)
+    while len(pending):
+        mid = lo[pending] + (hi[pending] - lo[pending]) // 2
+        hit = trips(mid.view(np.float64), cells[pending])
+        lo[pending] = np.where(hit, mid, lo[pending])
+        hi[pending] = np.where(hit, hi[pending], mid)
+        pending = pending[hi[pending] - lo[pending] > 1]
+
+    scores[cells] = hi.view(np.float64)
+    return scores
+
+
+def critical_scores(df, columns=NUMERIC_COLUMNS, mode='iqr', per_type=False, overrides=None):
+    """
+    Per-row score that reduces the critical test to one comparison: the
+    row's equipment is critical for exactly the iqr_multipliers below it
+    (max over its columns and over rows sharing its name), in every
+    detection mode. The fences are the ones judge() builds
+    (outlier_fences, mahalanobis_cutoff), so the comparison agrees with it
+    to the last bit, fence-hitting values included.
+
+    A column with an overridden multiplier doesn't follow the swept value:
+    its score is +inf where it trips its own fence and -inf elsewhere.
+    """
+    X = df[columns].to_numpy(dtype=float)
+    codes, labels = type_groups(df, per_type)
+
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        if mode == 'mahalanobis':
+            critical = np.full(len(X), -np.inf)
+            finite = np.isfinite(X).all(axis=1)
+            if finite.sum() > len(columns):
+                location, covariance = robust_covariance(X[finite])
+                d2 = mahalanobis_sq(X, location, covariance)
+                distance = np.sqrt(d2)
+                c = 2.0 / (9.0 * len(columns))
+                z = (np.cbrt(d2 / len(columns)) - (1.0 - c)) / np.sqrt(c)
+                critical = crossing_multipliers(
+                    lambda m, cells: distance[cells] > mahalanobis_cutoff(m, len(columns)),
+                    (z - QUARTILE_Z) / IQR_SIGMAS,
+                )
+        else:
+            a, b = fence_statistics(X, codes, len(labels), mode)
+            a, b, x = a[codes].ravel(), b[codes].ravel(), X.ravel()
+
+            def trips(m, cells):
+                lower, upper = outlier_fences(mode, m, a[cells], b[cells])
+                return (x[cells] < lower) | (x[cells] > upper)
+
+            if mode == 'robust_z':
+                estimate = (np.abs(x - a) * QUARTILE_Z / b - QUARTILE_Z) / IQR_SIGMAS
+            else:
+                estimate = np.maximum(x - b, a - x) / (b - a)
+            scores = crossing_multipliers(trips, estimate).reshape(X.shape)
+            critical = _pin_overridden(scores, columns, overrides, 'outlier_iqr_multiplier').max(axis=1)
+        # classify_health marks an equipment name critical if any of its rows is an outlier
+        return pd.Series(critical).groupby(pd.factorize(df['Equipment Name'])[0]).transform('max').to_numpy()
+
+
+def _pin_overridden(scores, columns, overrides, key):
+    """Per-column scores with overridden columns fixed at +/-inf by their own threshold."""
+    fixed = per_column(np.nan, columns, overrides, key)
+    pinned = ~np.isnan(fixed)
+    if not pinned.any():
+        return scores
+    return np.where(pinned, np.where(scores > fixed, np.inf, -np.inf), scores)
+
+
+def _warning_mask(X, codes, quantiles, qs, percentiles):
+    """
+    classify_health's warning test at one percentile per column, with the
+    thresholds looked up in `quantiles` (grouped_quantiles at `qs`).
+    """
+    which = np.searchsorted(qs, percentiles)
+    limits = quantiles[which, :, np.arange(X.shape[1])].T
+    if len(limits) > 1:
+        limits = limits[codes]
+    with np.errstate(invalid='ignore'):
+        return (X > limits).any(axis=1)
+
+
+# Rows x pairs evaluated per block of a threshold sweep (bounds the boolean matrices)
+SWEEP_BLOCK_CELLS = 4_000_000
+
+
+def threshold_sweep(df, pairs, current, columns=NUMERIC_COLUMNS, mode='iqr', per_type=False, changed_limit=20, overrides=None,
+                    floor=None):
+    """
+    Health counts for many (warning_percentile, iqr_multiplier) pairs at once.
+
+    The critical scores (critical_scores) and the warning quantiles for
+    every swept percentile (one grouped call) are computed once; each
+    block of pairs is then a broadcast comparison against them, with the
+    same arithmetic as judge() so the counts match it exactly. `floor`
+    (per-row index into HEALTH_LEVELS, e.g. alert rule severities) raises
+    every pair's statuses, as escalate() does. For every pair returns the
+    normal / warning / critical counts and the equipment whose status
+    differs from the `current` pair (first `changed_limit` plus a count).
+    """
+    critical_score = critical_scores(df, columns, mode, per_type, overrides)
+    names = df['Equipment Name'].to_numpy()
+    pairs = np.asarray(pairs, dtype=float).reshape(-1, 2)
+
+    X = df[columns].to_numpy(dtype=float)
+    groups, labels = type_groups(df, per_type)
+    fixed = per_column(np.nan, columns, overrides, 'warning_percentile')
+    qs = np.unique(np.concatenate([pairs[:, 0], [current[0]], fixed[~np.isnan(fixed)]]))
+    quantiles = grouped_quantiles(X, groups, len(labels), qs)
+
+    def warned(warning_percentile):
+        return _warning_mask(X, groups, quantiles, qs, np.where(np.isnan(fixed), warning_percentile, fixed))
+
+    if floor is None:
+        floor = np.zeros(len(df), dtype=np.int8)
+    baseline = np.maximum(np.where(critical_score > current[1], 2, np.where(warned(current[0]), 1, 0)), floor).astype(np.int8)
+
+    block = max(1, SWEEP_BLOCK_CELLS // max(len(df), 1))
+    results = []
+    for start in range(0, len(pairs), block):
+        percentiles, which = np.unique(pairs[start:start + block, 0], return_inverse=True)
+        warning = np.stack([warned(w) for w in percentiles])[which]
+        m = pairs[start:start + block, 1][:, None]
+        codes = np.maximum(np.where(critical_score > m, 2, np.where(warning, 1, 0)), floor).astype(np.int8)
+        counts = np.stack([(codes == level).sum(axis=1) for level in range(3)], axis=1)
+        changed = codes != baseline
+        for i, (pair, pair_counts) in enumerate(zip(pairs[start:start + block].tolist(), counts.tolist())):
+            rows = np.flatnonzero(changed[i])
+            results.append({
+                'warning_percentile': pair[0],
+                'outlier_iqr_multiplier': pair[1],
+                'counts': dict(zip(HEALTH_LEVELS, pair_counts)),
+                'changed_count': int(len(rows)),
+                'changed': [
+                    {'equipment': name, 'from': HEALTH_LEVELS[before], 'to': HEALTH_LEVELS[after]}
+                    for name, before, after in zip(
+                        names[rows[:changed_limit]].tolist(),
+                        baseline[rows[:changed_limit]].tolist(),
+                        codes[i, rows[:changed_limit]].tolist(),
+                    )
+                ],
+            })
+
+    baseline_counts = np.bincount(baseline, minlength=3).tolist()
+    return {
+        'current': {
+            'warning_percentile': current[0],
+            'outlier_iqr_multiplier': current[1],
+            'counts': dict(zip(HEALTH_LEVELS, baseline_counts)),
+        },
+        'results': results,
+    }
+
+
+def raise_statuses(statuses, floor):
+    """Per-row health statuses raised to at least `floor` (per-row index into HEALTH_LEVELS)."""
+    codes = np.zeros(len(statuses), dtype=np.int8)
+    for i, level in enumerate(HEALTH_LEVELS[1:], start=1):
+        codes[statuses == level] = i
+    raised = np.maximum(codes, floor)
+    return np.asarray(HEALTH_LEVELS, dtype=object)[raised].astype(statuses.dtype)
+
+
+def _with_health(df, statuses):
+    """Rows as dicts with `health_status` / `health_color` attached (gaps as None)."""
+    if df.isna().to_numpy().any():
+        # Optional parameters may have empty cells, and NaN is not valid JSON
+        df = df.astype(object).where(df.notna(), None)
+    records = df.to_dict(orient='records')
+    for record, health_status in zip(records, statuses.tolist()):
+        record['health_status'] = health_status
+        record['health_color'] = HEALTH_COLORS[health_status]
+    return records
+
+
+def analyze(df, warning_percentile, iqr_multiplier, mode='iqr', per_type=False, parameters=DEFAULT_PARAMETERS):
+    """
+    Full upload analysis over the `parameters` columns: basic stats, type
+    comparison, correlation, outliers (see detect_outliers for the modes),
+    per-row health and the bounds used (per `Type` with `per_type`), with
+    any per-parameter threshold overrides applied. Returns (summary, records).
+    """
+    columns = [parameter.name for parameter in parameters]
+    overrides = threshold_overrides(parameters)
+    with span('stats'):
+        stats, described = basic_stats(df, columns)
+        stats['parameters'] = parameter_summary(parameters, described)
+    with span('groupby'):
+        stats['type_comparison'] = type_comparison(df, columns)
+    with span('correlation'):
+        stats['correlation_matrix'] = correlation_matrix(df, columns)
+    with span('outliers'):
+        fences = None
+        if mode != 'mahalanobis':
+            multipliers = per_column(iqr_multiplier, columns, overrides, 'outlier_iqr_multiplier')
+            fences = outlier_bounds(df, multipliers, columns, mode, per_type)
+        outliers = detect_outliers(df, iqr_multiplier, columns, mode, per_type, bounds=fences)
+    stats['outliers'] = outliers
+    stats['detection_mode'] = mode
+    with span('health'):
+        percentiles = per_column(warning_percentile, columns, overrides, 'warning_percentile')
+        thresholds = warning_bounds(df, percentiles, columns, per_type)
+        records = _with_health(df, classify_health(df, outliers, warning_percentile, columns, thresholds=thresholds))
+    stats['bounds'] = bounds_summary(fences, thresholds, per_type, columns)
+    return stats, records
+
+
+# Operating-point clustering: mini-batch k-means on a fixed-seed sample
+CLUSTER_SAMPLE_SIZE = 50_000
+CLUSTER_BATCH_SIZE = 1024
+CLUSTER_MAX_STEPS = 200
+CLUSTER_TOLERANCE = 1e-4
+CLUSTER_ASSIGN_BLOCK = 200_000
+CLUSTER_TOP_TYPES = 3
+
+
+def nearest_centroid(X, centroids, block=CLUSTER_ASSIGN_BLOCK):
+    """Index of the closest centroid for every row of X, in row blocks of bounded memory."""
+    labels = np.empty(len(X), dtype=np.int64)
+    c2 = (centroids ** 2).sum(axis=1)
+    for start in range(0, len(X), block):
+        chunk = X[start:start + block]
+        labels[start:start + block] = (c2 - 2.0 * chunk @ centroids.T).argmin(axis=1)
+    return labels
+
+
+def kmeans_plus_plus(X, k, rng):
+    """k-means++ seeding: each next centre is drawn with probability proportional to d^2."""
+    centroids = [X[rng.integers(len(X))]]
+    d2 = ((X - centroids[0]) ** 2).sum(axis=1)
+    for _ in range(1, k):
+        total = d2.sum()
+        index = rng.choice(len(X), p=d2 / total) if total > 0 else rng.integers(len(X))
+        centroids.append(X[index])
+        d2 = np.minimum(d2, ((X - X[index]) ** 2).sum(axis=1))
+    return np.array(centroids)
+
+
+def minibatch_kmeans(X, k, batch_size=CLUSTER_BATCH_SIZE, max_steps=CLUSTER_MAX_STEPS, tol=CLUSTER_TOLERANCE, seed=0):
+    """
+    Mini-batch k-means (Sculley, 2010) on the rows of X.
+
+    Each step assigns one random batch to its nearest centres and moves every
+    centre towards the mean of its batch rows with a per-centre learning rate
+    of 1 / (rows it has absorbed so far). Stops once no centre moves more
+    than `tol` in a step. Returns (centroids, steps).
+    """
+    rng = np.random.default_rng(seed)
+    centroids = kmeans_plus_plus(X, k, rng)
+    absorbed = np.zeros(k)
+    steps = 0
+    for steps in range(1, max_steps + 1):
+        batch = X[rng.integers(len(X), size=min(batch_size, len(X)))]
+        labels = nearest_centroid(batch, centroids)
+        counts = np.bincount(labels, minlength=k).astype(float)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, batch)
+        absorbed += counts
+        hit = counts > 0
+        moved = np.zeros_like(centroids)
+        moved[hit] = (sums[hit] - counts[hit, None] * centroids[hit]) / absorbed[hit, None]
+        centroids += moved
+        if np.abs(moved).max() < tol:
+            break
+    return centroids, steps
+
+
+def operating_clusters(df, k, columns=NUMERIC_COLUMNS, sample_size=CLUSTER_SAMPLE_SIZE, seed=0):
+    """
+    Group rows into `k` operating regimes on the standardized `columns`.
+
+    The scaling and the mini-batch k-means fit use a fixed-seed sample of at
+    most `sample_size` rows, so fitting cost stops growing with the file;
+    every row is then assigned to its nearest centroid in one blocked matrix
+    pass. Missing cells count as the sample mean. Clusters are numbered by
+    size, largest first. Returns (summary, labels), or (None, None) when the
+    data has fewer than two distinct points.
+    """
+    X = df[columns].to_numpy(dtype=float)
+    n = len(X)
+    sample = X if n <= sample_size else X[np.random.default_rng(seed).choice(n, sample_size, replace=False)]
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # all-NaN columns
+        mean = np.nanmean(sample, axis=0) if len(sample) else np.zeros(len(columns))
+        std = np.nanstd(sample, axis=0) if len(sample) else np.ones(len(columns))
+    mean = np.nan_to_num(mean)
+    std = np.where(np.isfinite(std) & (std > 0), std, 1.0)
+
+    def standardize(values):
+        return np.nan_to_num((values - mean) / std)
+
+    Z = standardize(sample)
+    k = min(k, len(np.unique(Z, axis=0)) if len(Z) else 0)
+    if k < 2:
+        return None, None
+    centroids, steps = minibatch_kmeans(Z, k, seed=seed)
+
+    labels = nearest_centroid(standardize(X), centroids)
+    sizes = np.bincount(labels, minlength=k)
+    order = np.argsort(-sizes, kind='stable')
+    labels = np.argsort(order)[labels]
+    sizes, centroids = sizes[order], centroids[order]
+
+    type_codes, type_labels = pd.factorize(df['Type'].astype(str))
+    type_counts = np.bincount(labels * len(type_labels) + type_codes, minlength=k * len(type_labels)).reshape(k, -1)
+    centres = centroids * std + mean
+
+    summary = {
+        'k': int(k),
+        'parameters': list(columns),
+        'sample_size': int(len(sample)),
+        'steps': int(steps),
+        'sizes': sizes.tolist(),
+        'centroids': [{col: _float_or(v) for col, v in zip(columns, centre)} for centre in centres],
+        'types': [
+            {type_labels[t]: int(counts[t]) for t in np.argsort(-counts, kind='stable')[:CLUSTER_TOP_TYPES] if counts[t]}
+            for counts in type_counts
+        ],
+    }
+    return summary, labels
+
+
+def summary_stats(df, columns=NUMERIC_COLUMNS):
+    """Count plus mean/min/max/std per numeric column, as plain floats (NaN -> None)."""
+    described = column_stats(df, columns)
+    stats = {'total_count': int(len(df))}
+    for j, col in enumerate(columns):
+        for stat, prefix in (('mean', 'avg'), ('min', 'min'), ('max', 'max'), ('std', 'std')):
+            stats[f"{prefix}_{col.lower()}"] = _float_or(described[stat][j])
+    return stats
+
+
+def _json_records(df):
+    """DataFrame rows as dicts with NaN replaced by None."""
+    return df.astype(object).where(df.notna(), None).to_dict(orient='records')
+
+
+def diff_frames(before, after, warning_percentile, iqr_multiplier, columns=NUMERIC_COLUMNS, mode='iqr', per_type=False, overrides=None,
+                floors=(None, None)):
+    """
+    Compare two uploads aligned on `Equipment Name` with a single outer join.
+
+    Each frame is classified with the same thresholds first, and raised to
+    its entry of `floors` (see raise_statuses; e.g. alert rule severities),
+    so the result shows per-equipment parameter deltas, health-status
+    transitions and the change in the headline summary stats. Duplicate
+    names keep their first row.
+    """
+    sides = {}
+    for label, df, floor in (('before', before, floors[0]), ('after', after, floors[1])):
+        _, statuses, _ = judge(df, warning_percentile, iqr_multiplier, mode, per_type, columns, overrides)
+        if floor is not None:
+            statuses = raise_statuses(statuses, floor)
+        sides[label] = (
+            df.assign(health=statuses)
+            .drop_duplicates('Equipment Name')
+            [['Equipment Name', 'Type', 'health'] + columns]
+        )
+
+    merged = sides['before'].merge(
+        sides['after'], on='Equipment Name', how='outer',
+        suffixes=('_before', '_after'), indicator=True, sort=False,
+    )
+    presence = merged['_merge'].map({'both': 'matched', 'left_only': 'removed', 'right_only': 'added'})
+
+    out = pd.DataFrame({
+        'equipment': merged['Equipment Name'],
+        'type': merged['Type_after'].fillna(merged['Type_before']),
+        'presence': presence.astype(str),
+        'health_before': merged['health_before'],
+        'health_after': merged['health_after'],
+    })
+    for col in columns:
+        out[f'{col}_before'] = merged[f'{col}_before']
+        out[f'{col}_after'] = merged[f'{col}_after']
+        out[f'{col}_delta'] = merged[f'{col}_after'] - merged[f'{col}_before']
+
+    matched = out['presence'] == 'matched'
+    changed = matched & (out['health_before'] != out['health_after'])
+    out['health_changed'] = changed
+
+    transitions = (
+        (out.loc[changed, 'health_before'] + '->' + out.loc[changed, 'health_after'])
+        .value_counts()
+        .to_dict()
+    )
+
+    stats_before = summary_stats(before, columns)
+    stats_after = summary_stats(after, columns)
+    summary_changes = {}
+    for key, before_value in stats_before.items():
+        after_value = stats_after[key]
+        delta = None if before_value is None or after_value is None else after_value - before_value
+        summary_changes[key] = {'before': before_value, 'after': after_value, 'delta': delta}
+
+    type_before = before['Type'].value_counts()
+    type_after = after['Type'].value_counts()
+    type_counts = pd.concat([type_before, type_after], axis=1, keys=['before', 'after']).fillna(0).astype(int)
+    type_counts['delta'] = type_counts['after'] - type_counts['before']
+    summary_changes['type_distribution'] = {
+        str(t): {k: int(v) for k, v in row.items()} for t, row in type_counts.to_dict(orient='index').items()
+    }
+
+    return {
+        'equipment': _json_records(out),
+        'transitions': {k: int(v) for k, v in transitions.items()},
+        'added': out.loc[out['presence'] == 'added', 'equipment'].tolist(),
+        'removed': out.loc[out['presence'] == 'removed', 'equipment'].tolist(),
+        'health_changed_count': int(changed.sum()),
+        'summary_changes': summary_changes,
+    }
+
+
+RANGE_OPERATORS = {
+    'gt': np.greater,
+    'gte': np.greater_equal,
+    'lt': np.less,
+    'lte': np.less_equal,
+}
+
+
+def row_mask(df, statuses, health_statuses=None, types=None, ranges=None):
+    """
+    Boolean mask over the rows of `df` combining all filters at once.
+
+    - statuses: per-row health array from classify_health
+    - health_statuses / types: allowed values (None = no filter)
+    - ranges: [(column, operator, value)] with operator in RANGE_OPERATORS
+    """
+    mask = np.ones(len(df), dtype=bool)
+    if health_statuses:
+        mask &= np.isin(statuses, list(health_statuses))
+    if types:
+        mask &= df['Type'].astype(str).isin(list(types)).to_numpy()
+    for column, op, value in ranges or []:
+        values = pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=float)
+        mask &= RANGE_OPERATORS[op](values, value)
+    return mask
+
+
+def sort_positions(df, statuses, ordering):
+    """
+    Row positions sorted by [(column, descending)] keys; a stable sort so
+    ties keep file order. 'health_status' sorts by severity.
+    """
+    if not ordering:
+        return np.arange(len(df))
+
+    keys = pd.DataFrame(index=pd.RangeIndex(len(df)))
+    ascending = []
+    for i, (column, descending) in enumerate(ordering):
+        if column == 'health_status':
+            keys[i] = pd.Categorical(statuses, categories=HEALTH_LEVELS, ordered=True).codes
+        else:
+            keys[i] = df[column].to_numpy()
+        ascending.append(not descending)
+    return keys.sort_values(by=list(keys.columns), ascending=ascending, kind='mergesort', na_position='last').index.to_numpy()
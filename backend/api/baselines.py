@@ -0,0 +1,172 @@
+"""
+Per-equipment historical baselines.
+
+Outliers are judged against the other rows of the same file, so a drift
+the whole fleet shares is never flagged. Each Equipment row also keeps an
+exponentially weighted mean and variance per parameter (`Equipment.baseline`,
+`{parameter: [mean, variance, updates]}`), folded forward once per upload:
+
+    d = x - mean
+    mean += alpha * d
+    variance = (1 - alpha) * (variance + alpha * d ** 2)
+
+where x is the equipment's mean reading in the upload. A tag's first upload
+seeds the mean and takes its within-upload variance.
+
+Every row of a new upload is scored against the baseline *before* that
+upload is folded in: `baseline_deviation` is the largest |x - mean| / std
+over the parameters. Both passes are grouped NumPy operations over integer
+equipment codes (O(rows)); no past upload is read. Deleting an upload does
+not rewind the baselines.
+"""
+import numpy as np
+import pandas as pd
+
+from .indexing import batches, upsert_equipment
+from .models import Equipment
+
+# std never drops below this fraction of |mean|, so a tag that has only ever
+# reported one value doesn't turn the smallest change into an infinite score
+STD_FLOOR = 0.01
+
+MAX_TOP_DEVIATIONS = 20
+
+
+def load_baselines(user, names):
+    """{equipment name: stored baseline} for the user's tags among `names` that have one."""
+    baselines = {}
+    for batch in batches(list(dict.fromkeys(names))):
+        baselines.update(
+            Equipment.objects.filter(user=user, name__in=batch).exclude(baseline={}).values_list('name', 'baseline')
+        )
+    return baselines
+
+
+def _baseline_arrays(uniques, baselines, columns):
+    """(mean, variance, updates) arrays of shape (len(uniques), len(columns)); NaN / 0 where unknown."""
+    mean = np.full((len(uniques), len(columns)), np.nan)
+    variance = np.full_like(mean, np.nan)
+    updates = np.zeros(mean.shape, dtype=np.int64)
+    for i, name in enumerate(uniques):
+        baseline = baselines.get(name)
+        if not baseline:
+            continue
+        for j, column in enumerate(columns):
+            if column in baseline:
+                mean[i, j], variance[i, j], updates[i, j] = baseline[column]
+    return mean, variance, updates
+
+
+def deviation_scores(df, baselines, columns, min_updates=1):
+    """
+    Per-row deviation from the equipment's own baseline.
+    Returns (scores, worst): the largest |z| over `columns` (NaN when no
+    parameter has a baseline with at least `min_updates` uploads) and the
+    index into `columns` it came from (-1 for NaN scores).
+    """
+    if not len(columns):
+        return np.full(len(df), np.nan), np.full(len(df), -1)
+    codes, uniques = pd.factorize(df['Equipment Name'].astype(str))
+    mean, variance, updates = _baseline_arrays(uniques, baselines, columns)
+    std = np.maximum(np.sqrt(variance), STD_FLOOR * np.abs(mean))
+    usable = (updates >= min_updates) & (std > 0)
+    mean[~usable] = np.nan
+
+    values = df[list(columns)].to_numpy(dtype=float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        z = np.abs(values - mean[codes]) / std[codes]
+    scored = np.where(np.isnan(z), -np.inf, z)
+    worst = scored.argmax(axis=1)
+    scores = scored[np.arange(len(df)), worst]
+    missing = np.isneginf(scores)
+    scores[missing] = np.nan
+    worst[missing] = -1
+    return scores, worst
+
+
+def score_upload(df, records, baselines, columns, min_updates=1):
+    """
+    Add `baseline_deviation` to each of `records` (the rows of `df`) and
+    return summary['baseline']: how many rows were scored and the largest
+    deviations with the parameter behind each.
+    """
+    scores, worst = deviation_scores(df, baselines, columns, min_updates)
+    values = np.round(scores, 3).astype(object)
+    values[np.isnan(scores)] = None
+    for record, value in zip(records, values.tolist()):
+        record['baseline_deviation'] = value
+
+    scored = np.flatnonzero(~np.isnan(scores))
+    top = scored[np.argsort(-scores[scored], kind='stable')[:MAX_TOP_DEVIATIONS]]
+    names = df['Equipment Name'].astype(str).to_numpy()
+    types = df['Type'].astype(str).to_numpy()
+    return {
+        'min_updates': min_updates,
+        'scored_rows': int(len(scored)),
+        'mean_deviation': round(float(scores[scored].mean()), 3) if len(scored) else None,
+        'top': [
+            {
+                'equipment': names[i],
+                'type': types[i],
+                'parameter': columns[worst[i]],
+                'deviation': round(float(scores[i]), 3),
+            }
+            for i in top.tolist()
+        ],
+    }
+
+
+def update_baselines(user, df, columns, alpha):
+    """
+    Fold one upload into its equipment's baselines with batched upserts
+    (see api.indexing.upsert_equipment). Only the upload's tags are read.
+    The tags must already exist (index_equipment_readings creates them).
+    """
+    if df.empty or not len(columns):
+        return 0
+    codes, uniques = pd.factorize(df['Equipment Name'].astype(str))
+    values = df[list(columns)].to_numpy(dtype=float)
+    present = ~np.isnan(values)
+    filled = np.where(present, values, 0.0)
+
+    shape = (len(uniques), len(columns))
+    counts, sums, sumsq = np.zeros(shape), np.zeros(shape), np.zeros(shape)
+    for j in range(len(columns)):
+        counts[:, j] = np.bincount(codes, weights=present[:, j], minlength=len(uniques))
+        sums[:, j] = np.bincount(codes, weights=filled[:, j], minlength=len(uniques))
+        sumsq[:, j] = np.bincount(codes, weights=filled[:, j] ** 2, minlength=len(uniques))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        x = sums / counts
+        upload_variance = np.maximum(sumsq / counts - x ** 2, 0.0)
+
+    stored = {}
+    for batch in batches(list(uniques)):
+        stored.update(Equipment.objects.filter(user=user, name__in=batch).values_list('name', 'baseline'))
+    mean, variance, updates = _baseline_arrays(uniques, stored, columns)
+
+    seen = counts > 0
+    new = seen & (updates == 0)
+    folded = seen & (updates > 0)
+    d = x - mean
+    mean = np.where(folded, mean + alpha * d, np.where(new, x, mean))
+    variance = np.where(folded, (1 - alpha) * (variance + alpha * d ** 2), np.where(new, upload_variance, variance))
+    updates = updates + seen
+
+    changed = []
+    for i, name in enumerate(uniques):
+        if name not in stored or not seen[i].any():
+            continue
+        baseline = dict(stored[name])
+        for j in np.flatnonzero(seen[i]).tolist():
+            baseline[columns[j]] = [float(mean[i, j]), float(variance[i, j]), int(updates[i, j])]
+        changed.append(Equipment(user_id=user.pk, name=name, name_lower=name.lower(), baseline=baseline))
+    upsert_equipment(changed, ['baseline'])
+    return len(changed)
+
+
+def describe_baseline(baseline):
+    """A stored baseline as {parameter: {mean, std, updates}} for API responses."""
+    return {
+        column: {'mean': mean, 'std': float(np.sqrt(variance)), 'updates': updates}
+        for column, (mean, variance, updates) in (baseline or {}).items()
+    }
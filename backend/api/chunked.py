@@ -0,0 +1,129 @@
+"""
+Disk storage for resumable chunked uploads (see ChunkedUpload).
+
+Chunks are written atomically to CHUNKED_UPLOAD_DIR/<upload id>/<n>.part,
+outside MEDIA_ROOT so they are never served. Finalizing concatenates (and,
+for .csv.gz / .csv.zst, decompresses) them into one spooled file that goes
+through the normal upload pipeline.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ChunkedUpload
+from .uploads import Decompressor, SpooledCSVUpload, csv_codec, csv_name, parse_header
+
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# A finalize claim older than this belongs to a worker that died mid-analysis
+FINALIZE_CLAIM_TIMEOUT = timedelta(minutes=30)
+
+
+def chunk_dir(upload):
+    return os.path.join(str(settings.CHUNKED_UPLOAD_DIR), str(upload.pk))
+
+
+def chunk_path(upload, number):
+    return os.path.join(chunk_dir(upload), f"{number:06d}.part")
+
+
+def store_chunk(upload, number, data):
+    """
+    Write one chunk (replacing an earlier copy) and record it as received.
+    Returns the refreshed ChunkedUpload.
+    """
+    os.makedirs(chunk_dir(upload), exist_ok=True)
+    path = chunk_path(upload, number)
+    # Write then rename, so a dropped connection never leaves a half chunk behind
+    fd, tmp_path = tempfile.mkstemp(dir=chunk_dir(upload), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+    with transaction.atomic():
+        locked = ChunkedUpload.objects.select_for_update().get(pk=upload.pk)
+        if number not in locked.received_chunks:
+            locked.received_chunks = sorted(locked.received_chunks + [number])
+            locked.save(update_fields=['received_chunks', 'updated_at'])
+    return locked
+
+
+def assemble(upload):
+    """
+    Concatenate all chunks into a SpooledCSVUpload (in memory up to
+    FILE_UPLOAD_MAX_MEMORY_SIZE, on disk beyond), decompressing .csv.gz /
+    .csv.zst on the way. Verifies the total size and the declared SHA-256 of
+    the bytes as sent; raises ValueError on mismatch.
+    """
+    decompressor = Decompressor(csv_codec(upload.file_name)[1])
+    spool = tempfile.SpooledTemporaryFile(max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+    sent_digest = hashlib.sha256()
+    content_digest = hashlib.sha256()
+    size = 0
+    try:
+        for number in range(upload.total_chunks):
+            with open(chunk_path(upload, number), 'rb') as part:
+                for block in iter(lambda: part.read(COPY_BUFFER_SIZE), b''):
+                    sent_digest.update(block)
+                    size += len(block)
+                    data = decompressor.decompress(block)
+                    content_digest.update(data)
+                    spool.write(data)
+        data = decompressor.flush()
+        content_digest.update(data)
+        spool.write(data)
+
+        if size != upload.total_size:
+            raise ValueError(f"Assembled {size} bytes, expected {upload.total_size}")
+        if upload.sha256 and sent_digest.hexdigest() != upload.sha256.lower():
+            raise ValueError("Checksum mismatch for the assembled file")
+    except (ValueError, OSError):
+        spool.close()
+        raise
+
+    content_size = spool.tell()
+    spool.seek(0)
+    header = parse_header(spool.readline())
+    spool.seek(0)
+    return SpooledCSVUpload(
+        spool, csv_name(upload.file_name), 'text/csv', content_size, None,
+        header=header, sha256=content_digest.hexdigest(),
+    )
+
+
+def claim_finalize(upload):
+    """
+    Take the upload for finalizing with one conditional UPDATE, so of two
+    concurrent finalize requests exactly one proceeds. Returns False when
+    another request holds a live claim.
+    """
+    now = timezone.now()
+    unclaimed = Q(finalizing_at__isnull=True) | Q(finalizing_at__lt=now - FINALIZE_CLAIM_TIMEOUT)
+    return ChunkedUpload.objects.filter(unclaimed, pk=upload.pk).update(finalizing_at=now) == 1
+
+
+def release_finalize(upload):
+    """Give the claim back (the upload stays for another attempt)."""
+    ChunkedUpload.objects.filter(pk=upload.pk).update(finalizing_at=None)
+
+
+def is_finalizing(upload):
+    return upload.finalizing_at is not None and upload.finalizing_at >= timezone.now() - FINALIZE_CLAIM_TIMEOUT
+
+
+def remove_chunks(upload):
+    shutil.rmtree(chunk_dir(upload), ignore_errors=True)
+
+
+def expire_stale_uploads():
+    """Drop sessions untouched for CHUNKED_UPLOAD_EXPIRY_HOURS (their files go with them)."""
+    cutoff = timezone.now() - timedelta(hours=settings.CHUNKED_UPLOAD_EXPIRY_HOURS)
+    for stale in ChunkedUpload.objects.filter(updated_at__lt=cutoff):
+        stale.delete()
@@ -0,0 +1,244 @@
+"""
+Normalized indexes that are filled at upload time.
+
+The upload pipeline stores each CSV as a JSON blob on `UploadedFile`. The
+helpers here copy the rows into narrow, indexed tables so that cross-upload
+queries (e.g. one pump's pressure over many shifts) never parse those blobs.
+"""
+import numpy as np
+import pandas as pd
+from django.db import models
+from django.db.models.functions import Concat
+
+from .models import Equipment, EquipmentReading, EquipmentSearchGram
+
+# Maps CSV columns to EquipmentReading fields (and series API parameter names)
+READING_FIELDS = {
+    'Flowrate': 'flowrate',
+    'Pressure': 'pressure',
+    'Temperature': 'temperature',
+}
+
+BULK_BATCH_SIZE = 1000
+
+# Equipment fields holding the tag's latest reading, refreshed by each upload
+LATEST_FIELDS = ['latest_health_status'] + [f'latest_{f}' for f in READING_FIELDS.values()]
+
+
+def _column_or_none(df, column):
+    """Numeric column as a float array, with missing cells mapped to None."""
+    if column not in df.columns:
+        return [None] * len(df)
+    values = pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=float)
+    return [None if np.isnan(v) else float(v) for v in values]
+
+
+def search_text(name, equipment_type):
+    """Lower-cased text that the trigram index covers: name and type."""
+    return f"{name} {equipment_type}".lower()
+
+
+def trigrams(text):
+    """Distinct 3-character substrings of `text`."""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _index_search_grams(equipment_list):
+    """(Re)build trigram postings for the given Equipment rows in bulk."""
+    if not equipment_list:
+        return
+    EquipmentSearchGram.objects.filter(equipment__in=[e.pk for e in equipment_list]).delete()
+    EquipmentSearchGram.objects.bulk_create(
+        [
+            EquipmentSearchGram(user_id=e.user_id, equipment_id=e.pk, gram=gram)
+            for e in equipment_list
+            for gram in trigrams(search_text(e.name, e.equipment_type))
+        ],
+        batch_size=BULK_BATCH_SIZE,
+    )
+
+
+def get_equipment_ids(user, names, types):
+    """
+    Dictionary-encode equipment names for a user.
+    Returns an array of Equipment ids aligned with `names`, creating any
+    tags that have not been seen before in a single bulk insert.
+    """
+    codes, uniques = pd.factorize(pd.Series(names, dtype=str))
+    first_types = pd.Series(types, dtype=str).groupby(codes).first()
+
+    known = dict(Equipment.objects.filter(user=user).values_list('name', 'id'))
+    missing = [i for i, name in enumerate(uniques) if name not in known]
+    if missing:
+        Equipment.objects.bulk_create(
+            [
+                Equipment(
+                    user=user, name=uniques[i], name_lower=uniques[i].lower(),
+                    equipment_type=first_types[i], type_lower=first_types[i].lower(),
+                )
+                for i in missing
+            ],
+            batch_size=BULK_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        known = dict(Equipment.objects.filter(user=user).values_list('name', 'id'))
+        _index_search_grams(list(Equipment.objects.filter(user=user, name__in=[uniques[i] for i in missing])))
+
+    lookup = np.array([known[name] for name in uniques], dtype=np.int64)
+    return lookup[codes]
+
+
+def batches(items, size=BULK_BATCH_SIZE):
+    """Consecutive slices of `items` of at most `size` elements."""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def upsert_equipment(rows, fields):
+    """
+    Write `fields` of existing tags. `rows` are unsaved Equipment instances
+    carrying user and name; each batch is one INSERT ... ON CONFLICT (user,
+    name) DO UPDATE, so the statement size is linear in the rows (bulk_update
+    builds a CASE per field per row).
+    """
+    Equipment.objects.bulk_create(
+        rows, batch_size=BULK_BATCH_SIZE,
+        update_conflicts=True, unique_fields=['user', 'name'], update_fields=fields,
+    )
+
+
+def _refresh_latest(upload_instance, df, equipment_ids, statuses):
+    """
+    Store each tag's last row of this upload as its latest reading / health
+    and pick up type changes. Only tags whose values changed are rewritten
+    (batched upserts); the rest just get `last_seen_at`, one UPDATE per batch.
+    """
+    last_rows = pd.Series(np.arange(len(df))).groupby(equipment_ids).last()
+    names = df['Equipment Name'].astype(str).to_numpy()
+    types = df['Type'].astype(str).to_numpy()
+    columns = {field: _column_or_none(df, col) for col, field in READING_FIELDS.items()}
+    seen_at = upload_instance.uploaded_at
+
+    ids = last_rows.index.tolist()
+    stored = {}
+    for batch in batches(ids):
+        for row in Equipment.objects.filter(pk__in=batch).values_list('id', 'equipment_type', *LATEST_FIELDS):
+            stored[row[0]] = row[1:]
+
+    changed, unchanged, retyped = [], [], []
+    for equipment_id, row in last_rows.items():
+        latest = [str(statuses[row]) if statuses is not None else ''] + [columns[f][row] for f in READING_FIELDS.values()]
+        if stored[equipment_id] == (types[row], *latest):
+            unchanged.append(equipment_id)
+            continue
+        equipment = Equipment(
+            user_id=upload_instance.user_id, name=names[row], name_lower=names[row].lower(),
+            equipment_type=types[row], type_lower=types[row].lower(), last_seen_at=seen_at,
+            **dict(zip(LATEST_FIELDS, latest)),
+        )
+        changed.append(equipment)
+        if stored[equipment_id][0] != types[row]:
+            retyped.append((equipment, equipment_id))
+
+    upsert_equipment(changed, ['last_seen_at', 'equipment_type', 'type_lower'] + LATEST_FIELDS)
+    for equipment, equipment_id in retyped:
+        equipment.pk = equipment_id
+    for batch in batches(unchanged):
+        Equipment.objects.filter(pk__in=batch).update(last_seen_at=seen_at)
+    _index_search_grams([equipment for equipment, _ in retyped])
+
+
+def index_equipment_readings(upload_instance, df, statuses=None):
+    """
+    Copy an analysed upload into the equipment time-series index and
+    refresh the search index (latest reading / health per tag).
+    All rows share the upload timestamp; inserts are batched.
+    """
+    if df.empty:
+        return 0
+
+    equipment_ids = get_equipment_ids(upload_instance.user, df['Equipment Name'], df['Type'])
+    columns = {field: _column_or_none(df, col) for col, field in READING_FIELDS.items()}
+    recorded_at = upload_instance.uploaded_at
+
+    readings = [
+        EquipmentReading(
+            equipment_id=int(equipment_ids[i]),
+            upload=upload_instance,
+            recorded_at=recorded_at,
+            flowrate=columns['flowrate'][i],
+            pressure=columns['pressure'][i],
+            temperature=columns['temperature'][i],
+        )
+        for i in range(len(df))
+    ]
+    EquipmentReading.objects.bulk_create(readings, batch_size=BULK_BATCH_SIZE)
+    _refresh_latest(upload_instance, df, equipment_ids, statuses)
+    return len(readings)
+
+
+def search_equipment(user, query, limit=20):
+    """
+    Find a user's equipment whose name or type contains `query`.
+
+    Queries shorter than a trigram are prefix range scans on the
+    (user, name_lower) and (user, type_lower) indexes; longer ones intersect
+    trigram postings and confirm the substring. The confirmation, ranking
+    (exact > prefix > substring, then by name) and limit all run in SQL,
+    so only the returned rows are loaded.
+    """
+    q = query.strip().lower()
+    if not q:
+        return Equipment.objects.none()
+
+    if len(q) < 3:
+        end = q + '\U0010ffff'
+        candidates = Equipment.objects.filter(
+            models.Q(name_lower__gte=q, name_lower__lt=end) | models.Q(type_lower__gte=q, type_lower__lt=end),
+            user=user,
+        )
+    else:
+        grams = trigrams(q)
+        matching_ids = (
+            EquipmentSearchGram.objects.filter(user=user, gram__in=grams)
+            .values('equipment_id')
+            .annotate(hits=models.Count('gram', distinct=True))
+            .filter(hits=len(grams))
+            .values('equipment_id')
+        )
+        # Holding every trigram doesn't make them contiguous; search_text in SQL
+        candidates = (
+            Equipment.objects.filter(pk__in=matching_ids)
+            .annotate(search_text=Concat('name_lower', models.Value(' '), 'type_lower'))
+            .filter(search_text__contains=q)
+        )
+
+    return candidates.annotate(
+        rank=models.Case(
+            models.When(name_lower=q, then=models.Value(0)),
+            models.When(name_lower__startswith=q, then=models.Value(1)),
+            default=models.Value(2),
+        )
+    ).order_by('rank', 'name_lower')[:limit]
+
+
+def upload_frame(upload_instance, parameters=None):
+    """
+    Columnar DataFrame for one upload, read from the reading index.
+    Uploads stored before the index existed, and uploads analysed on
+    `parameters` (column names) the index doesn't hold, come from `processed_data`.
+    """
+    if parameters is None or set(parameters) <= set(READING_FIELDS):
+        columns = ['Equipment Name', 'Type'] + list(READING_FIELDS)
+        rows = list(
+            upload_instance.readings.order_by('id').values_list(
+                'equipment__name', 'equipment__equipment_type', *READING_FIELDS.values()
+            )
+        )
+        if rows:
+            return pd.DataFrame(rows, columns=columns)
+
+    df = pd.DataFrame(upload_instance.processed_data)
+    return df.drop(
+        columns=['health_status', 'health_color', 'alert_rules', 'baseline_deviation', 'cluster'], errors='ignore'
+    )
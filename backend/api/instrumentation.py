@@ -0,0 +1,305 @@
+"""
+Per-request timing spans, SQL counters and the Server-Timing middleware.
+
+Code marks a stage with `span('name')`. When the current request is being
+sampled, the time spent in the block is added to that request's totals.
+Registered stage observers (see api.metrics) also receive every span's
+duration; with neither, the context manager does nothing. At the end of
+the request the middleware emits a `Server-Timing` header and, above the
+configured threshold, one structured (JSON) log line.
+
+In DEBUG, a request sent with `X-Memory-Profile: 1` additionally runs under
+tracemalloc: every span records its peak memory and top allocation sites,
+returned in a `Memory-Profile` header and logged (see `memory_profile()` and
+the `memory_profile` management command).
+
+Settings (all optional, see core/settings.py):
+    SERVER_TIMING_ENABLED      - master switch (default True)
+    SERVER_TIMING_SAMPLE_RATE  - fraction of requests instrumented (default 0.05)
+    SERVER_TIMING_LOG_MS       - log requests slower than this (default 500)
+    SERVER_TIMING_HEADER       - who gets the header: 'staff' (staff users, or
+                                 anyone in DEBUG; default), 'all' or 'off'.
+                                 The log line is written either way.
+"""
+import contextvars
+import json
+import logging
+import random
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger('api.timing')
+
+_current = contextvars.ContextVar('request_timing', default=None)
+_memory = contextvars.ContextVar('memory_profile', default=None)
+
+# Callables invoked as observer(name, seconds) for every finished span
+_stage_observers = []
+
+
+class RequestTiming:
+    """Accumulated span durations and SQL stats for one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = {}
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.bytes = 0
+
+    def add(self, name, seconds):
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    def query_wrapper(self, execute, sql, params, many, context):
+        """django.db execute_wrapper hook counting queries and their time."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_queries += 1
+            self.db_seconds += time.perf_counter() - start
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def header(self, total_seconds):
+        """Server-Timing header value (durations in ms)."""
+        parts = [f'{name};dur={seconds * 1000:.1f}' for name, seconds in self.spans.items()]
+        parts.append(f'db;dur={self.db_seconds * 1000:.1f};desc="{self.db_queries} queries"')
+        parts.append(f'total;dur={total_seconds * 1000:.1f}')
+        return ', '.join(parts)
+
+
+class MemoryProfile:
+    """
+    Per-stage tracemalloc results. For each stage: `peak_bytes` (highest
+    traced memory above what was allocated when the stage started),
+    `net_bytes` (still allocated when it ended) and the `top` allocation
+    sites by growth.
+    """
+
+    # Allocations made by tracemalloc itself and by imports are noise here
+    SNAPSHOT_FILTERS = (
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+        tracemalloc.Filter(False, '<unknown>'),
+    )
+
+    def __init__(self, top=5):
+        self.top = top
+        self.stages = {}
+        self.peak_bytes = 0
+        self.top_sites = []
+        self._open = []
+
+    def _snapshot(self):
+        """Filtered snapshot, or None when allocation sites are not wanted (top=0)."""
+        if not self.top:
+            return None
+        return tracemalloc.take_snapshot().filter_traces(self.SNAPSHOT_FILTERS)
+
+    def _flush_peak(self):
+        """Credit the peak since the last reset to every open stage, then reset it."""
+        _, peak = tracemalloc.get_traced_memory()
+        for frame in self._open:
+            frame['peak'] = max(frame['peak'], peak)
+        tracemalloc.reset_peak()
+
+    def _top_sites(self, after, before):
+        if after is None:
+            return []
+        return [
+            {
+                'site': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                'size_diff': stat.size_diff,
+                'count_diff': stat.count_diff,
+            }
+            for stat in after.compare_to(before, 'lineno')[:self.top]
+            if stat.size_diff > 0
+        ]
+
+    @contextmanager
+    def stage(self, name):
+        self._flush_peak()
+        start, _ = tracemalloc.get_traced_memory()
+        before = self._snapshot()
+        frame = {'peak': start}
+        self._open.append(frame)
+        try:
+            yield
+        finally:
+            self._flush_peak()
+            self._open.pop()
+            end, _ = tracemalloc.get_traced_memory()
+            previous = self.stages.get(name, {'peak_bytes': 0, 'net_bytes': 0})
+            self.stages[name] = {
+                'peak_bytes': max(previous['peak_bytes'], frame['peak'] - start),
+                'net_bytes': previous['net_bytes'] + end - start,
+                'top': self._top_sites(self._snapshot(), before),
+            }
+
+    def header(self):
+        """Memory-Profile header value (peaks in KiB), same shape as Server-Timing."""
+        parts = [f"{name};peak={s['peak_bytes'] / 1024:.0f}" for name, s in self.stages.items()]
+        parts.append(f'total;peak={self.peak_bytes / 1024:.0f}')
+        return ', '.join(parts)
+
+    def as_dict(self):
+        return {'peak_bytes': self.peak_bytes, 'stages': self.stages, 'top': self.top_sites}
+
+
+def current_timing():
+    """The active RequestTiming, or None when the request is not sampled."""
+    return _current.get()
+
+
+def add_stage_observer(observer):
+    """Register `observer(name, seconds)` to be called whenever a span ends."""
+    if observer not in _stage_observers:
+        _stage_observers.append(observer)
+
+
+@contextmanager
+def span(name):
+    """Time a block under `name` for the current request and any stage observers."""
+    timing = _current.get()
+    memory = _memory.get()
+    if timing is None and memory is None and not _stage_observers:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        with memory.stage(name) if memory is not None else nullcontext():
+            yield
+    finally:
+        elapsed = time.perf_counter() - start
+        if timing is not None:
+            timing.add(name, elapsed)
+        for observer in _stage_observers:
+            observer(name, elapsed)
+
+
+@contextmanager
+def collect_timing():
+    """Activate a fresh RequestTiming outside the middleware (commands, benchmarks)."""
+    timing = RequestTiming()
+    token = _current.set(timing)
+    try:
+        yield timing
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def memory_profile(top=5):
+    """
+    Trace allocations for the enclosed block; spans inside it record their
+    peak memory into the yielded MemoryProfile. Expensive - diagnostics only.
+    """
+    profile = MemoryProfile(top=top)
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    token = _memory.set(profile)
+    tracemalloc.reset_peak()
+    base, _ = tracemalloc.get_traced_memory()
+    before = profile._snapshot()
+    whole = {'peak': base}
+    profile._open.append(whole)
+    try:
+        yield profile
+    finally:
+        profile._flush_peak()
+        profile._open.remove(whole)
+        profile.peak_bytes = whole['peak'] - base
+        profile.top_sites = profile._top_sites(profile._snapshot(), before)
+        _memory.reset(token)
+        if started:
+            tracemalloc.stop()
+
+
+class ServerTimingMiddleware:
+    """
+    Instruments a sample of requests with stage spans, SQL count/time and
+    response size, reported as a Server-Timing header and a log line.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'SERVER_TIMING_ENABLED', True)
+        self.sample_rate = getattr(settings, 'SERVER_TIMING_SAMPLE_RATE', 0.05)
+        self.log_threshold = getattr(settings, 'SERVER_TIMING_LOG_MS', 500.0) / 1000.0
+        self.header = getattr(settings, 'SERVER_TIMING_HEADER', 'staff')
+
+    def __call__(self, request):
+        if settings.DEBUG and request.headers.get('X-Memory-Profile') == '1':
+            return self._memory_profiled(request)
+        if not self.enabled or random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        timing = RequestTiming()
+        token = _current.set(timing)
+        try:
+            with connection.execute_wrapper(timing.query_wrapper):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        total = timing.elapsed()
+        if not getattr(response, 'streaming', False):
+            timing.bytes = len(response.content)
+        if self._shows_header(request):
+            response['Server-Timing'] = timing.header(total)
+
+        if total >= self.log_threshold:
+            match = getattr(request, 'resolver_match', None)
+            logger.info(json.dumps({
+                'event': 'request_timing',
+                'method': request.method,
+                'path': request.path,
+                'view': match.view_name if match else None,
+                'status': response.status_code,
+                'total_ms': round(total * 1000, 1),
+                'spans_ms': {k: round(v * 1000, 1) for k, v in timing.spans.items()},
+                'db_queries': timing.db_queries,
+                'db_ms': round(timing.db_seconds * 1000, 1),
+                'bytes': timing.bytes,
+            }))
+        return response
+
+    def _shows_header(self, request):
+        """Stage and SQL timings are internals: staff (or DEBUG) only unless SERVER_TIMING_HEADER is 'all'."""
+        if self.header == 'all':
+            return True
+        if self.header != 'staff':
+            return False
+        user = getattr(request, 'user', None)
+        return settings.DEBUG or bool(user and user.is_staff)
+
+    def _memory_profiled(self, request):
+        """DEBUG-only: run the request under tracemalloc and report per-span memory."""
+        with memory_profile() as profile:
+            response = self.get_response(request)
+        response['Memory-Profile'] = profile.header()
+        match = getattr(request, 'resolver_match', None)
+        logger.info(json.dumps({
+            'event': 'memory_profile',
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            **profile.as_dict(),
+        }))
+        return response
+
+    def process_template_response(self, request, response):
+        """DRF responses render after the view returns; time that as 'render'."""
+        timing = _current.get()
+        if timing is not None:
+            start = time.perf_counter()
+            response.add_post_render_callback(lambda r: timing.add('render', time.perf_counter() - start))
+        return response
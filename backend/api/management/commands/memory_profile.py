@@ -0,0 +1,129 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from api.analytics import analyze, validate_rows, timestamp_column, timeseries_snapshot, operating_clusters, data_quality, DETECTION_MODES
+from api.instrumentation import memory_profile, span
+from api.parameters import upload_schema, present_parameters, SchemaError
+from api.views import get_threshold_settings, get_detection_options
+import json
+import os
+import pandas as pd
+
+
+class Command(BaseCommand):
+    help = (
+        'Runs the upload analytics on a CSV under tracemalloc and reports peak memory and top '
+        'allocation sites per stage; exits non-zero when a per-row memory budget is exceeded'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_path', help='CSV file to analyse (nothing is saved)')
+        parser.add_argument(
+            '--budget', type=float, default=getattr(settings, 'MEMORY_BUDGET_BYTES_PER_ROW', None),
+            help='Max peak bytes per row for the whole pipeline (default: MEMORY_BUDGET_BYTES_PER_ROW)',
+        )
+        parser.add_argument(
+            '--stage-budget', action='append', default=[], metavar='STAGE=BYTES',
+            help='Max peak bytes per row for one stage, e.g. parse=400 (repeatable)',
+        )
+        parser.add_argument('--mode', choices=DETECTION_MODES, help='Outlier detection mode (default: DETECTION_MODE)')
+        parser.add_argument('--per-type', action='store_true', help='Compute bounds per equipment Type (default: PER_TYPE_BOUNDS)')
+        parser.add_argument('--parameters', help='Comma-separated numeric columns to analyse (default: PARAMETER_SCHEMA)')
+        parser.add_argument('--top', type=int, default=5, help='Allocation sites to show per stage (0 skips the slow snapshots)')
+        parser.add_argument('--json', action='store_true', help='Emit JSON instead of a table')
+
+    def handle(self, *args, **options):
+        path = options['csv_path']
+        if not os.path.exists(path):
+            raise CommandError(f"No such file: {path}")
+        stage_budgets = {}
+        for item in options['stage_budget']:
+            stage, _, value = item.partition('=')
+            try:
+                stage_budgets[stage] = float(value)
+            except ValueError:
+                raise CommandError(f"--stage-budget must look like STAGE=BYTES, got {item!r}")
+
+        try:
+            schema = upload_schema(options['parameters'])
+        except SchemaError as e:
+            raise CommandError(f"--parameters: {e}")
+
+        warning_percentile, iqr_multiplier = get_threshold_settings()
+        detection_options = get_detection_options()
+        if options['mode']:
+            detection_options['mode'] = options['mode']
+        if options['per_type']:
+            detection_options['per_type'] = True
+        with memory_profile(top=options['top']) as profile:
+            with span('parse'):
+                df = pd.read_csv(path)
+            csv_rows = len(df)
+            parameters = present_parameters(schema, df.columns)
+            timestamp = timestamp_column(df, settings.TIMESERIES_COLUMN, settings.TIMESERIES_MIN_PARSED)
+            with span('quality'):
+                quality = data_quality(df, parameters)
+            with span('validate'):
+                df, _ = validate_rows(
+                    df, [p.name for p in parameters if p.required], timestamp=timestamp,
+                    optional=[p.name for p in parameters if not p.required],
+                )
+            if timestamp:
+                with span('timeseries'):
+                    df, _ = timeseries_snapshot(
+                        df, timestamp, settings.TIMESERIES_WINDOW, settings.TIMESERIES_MAX_POINTS,
+                        columns=[p.name for p in parameters],
+                    )
+            stats, records = analyze(df, warning_percentile, iqr_multiplier, parameters=parameters, **detection_options)
+            stats['data_quality'] = quality
+            if settings.CLUSTER_COUNT:
+                with span('clusters'):
+                    stats['clusters'], _ = operating_clusters(df, settings.CLUSTER_COUNT, [p.name for p in parameters])
+            with span('serialize'):
+                json.dumps({'summary': stats, 'data': records})
+
+        rows = max(csv_rows, 1)
+        report = {
+            'file': path,
+            'rows': csv_rows,
+            'peak_bytes': profile.peak_bytes,
+            'peak_bytes_per_row': profile.peak_bytes / rows,
+            'stages': {
+                name: {**s, 'peak_bytes_per_row': s['peak_bytes'] / rows}
+                for name, s in profile.stages.items()
+            },
+            'top': profile.top_sites,
+        }
+
+        violations = []
+        if options['budget'] is not None and report['peak_bytes_per_row'] > options['budget']:
+            violations.append(f"total: {report['peak_bytes_per_row']:.0f} B/row > {options['budget']:.0f}")
+        for stage, budget in stage_budgets.items():
+            if stage not in report['stages']:
+                raise CommandError(f"Unknown stage {stage!r}. Stages: {', '.join(report['stages'])}")
+            per_row = report['stages'][stage]['peak_bytes_per_row']
+            if per_row > budget:
+                violations.append(f"{stage}: {per_row:.0f} B/row > {budget:.0f}")
+        report['budget_violations'] = violations
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self._print_table(report)
+
+        if violations:
+            raise CommandError("Memory budget exceeded: " + '; '.join(violations))
+
+    def _print_table(self, report):
+        self.stdout.write(
+            f"{report['file']}: {report['rows']} rows, peak {report['peak_bytes'] / 1024 / 1024:.1f} MiB "
+            f"({report['peak_bytes_per_row']:.0f} B/row)"
+        )
+        header = f"{'Stage':<14}{'Peak KiB':>12}{'B/row':>10}{'Net KiB':>12}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for name, s in report['stages'].items():
+            self.stdout.write(
+                f"{name:<14}{s['peak_bytes'] / 1024:>12.1f}{s['peak_bytes_per_row']:>10.0f}{s['net_bytes'] / 1024:>12.1f}"
+            )
+            for site in s['top']:
+                self.stdout.write(f"    {site['size_diff'] / 1024:>10.1f} KiB  {site['site']}")
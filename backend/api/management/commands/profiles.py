@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand, CommandError
+from api.profiling import list_profiles, profile_dir
+import io
+import os
+import pstats
+
+SORT_KEYS = {
+    'cumulative': pstats.SortKey.CUMULATIVE,
+    'tottime': pstats.SortKey.TIME,
+    'calls': pstats.SortKey.CALLS,
+}
+
+
+class Command(BaseCommand):
+    help = 'Lists captured request profiles and summarizes their top functions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', help='Profile directory (default: PROFILING_DIR)')
+        parser.add_argument('--view', help='Only profiles of this view (e.g. PDFReportView)')
+        parser.add_argument('--last', type=int, default=20, help='Number of most recent profiles to use')
+        parser.add_argument('--summary', action='store_true', help='Merge the selected profiles and print top functions')
+        parser.add_argument('--file', help='Summarize a single .prof file')
+        parser.add_argument('--top', type=int, default=25, help='Functions to show in a summary')
+        parser.add_argument('--sort', choices=list(SORT_KEYS), default='cumulative')
+
+    def handle(self, *args, **options):
+        if options['file']:
+            if not os.path.exists(options['file']):
+                raise CommandError(f"No such profile: {options['file']}")
+            self._summarize([options['file']], options)
+            return
+
+        profiles = list_profiles(options['dir'] or profile_dir())
+        if options['view']:
+            profiles = [p for p in profiles if p['view'] == options['view']]
+        profiles = profiles[:options['last']]
+
+        if not profiles:
+            self.stdout.write(self.style.WARNING("No profiles captured."))
+            return
+
+        if options['summary']:
+            self.stdout.write(f"Merged {len(profiles)} profile(s)")
+            self._summarize([p['path'] for p in profiles], options)
+            return
+
+        header = f"{'Captured':<21}{'View':<24}{'Method':<8}{'ms':>9}  File"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for p in profiles:
+            self.stdout.write(
+                f"{p['captured_at']:%Y-%m-%d %H:%M:%S}  {p['view'][:23]:<24}{p['method']:<8}{p['ms']:>9}  "
+                f"{os.path.basename(p['path'])}"
+            )
+
+    def _summarize(self, paths, options):
+        stream = io.StringIO()
+        stats = pstats.Stats(paths[0], stream=stream)
+        for path in paths[1:]:
+            stats.add(path)
+        stats.strip_dirs().sort_stats(SORT_KEYS[options['sort']]).print_stats(options['top'])
+        self.stdout.write(stream.getvalue())
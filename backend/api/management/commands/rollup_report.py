@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from api.models import TypeRollup
+from api.rollups import aggregate_rollups, GRANULARITIES
+import json
+
+
+class Command(BaseCommand):
+    help = 'Prints fleet-wide equipment type aggregates from the materialized rollups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--granularity', choices=list(GRANULARITIES), default='month')
+        parser.add_argument('--start', help='First day to include (YYYY-MM-DD)')
+        parser.add_argument('--end', help='Last day to include (YYYY-MM-DD)')
+        parser.add_argument('--user', help='Restrict to one username')
+        parser.add_argument('--json', action='store_true', help='Emit JSON instead of a table')
+
+    def handle(self, *args, **options):
+        rollups = TypeRollup.objects.all()
+        for option, lookup in (('start', 'period__gte'), ('end', 'period__lte')):
+            if options[option]:
+                parsed = parse_date(options[option])
+                if parsed is None:
+                    raise CommandError(f"--{option} must be an ISO date (YYYY-MM-DD)")
+                rollups = rollups.filter(**{lookup: parsed})
+        if options['user']:
+            rollups = rollups.filter(user__username=options['user'])
+
+        results = aggregate_rollups(rollups, options['granularity'])
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        if not results:
+            self.stdout.write(self.style.WARNING("No rollup data found."))
+            return
+
+        def fmt(value):
+            return '-' if value is None else f"{value:.2f}"
+
+        header = f"{'Period':<12}{'Type':<20}{'Uploads':>8}{'Rows':>8}{'Flowrate':>18}{'Pressure':>18}{'Temperature':>18}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for row in results:
+            cells = [
+                f"{fmt(row[p]['mean'])} ±{fmt(row[p]['std'])}"
+                for p in ('flowrate', 'pressure', 'temperature')
+            ]
+            self.stdout.write(
+                f"{row['period']:<12}{row['type'][:19]:<20}{row['uploads']:>8}{row['rows']:>8}"
+                f"{cells[0]:>18}{cells[1]:>18}{cells[2]:>18}"
+            )
@@ -0,0 +1,152 @@
+"""
+Prometheus metrics for the API.
+
+Request latency per view, upload size / row counts, per-stage durations
+(every `span()` - analytics stages as well as PDF chart and render steps),
+cache hits and in-flight requests. Served in the text exposition format by
+`MetricsView` at /api/metrics.
+
+Under gunicorn each worker is a separate process, so prometheus_client runs
+in multiprocess mode: set PROMETHEUS_MULTIPROC_DIR to a directory shared by
+the workers (gunicorn_config.py does this and cleans up after dead workers)
+and a scrape of any worker returns the totals across all of them.
+"""
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+    generate_latest, multiprocess,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+from .instrumentation import add_stage_observer
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+UPLOAD_SIZE_BUCKETS = tuple(1024 * 4 ** i for i in range(9))  # 1 KiB .. 64 MiB
+UPLOAD_ROW_BUCKETS = (10, 50, 100, 500, 1_000, 5_000, 10_000, 50_000, 100_000, 500_000, 1_000_000)
+
+REQUEST_LATENCY = Histogram(
+    'api_request_duration_seconds', 'Request latency by view.',
+    ['view', 'method'], buckets=LATENCY_BUCKETS,
+)
+REQUESTS = Counter(
+    'api_requests_total', 'Requests by view and response status.',
+    ['view', 'method', 'status'],
+)
+IN_FLIGHT = Gauge(
+    'api_requests_in_flight', 'Requests currently being handled.',
+    multiprocess_mode='livesum',
+)
+UPLOAD_SIZE = Histogram(
+    'api_upload_size_bytes', 'Size of uploaded CSV files.', buckets=UPLOAD_SIZE_BUCKETS,
+)
+UPLOAD_ROWS = Histogram(
+    'api_upload_rows', 'Rows per analysed upload.', buckets=UPLOAD_ROW_BUCKETS,
+)
+STAGE_LATENCY = Histogram(
+    'api_stage_duration_seconds', 'Duration of instrumented stages (analytics, PDF render, ...).',
+    ['stage'], buckets=STAGE_BUCKETS,
+)
+CACHE_REQUESTS = Counter(
+    'api_cache_requests_total', 'Cache lookups by cache and result (hit/miss).',
+    ['cache', 'result'],
+)
+
+
+def observe_stage(name, seconds):
+    STAGE_LATENCY.labels(stage=name).observe(seconds)
+
+
+add_stage_observer(observe_stage)
+
+
+def observe_upload(size_bytes, rows):
+    UPLOAD_SIZE.observe(size_bytes)
+    UPLOAD_ROWS.observe(rows)
+
+
+def record_cache(cache_name, hit):
+    CACHE_REQUESTS.labels(cache=cache_name, result='hit' if hit else 'miss').inc()
+
+
+def _view_label(request):
+    """View class (or function) name; a fixed label for unrouted paths keeps cardinality bounded."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    view_class = getattr(match.func, 'view_class', None)
+    return view_class.__name__ if view_class else match.view_name or match.func.__name__
+
+
+class MetricsMiddleware:
+    """Records per-view latency, status counts and the in-flight gauge."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        IN_FLIGHT.inc()
+        try:
+            response = self.get_response(request)
+        finally:
+            IN_FLIGHT.dec()
+        view = _view_label(request)
+        REQUEST_LATENCY.labels(view=view, method=request.method).observe(time.perf_counter() - start)
+        REQUESTS.labels(view=view, method=request.method, status=str(response.status_code)).inc()
+        return response
+
+
+class _Forward:
+    """Re-exposes another registry's metrics inside a scrape registry."""
+
+    def __init__(self, registry):
+        self.registry = registry
+
+    def collect(self):
+        return self.registry.collect()
+
+
+class CacheHitRatioCollector:
+    """Derives api_cache_hit_ratio{cache} from the (already aggregated) cache counters."""
+
+    def __init__(self, collect):
+        self._collect = collect
+
+    def collect(self):
+        hits, totals = {}, {}
+        for family in self._collect():
+            if family.name != 'api_cache_requests':
+                continue
+            for sample in family.samples:
+                if not sample.name.endswith('_total'):
+                    continue
+                cache_name = sample.labels['cache']
+                totals[cache_name] = totals.get(cache_name, 0.0) + sample.value
+                if sample.labels['result'] == 'hit':
+                    hits[cache_name] = hits.get(cache_name, 0.0) + sample.value
+
+        ratio = GaugeMetricFamily('api_cache_hit_ratio', 'Cache hits / lookups since start.', labels=['cache'])
+        for cache_name, total in totals.items():
+            if total:
+                ratio.add_metric([cache_name], hits.get(cache_name, 0.0) / total)
+        yield ratio
+
+
+def scrape_registry():
+    """Registry to expose: all workers' metrics in multiprocess mode, this process's otherwise."""
+    registry = CollectorRegistry()
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        source = multiprocess.MultiProcessCollector(registry)
+    else:
+        source = _Forward(REGISTRY)
+        registry.register(source)
+    registry.register(CacheHitRatioCollector(source.collect))
+    return registry
+
+
+def render_metrics():
+    """(body, content_type) for the exposition endpoint."""
+    return generate_latest(scrape_registry()), CONTENT_TYPE_LATEST
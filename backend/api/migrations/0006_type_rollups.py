@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_equipment_registry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadedfile',
+            name='rolled_up',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.CreateModel(
+            name='TypeRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('equipment_type', models.CharField(max_length=100)),
+                ('period', models.DateField()),
+                ('row_count', models.PositiveIntegerField(default=0)),
+                ('upload_count', models.PositiveIntegerField(default=0)),
+                ('flowrate_count', models.PositiveIntegerField(default=0)),
+                ('flowrate_sum', models.FloatField(default=0.0)),
+                ('flowrate_sumsq', models.FloatField(default=0.0)),
+                ('pressure_count', models.PositiveIntegerField(default=0)),
+                ('pressure_sum', models.FloatField(default=0.0)),
+                ('pressure_sumsq', models.FloatField(default=0.0)),
+                ('temperature_count', models.PositiveIntegerField(default=0)),
+                ('temperature_sum', models.FloatField(default=0.0)),
+                ('temperature_sumsq', models.FloatField(default=0.0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='type_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['period', 'equipment_type'],
+                'indexes': [models.Index(fields=['period', 'equipment_type'], name='rollup_period_type_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'equipment_type', 'period'), name='unique_type_rollup_bucket')],
+            },
+        ),
+    ]
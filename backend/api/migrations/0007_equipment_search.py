@@ -0,0 +1,86 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_search_index(apps, schema_editor):
+    """Fill name_lower and the trigram postings for equipment created before search existed."""
+    Equipment = apps.get_model('api', 'Equipment')
+    EquipmentSearchGram = apps.get_model('api', 'EquipmentSearchGram')
+    grams = []
+    for equipment in Equipment.objects.all():
+        equipment.name_lower = equipment.name.lower()
+        equipment.save(update_fields=['name_lower'])
+        text = f"{equipment.name} {equipment.equipment_type}".lower()
+        for gram in {text[i:i + 3] for i in range(len(text) - 2)}:
+            grams.append(EquipmentSearchGram(user_id=equipment.user_id, equipment_id=equipment.id, gram=gram))
+    EquipmentSearchGram.objects.bulk_create(grams, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_type_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EquipmentSearchGram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gram', models.CharField(max_length=3)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='equipment',
+            name='last_seen_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='equipment',
+            name='latest_flowrate',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='equipment',
+            name='latest_health_status',
+            field=models.CharField(blank=True, default='', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='equipment',
+            name='latest_pressure',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='equipment',
+            name='latest_temperature',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='equipment',
+            name='name_lower',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='equipment',
+            index=models.Index(fields=['user', 'name_lower'], name='equipment_name_prefix_idx'),
+        ),
+        migrations.AddField(
+            model_name='equipmentsearchgram',
+            name='equipment',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_grams', to='api.equipment'),
+        ),
+        migrations.AddField(
+            model_name='equipmentsearchgram',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='equipmentsearchgram',
+            index=models.Index(fields=['user', 'gram'], name='search_gram_lookup_idx'),
+        ),
+        migrations.RunPython(backfill_search_index, migrations.RunPython.noop),
+    ]
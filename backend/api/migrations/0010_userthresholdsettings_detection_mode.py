@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_chunked_upload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userthresholdsettings',
+            name='detection_mode',
+            field=models.CharField(choices=[('iqr', 'IQR (per parameter)'), ('robust_z', 'Robust z-score (per parameter)'), ('mahalanobis', 'Mahalanobis distance (multivariate)')], default='iqr', help_text='Outlier detection: per-parameter IQR, per-parameter robust z-score, or multivariate Mahalanobis distance.', max_length=16),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_userthresholdsettings_detection_mode'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userthresholdsettings',
+            name='per_type_bounds',
+            field=models.BooleanField(default=False, help_text='Compute outlier bounds and warning percentiles within each equipment Type instead of over the whole file.'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_userthresholdsettings_per_type_bounds'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chunkedupload',
+            name='parameters',
+            field=models.TextField(blank=True),
+        ),
+    ]
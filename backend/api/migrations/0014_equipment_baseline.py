@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_alertrule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='equipment',
+            name='baseline',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
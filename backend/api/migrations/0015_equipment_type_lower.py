@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_type_lower(apps, schema_editor):
+    """Fill type_lower for equipment created before short queries searched types."""
+    Equipment = apps.get_model('api', 'Equipment')
+    for equipment in Equipment.objects.exclude(equipment_type=''):
+        equipment.type_lower = equipment.equipment_type.lower()
+        equipment.save(update_fields=['type_lower'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_equipment_baseline'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='equipment',
+            name='type_lower',
+            field=models.CharField(default='', editable=False, max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name='equipment',
+            index=models.Index(fields=['user', 'type_lower'], name='equipment_type_prefix_idx'),
+        ),
+        migrations.RunPython(backfill_type_lower, migrations.RunPython.noop),
+    ]
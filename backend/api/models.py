@@ -1,8 +1,9 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 import os
+import uuid
 from django.dispatch import receiver
-from django.db.models.signals import post_delete
+from django.db.models.signals import post_delete, pre_delete
 
 class UploadedFile(models.Model):
     """
@@ -17,6 +18,8 @@ class UploadedFile(models.Model):
     processed_data = models.JSONField(default=list)  # Stores the parsed CSV rows
     ai_summary_text = models.TextField(blank=True, null=True) # AI generated insights
     user_upload_index = models.PositiveIntegerField(blank=True, null=True, editable=False)
+    rolled_up = models.BooleanField(default=False, editable=False)  # Counted in TypeRollup
+    sha256 = models.CharField(max_length=64, blank=True, editable=False)  # Hash of the uploaded bytes
 
     def save(self, *args, **kwargs):
         if not self.user_upload_index:
@@ -35,10 +38,30 @@ class UploadedFile(models.Model):
 def submission_delete(sender, instance, **kwargs):
     """
     Deletes file from filesystem when corresponding `UploadedFile` object is deleted.
+    Waits for the commit, so a rolled-back delete (e.g. retention in a failed upload) keeps its file.
     """
     if instance.file:
-        if os.path.isfile(instance.file.path):
-            os.remove(instance.file.path)
+        path = instance.file.path
+        transaction.on_commit(lambda: os.path.isfile(path) and os.remove(path))
+
+@receiver(pre_delete, sender=UploadedFile)
+def submission_rollup_delete(sender, instance, **kwargs):
+    """
+    Subtracts the upload from the materialized type rollups.
+    Runs before the delete so the upload's readings are still linked.
+    Retention pruning sets `keep_rollups` so long-range history survives it.
+    """
+    if getattr(instance, 'keep_rollups', False):
+        return
+    from .rollups import remove_upload_from_rollups
+    remove_upload_from_rollups(instance)
+
+
+DETECTION_MODE_CHOICES = [
+    ('iqr', 'IQR (per parameter)'),
+    ('robust_z', 'Robust z-score (per parameter)'),
+    ('mahalanobis', 'Mahalanobis distance (multivariate)'),
+]
 
 
 class UserThresholdSettings(models.Model):
@@ -55,6 +78,16 @@ class UserThresholdSettings(models.Model):
         default=1.5,
         help_text="IQR multiplier for outliers (0.5-3.0). Q3 + multiplier*IQR = Critical."
     )
+    detection_mode = models.CharField(
+        max_length=16,
+        choices=DETECTION_MODE_CHOICES,
+        default='iqr',
+        help_text="Outlier detection: per-parameter IQR, per-parameter robust z-score, or multivariate Mahalanobis distance."
+    )
+    per_type_bounds = models.BooleanField(
+        default=False,
+        help_text="Compute outlier bounds and warning percentiles within each equipment Type instead of over the whole file."
+    )
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
@@ -62,7 +95,7 @@ class UserThresholdSettings(models.Model):
         verbose_name_plural = "User Threshold Settings"
 
     def __str__(self):
-        return f"Thresholds for {self.user.username}: warning={self.warning_percentile}, outlier={self.outlier_iqr_multiplier}"
+        return f"Thresholds for {self.user.username}: warning={self.warning_percentile}, outlier={self.outlier_iqr_multiplier}, mode={self.detection_mode}, per_type={self.per_type_bounds}"
 
     def clean(self):
         """Validate threshold ranges."""
@@ -71,3 +104,188 @@ class UserThresholdSettings(models.Model):
             raise ValidationError({'warning_percentile': 'Must be between 0.5 and 0.95'})
         if not (0.5 <= self.outlier_iqr_multiplier <= 3.0):
             raise ValidationError({'outlier_iqr_multiplier': 'Must be between 0.5 and 3.0'})
+
+
+ALERT_SEVERITY_CHOICES = [
+    ('warning', 'Warning'),
+    ('critical', 'Critical'),
+]
+
+
+class AlertRule(models.Model):
+    """
+    A user's alert rule: an expression such as
+    `Type == 'Reactor' and Temperature > 180` (see api.rules).
+    Matching rows of every upload are tagged with the rule id and raised to
+    at least `severity`.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='alert_rules')
+    name = models.CharField(max_length=100)
+    expression = models.TextField()
+    severity = models.CharField(max_length=16, choices=ALERT_SEVERITY_CHOICES, default='warning')
+    enabled = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.name} ({self.user.username}): {self.expression}"
+
+
+class Equipment(models.Model):
+    """
+    Dictionary entry for an equipment tag, scoped to a user.
+    Readings reference the tag by id instead of repeating the name, so the
+    time-series table stays narrow and lookups by name hit a unique index.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='equipment')
+    name = models.CharField(max_length=255)
+    name_lower = models.CharField(max_length=255, default='', editable=False)  # Prefix search key
+    equipment_type = models.CharField(max_length=100, blank=True, default='')
+    type_lower = models.CharField(max_length=100, default='', editable=False)  # Prefix search key
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    # Latest reading, refreshed on every upload that contains this tag
+    last_seen_at = models.DateTimeField(null=True, blank=True)
+    latest_flowrate = models.FloatField(null=True, blank=True)
+    latest_pressure = models.FloatField(null=True, blank=True)
+    latest_temperature = models.FloatField(null=True, blank=True)
+    latest_health_status = models.CharField(max_length=10, blank=True, default='')
+    # EWMA baseline per parameter, {name: [mean, variance, updates]} (see api.baselines)
+    baseline = models.JSONField(default=dict, blank=True)
+
+    class Meta:
+        verbose_name_plural = "Equipment"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'name'], name='unique_equipment_name_per_user'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'name_lower'], name='equipment_name_prefix_idx'),
+            models.Index(fields=['user', 'type_lower'], name='equipment_type_prefix_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.equipment_type}) - {self.user.username}"
+
+
+class EquipmentSearchGram(models.Model):
+    """
+    Trigram posting list for substring search over equipment names and types.
+    A query matches the equipment that hold every trigram of the query.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    equipment = models.ForeignKey(Equipment, on_delete=models.CASCADE, related_name='search_grams')
+    gram = models.CharField(max_length=3)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'gram'], name='search_gram_lookup_idx'),
+        ]
+
+
+class EquipmentReading(models.Model):
+    """
+    One row of an uploaded CSV, normalized into the cross-upload time series.
+    Keyed by (equipment, recorded_at) so a series query is an index range scan.
+    Readings outlive the 5-upload retention: the upload link is nulled, not cascaded.
+    """
+    equipment = models.ForeignKey(Equipment, on_delete=models.CASCADE, related_name='readings')
+    upload = models.ForeignKey(UploadedFile, on_delete=models.SET_NULL, null=True, blank=True, related_name='readings')
+    recorded_at = models.DateTimeField()
+    flowrate = models.FloatField(null=True, blank=True)
+    pressure = models.FloatField(null=True, blank=True)
+    temperature = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['recorded_at']
+        indexes = [
+            models.Index(fields=['equipment', 'recorded_at'], name='reading_equipment_time_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.equipment.name} @ {self.recorded_at}"
+
+
+class TypeRollup(models.Model):
+    """
+    Materialized per-(user, equipment type, day) aggregates.
+    Holds counts, sums and sums of squares so means and std devs over any
+    range can be derived without loading upload JSON. Maintained
+    incrementally by api.rollups when uploads are created or deleted.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='type_rollups')
+    equipment_type = models.CharField(max_length=100)
+    period = models.DateField()
+    row_count = models.PositiveIntegerField(default=0)
+    upload_count = models.PositiveIntegerField(default=0)
+    flowrate_count = models.PositiveIntegerField(default=0)
+    flowrate_sum = models.FloatField(default=0.0)
+    flowrate_sumsq = models.FloatField(default=0.0)
+    pressure_count = models.PositiveIntegerField(default=0)
+    pressure_sum = models.FloatField(default=0.0)
+    pressure_sumsq = models.FloatField(default=0.0)
+    temperature_count = models.PositiveIntegerField(default=0)
+    temperature_sum = models.FloatField(default=0.0)
+    temperature_sumsq = models.FloatField(default=0.0)
+
+    class Meta:
+        ordering = ['period', 'equipment_type']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'equipment_type', 'period'], name='unique_type_rollup_bucket'),
+        ]
+        indexes = [
+            models.Index(fields=['period', 'equipment_type'], name='rollup_period_type_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.equipment_type} on {self.period} - {self.user.username}"
+
+
+class ChunkedUpload(models.Model):
+    """
+    A resumable CSV upload in progress.
+
+    The client declares the file size and chunk size up front, PUTs numbered
+    chunks (each with its SHA-256) in any order and as often as needed, and
+    finalizes once every chunk has arrived. Chunk bodies live on disk under
+    CHUNKED_UPLOAD_DIR/<id>/ until then (see api.chunked).
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chunked_uploads')
+    file_name = models.CharField(max_length=255)
+    total_size = models.PositiveBigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    sha256 = models.CharField(max_length=64, blank=True)  # Optional whole-file checksum, verified on finalize
+    parameters = models.TextField(blank=True)  # Optional per-upload parameter list (comma-separated names)
+    received_chunks = models.JSONField(default=list)  # Sorted chunk numbers stored so far
+    finalizing_at = models.DateTimeField(null=True, blank=True)  # Set while a finalize request holds the upload
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    @property
+    def total_chunks(self):
+        return max(1, -(-self.total_size // self.chunk_size))
+
+    def expected_chunk_size(self, number):
+        """Every chunk is `chunk_size` bytes except possibly the last."""
+        if number < self.total_chunks - 1:
+            return self.chunk_size
+        return self.total_size - self.chunk_size * (self.total_chunks - 1)
+
+    def missing_chunks(self):
+        received = set(self.received_chunks)
+        return [n for n in range(self.total_chunks) if n not in received]
+
+    def __str__(self):
+        return f"Chunked upload {self.file_name} ({len(self.received_chunks)}/{self.total_chunks}) - {self.user.username}"
+
+@receiver(post_delete, sender=ChunkedUpload)
+def chunked_upload_delete(sender, instance, **kwargs):
+    """Removes the session's chunk files."""
+    from .chunked import remove_chunks
+    remove_chunks(instance)
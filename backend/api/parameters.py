@@ -0,0 +1,154 @@
+"""
+The numeric parameters (sensor columns) uploads are analysed on.
+
+PARAMETER_SCHEMA (settings) lists them for the deployment as JSON, e.g.
+
+    [{"name": "Flowrate", "unit": "m3/h", "required": true},
+     {"name": "Vibration", "unit": "mm/s", "outlier_iqr_multiplier": 2.0}]
+
+Only `name` is needed. Required parameters are checked on the CSV header
+like the text columns; optional ones are analysed when the CSV has them
+and may have empty cells. `warning_percentile` / `outlier_iqr_multiplier`
+replace the user's threshold for that one parameter. `physical_min` /
+`physical_max` bound the values the sensor can really report; readings
+outside are counted in the upload's data-quality profile.
+
+A single upload can pick its own list with `?parameters=Flowrate,Vibration`.
+Units and overrides still come from the deployment schema, and every
+listed parameter is required.
+"""
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from .analytics import TEXT_COLUMNS, DEFAULT_PARAMETERS, THRESHOLD_KEYS, Parameter, threshold_overrides
+
+# Limits for per-parameter overrides (the same ranges as the user settings)
+THRESHOLD_RANGES = {
+    'warning_percentile': (0.5, 0.95),
+    'outlier_iqr_multiplier': (0.5, 3.0),
+}
+
+# Columns that can't be parameters: the text columns and the columns the analysis adds to rows
+RESERVED_COLUMNS = set(TEXT_COLUMNS) | {'health_status', 'health_color', 'alert_rules', 'baseline_deviation', 'cluster'}
+
+MAX_PARAMETERS = 64
+
+
+class SchemaError(ValueError):
+    """A parameter schema or a per-upload parameter list is invalid."""
+
+
+def parse_schema(entries):
+    """Parameters from schema entries (dicts, or bare column names); raises SchemaError."""
+    if not isinstance(entries, list) or not entries:
+        raise SchemaError("Parameter schema must be a non-empty list")
+    if len(entries) > MAX_PARAMETERS:
+        raise SchemaError(f"At most {MAX_PARAMETERS} parameters are supported")
+
+    parameters = []
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {'name': entry}
+        if not isinstance(entry, dict):
+            raise SchemaError("Each parameter must be an object with a name")
+        name = str(entry.get('name') or '').strip()
+        if not name:
+            raise SchemaError("Each parameter must have a name")
+        if name in RESERVED_COLUMNS:
+            raise SchemaError(f"'{name}' can't be a numeric parameter")
+        if any(p.name == name for p in parameters):
+            raise SchemaError(f"Parameter '{name}' is listed twice")
+
+        limits = {}
+        for key in THRESHOLD_KEYS:
+            if entry.get(key) is None:
+                continue
+            low, high = THRESHOLD_RANGES[key]
+            try:
+                value = float(entry[key])
+            except (ValueError, TypeError):
+                raise SchemaError(f"{name}: {key} must be a number")
+            if not (low <= value <= high):
+                raise SchemaError(f"{name}: {key} must be between {low} and {high}")
+            limits[key] = value
+
+        for key in ('physical_min', 'physical_max'):
+            if entry.get(key) is None:
+                continue
+            try:
+                limits[key] = float(entry[key])
+            except (ValueError, TypeError):
+                raise SchemaError(f"{name}: {key} must be a number")
+        if limits.get('physical_min', -np.inf) > limits.get('physical_max', np.inf):
+            raise SchemaError(f"{name}: physical_min is above physical_max")
+
+        parameters.append(Parameter(
+            name=name,
+            unit=str(entry.get('unit') or ''),
+            required=bool(entry.get('required', False)),
+            **limits,
+        ))
+    return parameters
+
+
+def deployment_schema():
+    """The deployment's parameters (PARAMETER_SCHEMA, default: the three core columns, required)."""
+    entries = getattr(settings, 'PARAMETER_SCHEMA', None)
+    if not entries:
+        return list(DEFAULT_PARAMETERS)
+    try:
+        return parse_schema(entries)
+    except SchemaError as e:
+        raise ImproperlyConfigured(f"PARAMETER_SCHEMA: {e}")
+
+
+def upload_schema(names=None):
+    """
+    Parameters for one upload: the deployment schema, or the comma-separated
+    `names` (all required), taking units and overrides from the schema.
+    """
+    schema = deployment_schema()
+    if not names:
+        return schema
+    known = {p.name: p for p in schema}
+    entries = []
+    for name in (n.strip() for n in str(names).split(',')):
+        if name:
+            entries.append(known[name]._asdict() if name in known else {'name': name})
+    return [p._replace(required=True) for p in parse_schema(entries)]
+
+
+def required_columns(schema):
+    """Columns the CSV header must have for this schema."""
+    return tuple(TEXT_COLUMNS) + tuple(p.name for p in schema if p.required)
+
+
+def present_parameters(schema, columns):
+    """The schema's parameters that the CSV actually has, in schema order."""
+    columns = set(columns)
+    return [p for p in schema if p.name in columns]
+
+
+def stored_parameters(summary):
+    """
+    Parameters an upload was analysed on, from its stored summary. Uploads
+    from before parameter schemas were analysed on the three core columns.
+    """
+    entries = (summary or {}).get('parameters')
+    if not entries:
+        return list(DEFAULT_PARAMETERS)
+    return [
+        Parameter(
+            name=entry['name'],
+            unit=entry.get('unit', ''),
+            required=entry.get('required', True),
+            **entry.get('overrides', {}),
+        )
+        for entry in entries
+    ]
+
+
+def analysis_options(parameters):
+    """`columns` and `overrides` keyword arguments for the analytics functions."""
+    return {'columns': [p.name for p in parameters], 'overrides': threshold_overrides(parameters)}
@@ -0,0 +1,128 @@
+"""
+Opt-in cProfile capture for production hot spots.
+
+For the views listed in PROFILING_VIEWS the middleware runs each request
+under cProfile and keeps the profile when the request was sampled
+(PROFILING_SAMPLE_RATE) or took longer than PROFILING_SLOW_MS. Profiles are
+written as `.prof` files to PROFILING_DIR, which is kept to the newest
+PROFILING_MAX_FILES files (a ring), and can be read with
+`python manage.py profiles` or any pstats/snakeviz tooling.
+
+Settings (see core/settings.py):
+    PROFILING_ENABLED      - master switch (default False)
+    PROFILING_VIEWS        - view class names to profile
+    PROFILING_SAMPLE_RATE  - fraction of those requests always kept (default 0.0)
+    PROFILING_SLOW_MS      - keep any profiled request slower than this (0 = off)
+    PROFILING_DIR          - output directory
+    PROFILING_MAX_FILES    - ring size
+"""
+import cProfile
+import logging
+import os
+import random
+import re
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.urls import Resolver404, resolve
+
+logger = logging.getLogger('api.timing')
+
+# <YYYYmmdd-HHMMSS-ffffff>_<View>_<METHOD>_<ms>ms_<pid>.prof
+PROFILE_NAME = re.compile(
+    r'^(?P<stamp>\d{8}-\d{6}-\d{6})_(?P<view>\w+)_(?P<method>[A-Z]+)_(?P<ms>\d+)ms_(?P<pid>\d+)\.prof$'
+)
+
+
+def profile_dir():
+    return str(getattr(settings, 'PROFILING_DIR', os.path.join(settings.BASE_DIR, 'profiles')))
+
+
+def list_profiles(directory=None):
+    """Captured profiles as dicts (path, view, method, ms, captured_at), newest first."""
+    directory = directory or profile_dir()
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in os.listdir(directory):
+        match = PROFILE_NAME.match(name)
+        if not match:
+            continue
+        profiles.append({
+            'path': os.path.join(directory, name),
+            'view': match['view'],
+            'method': match['method'],
+            'ms': int(match['ms']),
+            'captured_at': datetime.strptime(match['stamp'], '%Y%m%d-%H%M%S-%f'),
+        })
+    profiles.sort(key=lambda p: p['captured_at'], reverse=True)
+    return profiles
+
+
+def _prune(directory, max_files):
+    """Drop the oldest profiles beyond `max_files` (other workers may race us; that's fine)."""
+    for stale in list_profiles(directory)[max_files:]:
+        try:
+            os.remove(stale['path'])
+        except OSError:
+            pass
+
+
+class ProfilingMiddleware:
+    """Profiles requests to the configured views and saves the interesting ones."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'PROFILING_ENABLED', False)
+        self.views = set(getattr(settings, 'PROFILING_VIEWS', []))
+        self.sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0)
+        self.slow_threshold = getattr(settings, 'PROFILING_SLOW_MS', 0.0) / 1000.0
+        self.max_files = getattr(settings, 'PROFILING_MAX_FILES', 50)
+
+    def _view_name(self, request):
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return None
+        view_class = getattr(match.func, 'view_class', None)
+        return view_class.__name__ if view_class else match.func.__name__
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+        view = self._view_name(request)
+        if view not in self.views:
+            return self.get_response(request)
+
+        sampled = random.random() < self.sample_rate
+        if not sampled and self.slow_threshold <= 0:
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is already active on this thread
+            return self.get_response(request)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+        elapsed = time.perf_counter() - start
+
+        if sampled or elapsed >= self.slow_threshold:
+            self._save(profiler, view, request.method, elapsed)
+        return response
+
+    def _save(self, profiler, view, method, elapsed):
+        directory = profile_dir()
+        try:
+            os.makedirs(directory, exist_ok=True)
+            stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+            path = os.path.join(directory, f"{stamp}_{view}_{method}_{int(elapsed * 1000)}ms_{os.getpid()}.prof")
+            profiler.dump_stats(path)
+            _prune(directory, self.max_files)
+        except OSError as e:
+            logger.warning(f"Could not write profile for {view}: {e}")
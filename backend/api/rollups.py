@@ -0,0 +1,149 @@
+"""
+Incremental maintenance and querying of the TypeRollup tables.
+
+Each upload contributes count / sum / sum-of-squares per equipment type to
+the (user, type, day) bucket of its upload date. Creating an upload adds
+its contribution, deleting it subtracts the same amounts, so fleet views
+over long ranges only read a handful of small rows.
+"""
+import math
+
+import pandas as pd
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncYear
+from django.utils import timezone
+
+from .models import TypeRollup
+
+# CSV column -> TypeRollup field prefix
+ROLLUP_PARAMETERS = {
+    'Flowrate': 'flowrate',
+    'Pressure': 'pressure',
+    'Temperature': 'temperature',
+}
+
+GRANULARITIES = {
+    'day': TruncDay,
+    'month': TruncMonth,
+    'year': TruncYear,
+}
+
+
+def type_contributions(df):
+    """
+    Per-type aggregates for one upload in a single groupby.
+    Returns {type: {'row_count': n, 'flowrate_count': .., 'flowrate_sum': .., ...}}.
+    """
+    if df.empty:
+        return {}
+
+    # Uploads analysed on other parameters may lack some of these columns
+    numeric = df.reindex(columns=list(ROLLUP_PARAMETERS)).apply(pd.to_numeric, errors='coerce')
+    squared = numeric.pow(2).add_suffix('__sq')
+    frame = pd.concat([numeric, squared], axis=1)
+    grouped = frame.groupby(df['Type'].astype(str), sort=False)
+
+    counts = grouped[list(ROLLUP_PARAMETERS)].count()
+    sums = grouped.sum(min_count=0)
+    sizes = grouped.size()
+
+    contributions = {}
+    for eq_type in sizes.index:
+        entry = {'row_count': int(sizes[eq_type])}
+        for col, prefix in ROLLUP_PARAMETERS.items():
+            entry[f'{prefix}_count'] = int(counts.at[eq_type, col])
+            entry[f'{prefix}_sum'] = float(sums.at[eq_type, col])
+            entry[f'{prefix}_sumsq'] = float(sums.at[eq_type, f'{col}__sq'])
+        contributions[eq_type] = entry
+    return contributions
+
+
+def _apply(upload_instance, df, sign):
+    """
+    Add (sign=1) or subtract (sign=-1) one upload's contribution.
+
+    An addition first inserts the bucket holding just this upload; if the
+    bucket already exists (made earlier, or by a concurrent worker a moment
+    ago) the unique constraint rejects the insert inside its savepoint and
+    the contribution is added with F() expressions instead, so concurrent
+    workers neither fail nor lose updates.
+    """
+    period = timezone.localtime(upload_instance.uploaded_at).date()
+    for eq_type, entry in type_contributions(df).items():
+        key = {'user': upload_instance.user, 'equipment_type': eq_type, 'period': period}
+        if sign > 0:
+            try:
+                with transaction.atomic():
+                    TypeRollup.objects.create(**key, **entry, upload_count=1)
+                continue
+            except IntegrityError:
+                pass
+        updates = {field: F(field) + sign * value for field, value in entry.items()}
+        updates['upload_count'] = F('upload_count') + sign
+        TypeRollup.objects.filter(**key).update(**updates)
+
+    if sign < 0:
+        # Drop buckets that no longer hold any upload
+        TypeRollup.objects.filter(user=upload_instance.user, period=period, upload_count__lte=0).delete()
+
+
+def add_upload_to_rollups(upload_instance, df):
+    """Fold a freshly analysed upload into its day bucket."""
+    _apply(upload_instance, df, sign=1)
+    upload_instance.rolled_up = True
+    type(upload_instance).objects.filter(pk=upload_instance.pk).update(rolled_up=True)
+
+
+def remove_upload_from_rollups(upload_instance):
+    """Subtract an upload that is about to be deleted (reads its rows from the reading index)."""
+    if not upload_instance.rolled_up:
+        return
+    from .indexing import upload_frame
+    _apply(upload_instance, upload_frame(upload_instance), sign=-1)
+
+
+def _std(count, total, sumsq):
+    """Sample std dev from running sums; None when fewer than 2 values."""
+    if count < 2:
+        return None
+    variance = (sumsq - total * total / count) / (count - 1)
+    return math.sqrt(max(variance, 0.0))
+
+
+def aggregate_rollups(queryset, granularity='month'):
+    """
+    Roll buckets up to the requested granularity per equipment type.
+    Returns rows of {'period', 'type', 'uploads', 'rows', '<param>': {count, mean, std}}.
+    """
+    trunc = GRANULARITIES[granularity]
+    sum_fields = ['row_count', 'upload_count'] + [
+        f'{prefix}_{suffix}' for prefix in ROLLUP_PARAMETERS.values() for suffix in ('count', 'sum', 'sumsq')
+    ]
+    grouped = (
+        queryset.annotate(bucket=trunc('period'))
+        .values('bucket', 'equipment_type')
+        .annotate(**{f'total_{f}': Sum(f) for f in sum_fields})
+        .order_by('bucket', 'equipment_type')
+    )
+
+    results = []
+    for row in grouped:
+        bucket = row['bucket']
+        entry = {
+            'period': bucket.date().isoformat() if hasattr(bucket, 'date') else bucket.isoformat(),
+            'type': row['equipment_type'],
+            'uploads': row['total_upload_count'],
+            'rows': row['total_row_count'],
+        }
+        for prefix in ROLLUP_PARAMETERS.values():
+            count = row[f'total_{prefix}_count'] or 0
+            total = row[f'total_{prefix}_sum'] or 0.0
+            sumsq = row[f'total_{prefix}_sumsq'] or 0.0
+            entry[prefix] = {
+                'count': count,
+                'mean': total / count if count else None,
+                'std': _std(count, total, sumsq),
+            }
+        results.append(entry)
+    return results
@@ -0,0 +1,456 @@
+"""
+User alert rules: a small expression language compiled to NumPy masks.
+
+    Type == 'Reactor' and Temperature > 180 and Pressure > 30
+    Type in ('Pump', 'Compressor') and not Flowrate >= 50
+    `Temperature Rate/h` > 5 or (Pressure < 2 and Flowrate > 120)
+
+Grammar (keywords are case-insensitive):
+
+    expr       := and_expr ('or' and_expr)*
+    and_expr   := not_expr ('and' not_expr)*
+    not_expr   := 'not' not_expr | '(' expr ')' | comparison
+    comparison := operand ('==' | '!=' | '<' | '<=' | '>' | '>=') operand
+                | operand ['not'] 'in' '(' literal (',' literal)* ')'
+    operand    := column | literal
+    column     := identifier | `any column name`
+    literal    := number | -number | 'text' | "text"
+
+A rule is tokenized and parsed once (compile_rule is cached per
+expression) into nested closures over whole columns. Nothing is evaluated
+per row. Within one evaluate_rules call, columns are converted once (text
+columns are factorized to integer codes, so string equality is an integer
+comparison), and identical sub-expressions shared by several rules are
+computed once.
+"""
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from .analytics import HEALTH_COLORS, HEALTH_LEVELS, raise_statuses
+
+MAX_EXPRESSION_LENGTH = 2000
+MAX_RULE_DEPTH = 32
+
+COMPARISONS = {
+    '==': np.equal,
+    '!=': np.not_equal,
+    '<': np.less,
+    '<=': np.less_equal,
+    '>': np.greater,
+    '>=': np.greater_equal,
+}
+# `5 < Pressure` is evaluated as `Pressure > 5`
+MIRRORED = {'==': '==', '!=': '!=', '<': '>', '<=': '>=', '>': '<', '>=': '<='}
+KEYWORDS = {'and', 'or', 'not', 'in'}
+
+TOKEN_RE = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+  | (?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+  | (?P<column>`[^`]+`)
+  | (?P<op>==|!=|<=|>=|<|>|\(|\)|,|-)
+  | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+""", re.VERBOSE)
+
+Token = namedtuple('Token', 'kind value position')
+
+
+class RuleSyntaxError(ValueError):
+    """The expression doesn't parse; the message says where."""
+
+
+class RuleEvaluationError(ValueError):
+    """The expression doesn't fit the upload (unknown column, text compared with a number...)."""
+
+
+def tokenize(text):
+    """Tokens of an expression, ending with an 'end' token."""
+    tokens = []
+    position = 0
+    while position < len(text):
+        match = TOKEN_RE.match(text, position)
+        if not match:
+            raise RuleSyntaxError(f"Unexpected character {text[position]!r} at position {position}")
+        kind = match.lastgroup
+        value = match.group()
+        if kind == 'number':
+            tokens.append(Token('number', float(value), position))
+        elif kind == 'string':
+            body = value[1:-1]
+            tokens.append(Token('string', re.sub(r'\\(.)', r'\1', body), position))
+        elif kind == 'column':
+            tokens.append(Token('column', value[1:-1], position))
+        elif kind == 'name':
+            keyword = value.lower()
+            tokens.append(Token(keyword, keyword, position) if keyword in KEYWORDS else Token('column', value, position))
+        elif kind == 'op':
+            tokens.append(Token(value, value, position))
+        position = match.end()
+    tokens.append(Token('end', None, len(text)))
+    return tokens
+
+
+class Parser:
+    """
+    Recursive-descent parser over tokenize() output. Produces an AST of
+    tuples, hashable so equal sub-expressions can share one mask:
+    ('or', (a, b, ...)), ('and', (...)), ('not', a),
+    ('cmp', op, left, right), ('in', operand, values, negated),
+    with operands ('col', name) / ('num', value) / ('str', value).
+    """
+
+    def __init__(self, text):
+        self.tokens = tokenize(text)
+        self.index = 0
+        self.depth = 0
+
+    @property
+    def current(self):
+        return self.tokens[self.index]
+
+    def advance(self):
+        token = self.current
+        self.index += 1
+        return token
+
+    def expect(self, kind, what=None):
+        if self.current.kind != kind:
+            self.fail(f"expected {what or repr(kind)}")
+        return self.advance()
+
+    def fail(self, message):
+        token = self.current
+        found = 'end of rule' if token.kind == 'end' else repr(token.value)
+        raise RuleSyntaxError(f"{message} at position {token.position}, found {found}")
+
+    def parse(self):
+        node = self.expr()
+        if self.current.kind != 'end':
+            self.fail("expected 'and', 'or' or the end of the rule")
+        return node
+
+    def expr(self):
+        self.depth += 1
+        if self.depth > MAX_RULE_DEPTH:
+            self.fail("rule is nested too deeply")
+        items = [self.and_expr()]
+        while self.current.kind == 'or':
+            self.advance()
+            items.append(self.and_expr())
+        self.depth -= 1
+        return items[0] if len(items) == 1 else ('or', tuple(items))
+
+    def and_expr(self):
+        items = [self.not_expr()]
+        while self.current.kind == 'and':
+            self.advance()
+            items.append(self.not_expr())
+        return items[0] if len(items) == 1 else ('and', tuple(items))
+
+    def not_expr(self):
+        if self.current.kind == 'not':
+            self.advance()
+            self.depth += 1
+            if self.depth > MAX_RULE_DEPTH:
+                self.fail("rule is nested too deeply")
+            node = ('not', self.not_expr())
+            self.depth -= 1
+            return node
+        if self.current.kind == '(':
+            self.advance()
+            node = self.expr()
+            self.expect(')', "')'")
+            return node
+        return self.comparison()
+
+    def comparison(self):
+        left = self.operand()
+        token = self.current
+        if token.kind in COMPARISONS:
+            self.advance()
+            right = self.operand()
+            if left[0] != 'col' and right[0] != 'col':
+                raise RuleSyntaxError(f"Comparison at position {token.position} needs a column on one side")
+            if left[0] != 'col':
+                return ('cmp', MIRRORED[token.kind], right, left)
+            return ('cmp', token.kind, left, right)
+        negated = False
+        if token.kind == 'not':
+            self.advance()
+            negated = True
+            if self.current.kind != 'in':
+                self.fail("expected 'in'")
+        if self.current.kind == 'in':
+            if left[0] != 'col':
+                raise RuleSyntaxError(f"'in' at position {self.current.position} needs a column on the left")
+            self.advance()
+            self.expect('(', "'('")
+            values = [self.literal()]
+            while self.current.kind == ',':
+                self.advance()
+                values.append(self.literal())
+            self.expect(')', "')'")
+            return ('in', left, tuple(values), negated)
+        self.fail("expected a comparison operator or 'in'")
+
+    def operand(self):
+        if self.current.kind == 'column':
+            return ('col', self.advance().value)
+        return self.literal()
+
+    def literal(self):
+        token = self.current
+        if token.kind == 'number':
+            return ('num', self.advance().value)
+        if token.kind == '-':
+            self.advance()
+            return ('num', -self.expect('number', 'a number').value)
+        if token.kind == 'string':
+            return ('str', self.advance().value)
+        self.fail("expected a column, number or quoted text")
+
+
+def parse_rule(text):
+    """AST of a rule expression; raises RuleSyntaxError."""
+    text = str(text or '').strip()
+    if not text:
+        raise RuleSyntaxError("Rule expression is empty")
+    if len(text) > MAX_EXPRESSION_LENGTH:
+        raise RuleSyntaxError(f"Rule expression is longer than {MAX_EXPRESSION_LENGTH} characters")
+    return Parser(text).parse()
+
+
+def rule_columns(node):
+    """Column names an AST refers to."""
+    kind = node[0]
+    if kind == 'col':
+        return {node[1]}
+    if kind in ('or', 'and'):
+        return set().union(*(rule_columns(item) for item in node[1]))
+    if kind == 'not':
+        return rule_columns(node[1])
+    if kind == 'cmp':
+        return rule_columns(node[2]) | rule_columns(node[3])
+    if kind == 'in':
+        return rule_columns(node[1])
+    return set()
+
+
+def referenced_columns(rules):
+    """Columns any of `rules` refers to (rules that don't parse are left out)."""
+    columns = set()
+    for rule in rules:
+        try:
+            columns |= rule_columns(parse_rule(rule.expression))
+        except RuleSyntaxError:
+            continue
+    return columns
+
+
+class RuleFrame:
+    """
+    Columns of one frame as NumPy arrays, converted on first use, plus the
+    masks computed so far (keyed by AST node) so rules share sub-expressions.
+    """
+
+    def __init__(self, df):
+        self.df = df
+        self.rows = len(df)
+        self.columns = {}
+        self.masks = {}
+
+    def column(self, name):
+        """('num', float array) or ('text', codes, {value: code}) for a column."""
+        if name not in self.columns:
+            if name not in self.df.columns:
+                raise RuleEvaluationError(f"Unknown column '{name}'")
+            series = self.df[name]
+            if pd.api.types.is_bool_dtype(series) or not pd.api.types.is_numeric_dtype(series):
+                codes, uniques = pd.factorize(series)
+                self.columns[name] = ('text', codes, {str(value): code for code, value in enumerate(uniques)})
+            else:
+                self.columns[name] = ('num', series.to_numpy(dtype=float))
+        return self.columns[name]
+
+
+def _column_mask(frame, op, column, other):
+    """Mask for `column <op> other`, where other is a literal or another column."""
+    kind, *data = frame.column(column[1])
+    if other[0] == 'col':
+        other_kind, *other_data = frame.column(other[1])
+        if kind != other_kind:
+            raise RuleEvaluationError(f"Can't compare text with numbers ('{column[1]}' vs '{other[1]}')")
+        if kind == 'num':
+            left, right = data[0], other_data[0]
+            with np.errstate(invalid='ignore'):
+                return COMPARISONS[op](left, right) & ~(np.isnan(left) | np.isnan(right))
+        if op not in ('==', '!='):
+            raise RuleEvaluationError(f"Text columns only support == and != (at '{column[1]}')")
+        left = frame.df[column[1]].astype(str).to_numpy()
+        right = frame.df[other[1]].astype(str).to_numpy()
+        present = (data[0] >= 0) & (other_data[0] >= 0)
+        return COMPARISONS[op](left, right) & present
+
+    if kind == 'num':
+        if other[0] != 'num':
+            raise RuleEvaluationError(f"'{column[1]}' is numeric; compare it with a number")
+        values = data[0]
+        with np.errstate(invalid='ignore'):
+            mask = COMPARISONS[op](values, other[1])
+        # Empty cells never match, not even `!=`
+        return mask & ~np.isnan(values) if op == '!=' else mask
+
+    codes, lookup = data
+    if other[0] != 'str':
+        raise RuleEvaluationError(f"'{column[1]}' is text; compare it with quoted text")
+    if op not in ('==', '!='):
+        raise RuleEvaluationError(f"Text columns only support == and != (at '{column[1]}')")
+    code = lookup.get(other[1])
+    if code is None:
+        return np.zeros(frame.rows, dtype=bool) if op == '==' else codes >= 0
+    return codes == code if op == '==' else (codes != code) & (codes >= 0)
+
+
+def _in_mask(frame, column, values, negated):
+    kind, *data = frame.column(column[1])
+    if kind == 'num':
+        if any(v[0] != 'num' for v in values):
+            raise RuleEvaluationError(f"'{column[1]}' is numeric; list numbers after 'in'")
+        column_values = data[0]
+        mask = np.isin(column_values, [v[1] for v in values])
+        present = ~np.isnan(column_values)
+    else:
+        if any(v[0] != 'str' for v in values):
+            raise RuleEvaluationError(f"'{column[1]}' is text; list quoted text after 'in'")
+        codes, lookup = data
+        mask = np.isin(codes, [lookup[v[1]] for v in values if v[1] in lookup])
+        present = codes >= 0
+    return (~mask & present) if negated else mask
+
+
+def _compile(node):
+    """Closure frame -> boolean mask for an AST node (memoized per frame)."""
+    kind = node[0]
+    if kind in ('or', 'and'):
+        parts = [_compile(item) for item in node[1]]
+        combine = np.logical_or if kind == 'or' else np.logical_and
+
+        def evaluate(frame):
+            mask = parts[0](frame).copy()
+            for part in parts[1:]:
+                combine(mask, part(frame), out=mask)
+            return mask
+    elif kind == 'not':
+        inner = _compile(node[1])
+
+        def evaluate(frame):
+            return ~inner(frame)
+    elif kind == 'cmp':
+        _, op, left, right = node
+
+        def evaluate(frame):
+            return _column_mask(frame, op, left, right)
+    else:
+        _, column, values, negated = node
+
+        def evaluate(frame):
+            return _in_mask(frame, column, values, negated)
+
+    def memoized(frame):
+        if node not in frame.masks:
+            frame.masks[node] = evaluate(frame)
+        return frame.masks[node]
+    return memoized
+
+
+@lru_cache(maxsize=4096)
+def compile_rule(text):
+    """Parse and compile an expression once; returns a function frame -> mask."""
+    return _compile(parse_rule(text))
+
+
+RuleMatch = namedtuple('RuleMatch', 'rule positions')
+
+
+def evaluate_rules(df, rules):
+    """
+    Run `rules` (objects with id, name, expression, severity) over `df`.
+    Returns (matches, skipped): a RuleMatch with the matching row positions
+    per rule that evaluated, and {'id', 'name', 'error'} for rules that
+    don't fit this frame (e.g. a column the upload doesn't have).
+    """
+    frame = RuleFrame(df)
+    matches, skipped = [], []
+    for rule in rules:
+        try:
+            mask = compile_rule(rule.expression)(frame)
+        except (RuleSyntaxError, RuleEvaluationError) as e:
+            skipped.append({'id': rule.id, 'name': rule.name, 'error': str(e)})
+            continue
+        matches.append(RuleMatch(rule, np.flatnonzero(mask)))
+    return matches, skipped
+
+
+def severity_codes(matches, rows):
+    """Per-row index into HEALTH_LEVELS of the most severe rule each row matches (0 = none)."""
+    codes = np.zeros(rows, dtype=np.int8)
+    for match in matches:
+        level = HEALTH_LEVELS.index(match.rule.severity)
+        codes[match.positions] = np.maximum(codes[match.positions], level)
+    return codes
+
+
+def escalate(statuses, matches):
+    """Per-row health statuses raised to the severity of any rule the row matches."""
+    if not matches:
+        return statuses
+    return raise_statuses(statuses, severity_codes(matches, len(statuses)))
+
+
+def row_tags(matches):
+    """{row position: [rule ids]} for the rows that matched any rule, ids in rule order."""
+    if not matches:
+        return {}
+    positions = np.concatenate([m.positions for m in matches])
+    ids = np.concatenate([np.full(len(m.positions), m.rule.id) for m in matches])
+    order = np.argsort(positions, kind='stable')
+    positions, ids = positions[order], ids[order]
+    starts = np.flatnonzero(np.r_[True, positions[1:] != positions[:-1]]) if len(positions) else []
+    ends = list(starts[1:]) + [len(positions)]
+    return {int(positions[s]): ids[s:e].tolist() for s, e in zip(starts, ends)}
+
+
+def alerts_summary(matches, skipped):
+    """summary['alerts']: matched row counts per rule and the rules that were skipped."""
+    matched_rows = len(np.unique(np.concatenate([m.positions for m in matches]))) if matches else 0
+    return {
+        'rules': [
+            {'id': m.rule.id, 'name': m.rule.name, 'severity': m.rule.severity, 'matched': int(len(m.positions))}
+            for m in matches
+        ],
+        'skipped': skipped,
+        'matched_rows': int(matched_rows),
+    }
+
+
+def apply_rules(df, records, rules):
+    """
+    Evaluate `rules` on `df` and update its `records` (row dicts with
+    health_status / health_color) in place: matching rows get
+    `alert_rules` (rule ids) and at least the rules' severity.
+    Returns summary['alerts'].
+    """
+    matches, skipped = evaluate_rules(df, rules)
+    severities = severity_codes(matches, len(records))
+    for position, ids in row_tags(matches).items():
+        record = records[position]
+        record['alert_rules'] = ids
+        level = HEALTH_LEVELS[severities[position]]
+        if HEALTH_LEVELS.index(level) > HEALTH_LEVELS.index(record['health_status']):
+            record['health_status'] = level
+            record['health_color'] = HEALTH_COLORS[level]
+    return alerts_summary(matches, skipped)
@@ -1,5 +1,9 @@
 from rest_framework import serializers
 from .models import UploadedFile
+from .analytics import health_records
+from .instrumentation import span
+from .parameters import stored_parameters, analysis_options
+from .rules import apply_rules
 import pandas as pd
 import os
 
@@ -57,63 +61,35 @@ class UploadedFileSerializer(serializers.ModelSerializer):
         
         # Get current thresholds for this user
         warning_percentile, iqr_multiplier = get_threshold_settings_for_serializer(user)
+        from .views import get_detection_options, get_alert_rules  # views imports this module
+        detection_options = get_detection_options(user)
         
-        # Recalculate health status if file exists
+        # Recalculate health status from the stored rows (already validated),
+        # so old uploads don't need their CSV re-read
         try:
-            file_path = instance.file.path
-            if os.path.exists(file_path):
-                df = pd.read_csv(file_path)
-                numeric_cols = ['Flowrate', 'Pressure', 'Temperature']
-                
-                # Recalculate outliers with current thresholds
-                outliers = []
-                for col in numeric_cols:
-                    Q1 = df[col].quantile(0.25)
-                    Q3 = df[col].quantile(0.75)
-                    IQR = Q3 - Q1
-                    lower_bound = Q1 - iqr_multiplier * IQR
-                    upper_bound = Q3 + iqr_multiplier * IQR
-                    
-                    outlier_mask = (df[col] < lower_bound) | (df[col] > upper_bound)
-                    for idx in df[outlier_mask].index:
-                        equipment_name = df.loc[idx, 'Equipment Name']
-                        if equipment_name not in [o['equipment'] for o in outliers]:
-                            outliers.append({
-                                'equipment': equipment_name,
-                                'parameters': []
-                            })
-                        
-                        outlier_entry = next(o for o in outliers if o['equipment'] == equipment_name)
-                        outlier_entry['parameters'].append({
-                            'parameter': col,
-                            'value': float(df.loc[idx, col]),
-                            'lower_bound': float(lower_bound),
-                            'upper_bound': float(upper_bound)
-                        })
-                
-                # Update outliers in summary
+            if instance.processed_data:
+                with span('frame'):
+                    df = pd.DataFrame(instance.processed_data).drop(
+                        columns=['health_status', 'health_color', 'alert_rules'], errors='ignore'
+                    )
+
+                # Recalculate outliers, health status and bounds with current thresholds,
+                # on the parameters the upload was analysed on
+                with span('recompute'):
+                    outliers, data_json, bounds = health_records(
+                        df, warning_percentile, iqr_multiplier, **detection_options,
+                        **analysis_options(stored_parameters(instance.summary)),
+                    )
                 representation['summary']['outliers'] = outliers
-                
-                # Recalculate health status for each equipment
-                data_json = df.to_dict(orient='records')
-                for i, row in enumerate(data_json):
-                    equipment_name = row['Equipment Name']
-                    is_outlier = any(o['equipment'] == equipment_name for o in outliers)
-                    
-                    if is_outlier:
-                        health_status = 'critical'
-                        health_color = '#ef4444'
-                    elif (row['Flowrate'] > df['Flowrate'].quantile(warning_percentile) or 
-                          row['Pressure'] > df['Pressure'].quantile(warning_percentile) or 
-                          row['Temperature'] > df['Temperature'].quantile(warning_percentile)):
-                        health_status = 'warning'
-                        health_color = '#f59e0b'
-                    else:
-                        health_status = 'normal'
-                        health_color = '#10b981'
-                    
-                    data_json[i]['health_status'] = health_status
-                    data_json[i]['health_color'] = health_color
+                representation['summary']['detection_mode'] = detection_options['mode']
+                representation['summary']['bounds'] = bounds
+
+                # Re-tag with the user's current alert rules
+                representation['summary'].pop('alerts', None)
+                rules = get_alert_rules(user)
+                if rules:
+                    with span('rules'):
+                        representation['summary']['alerts'] = apply_rules(df, data_json, rules)
                 
                 # Update processed_data with new health status
                 representation['processed_data'] = data_json
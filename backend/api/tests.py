@@ -1,10 +1,19 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from rest_framework.test import APIClient
 from rest_framework import status
 from django.contrib.auth.models import User
-from .models import UploadedFile
+from .models import UploadedFile, Equipment, EquipmentReading, TypeRollup, AlertRule, ChunkedUpload
+from django.core.management import call_command
+from django.core.files.uploadhandler import StopUpload
 import io
+import os
+from django.conf import settings
+import json
+from collections import namedtuple
+import numpy as np
 import pandas as pd
+from .analytics import analyze, detect_outliers, judge, threshold_sweep, timestamp_column, timeseries_snapshot
+from .indexing import upload_frame
 
 class ApiTests(TestCase):
     def setUp(self):
@@ -38,8 +47,77 @@ class ApiTests(TestCase):
         invalid_csv = io.StringIO("Col1,Col2\n1,2")
         invalid_csv.name = 'invalid.csv'
         response = self.client.post('/api/upload/', {'file': invalid_csv}, format='multipart')
-        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn('Missing required columns', response.data['error'])
+        # Rejected while streaming: nothing was stored
+        self.assertEqual(UploadedFile.objects.count(), 0)
+
+    def test_upload_header_rejected_before_body_is_stored(self):
+        """A bad header in a large body is rejected without spooling the rest."""
+        from api.uploads import CSVUploadHandler
+        handler = CSVUploadHandler()
+        handler.new_file('file', 'big.csv', 'text/csv', None)
+        with self.assertRaises(StopUpload):
+            handler.receive_data_chunk(b"Name,Kind\n" + b"x,y\n" * 10000, 0)
+        self.assertIn('Equipment Name', handler.error)
+
+    def test_upload_stores_hash_of_received_bytes(self):
+        import hashlib
+        body = self.csv_file.getvalue().encode()
+        self.csv_file.name = 'test.csv'
+        response = self.client.post('/api/upload/', {'file': self.csv_file}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(UploadedFile.objects.get().sha256, hashlib.sha256(body).hexdigest())
+
+    def test_upload_sets_aside_invalid_rows(self):
+        """Bad rows are reported and skipped; the rest is analysed."""
+        f = io.StringIO(
+            "Equipment Name,Type,Flowrate,Pressure,Temperature\n"
+            "P1,Pump,100,5.0,120\n"
+            "P2,Pump,110,high,121\n"
+            "P3,,105,5.5,\n"
+            "P1,Pump,100,5.0,120\n"
+            "V1,Valve,50,4.0,100\n"
+        )
+        f.name = 'partial.csv'
+        response = self.client.post('/api/upload/', {'file': f}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        validation = response.data['summary']['validation']
+        self.assertEqual(validation['total_rows'], 5)
+        self.assertEqual(validation['valid_rows'], 2)
+        self.assertEqual(validation['counts'], {'missing': 1, 'invalid': 1, 'duplicate': 1})
+        self.assertEqual(validation['errors'], [
+            {'row': 3, 'equipment': 'P2', 'reasons': ["invalid Pressure: 'high'"]},
+            {'row': 4, 'equipment': 'P3', 'reasons': ['missing Type', 'missing Temperature']},
+            {'row': 5, 'equipment': 'P1', 'reasons': ['duplicate row']},
+        ])
+        self.assertEqual(response.data['summary']['total_count'], 2)
+        self.assertEqual([r['Equipment Name'] for r in response.data['processed_data']], ['P1', 'V1'])
+
+    def test_upload_without_valid_rows(self):
+        f = io.StringIO("Equipment Name,Type,Flowrate,Pressure,Temperature\nP1,Pump,n/a,?,hot\n")
+        f.name = 'bad.csv'
+        response = self.client.post('/api/upload/', {'file': f}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['validation']['rejected_rows'], 1)
+        self.assertEqual(UploadedFile.objects.count(), 0)
+
+    def test_validation_report_is_capped(self):
+        from api.analytics import validate_rows
+        df = pd.DataFrame({
+            'Equipment Name': [f'P{i}' for i in range(10)],
+            'Type': ['Pump'] * 10,
+            'Flowrate': ['x'] * 8 + ['1', '2'],
+            'Pressure': [1.0] * 10,
+            'Temperature': [1.0] * 10,
+        })
+        valid, report = validate_rows(df, limit=3)
+        self.assertEqual(len(valid), 2)
+        self.assertEqual(valid['Flowrate'].tolist(), [1.0, 2.0])
+        self.assertEqual(len(report['errors']), 3)
+        self.assertTrue(report['errors_truncated'])
+        self.assertEqual(report['counts']['invalid'], 8)
 
     def test_history_limit(self):
         """Test that we only keep 5 items."""
@@ -56,3 +134,1382 @@ class ApiTests(TestCase):
         self.client.logout()
         response = self.client.get('/api/history/')
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+class EquipmentSeriesTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='seriesuser', password='testpassword')
+        self.client.force_authenticate(user=self.user)
+
+    def _upload(self, i, pressure):
+        f = io.StringIO(
+            "Equipment Name,Type,Flowrate,Pressure,Temperature\n"
+            f"Pump-3,Pump,100,{pressure},100\nValve-1,Valve,50,4,90"
+        )
+        f.name = f'shift_{i}.csv'
+        return self.client.post('/api/upload/', {'file': f}, format='multipart')
+
+    def test_upload_populates_registry(self):
+        """Each upload adds one reading per row; names are stored once."""
+        self._upload(0, 5.0)
+        self._upload(1, 6.0)
+        self.assertEqual(Equipment.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(EquipmentReading.objects.count(), 4)
+
+    def test_series_survives_retention(self):
+        """Series spans more uploads than the 5 kept by housekeeping."""
+        for i in range(7):
+            self._upload(i, float(i))
+        response = self.client.get('/api/equipment/Pump-3/series/?parameters=pressure')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 7)
+        self.assertEqual([p['pressure'] for p in response.data['points']], [float(i) for i in range(7)])
+        self.assertNotIn('flowrate', response.data['points'][0])
+
+    def test_series_limit_and_errors(self):
+        for i in range(3):
+            self._upload(i, float(i))
+        response = self.client.get('/api/equipment/Pump-3/series/?limit=2')
+        self.assertEqual([p['pressure'] for p in response.data['points']], [1.0, 2.0])
+        response = self.client.get('/api/equipment/Pump-3/series/?parameters=vibration')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get('/api/equipment/Unknown/series/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class DetectionModeTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='modes', password='pw')
+        self.client.force_authenticate(user=self.user)
+        # Flowrate and pressure move together; M0 is normal on each axis but not in combination
+        rng = np.random.default_rng(3)
+        flow = rng.normal(100, 10, 400)
+        self.df = pd.DataFrame({
+            'Equipment Name': [f'M{i}' for i in range(400)],
+            'Type': ['Pump'] * 400,
+            'Flowrate': flow,
+            'Pressure': flow / 20 + rng.normal(0, 0.1, 400),
+            'Temperature': rng.normal(120, 5, 400),
+        })
+        self.df.loc[0, ['Flowrate', 'Pressure']] = [112.0, 4.4]
+
+    def _flagged(self, mode):
+        return {o['equipment'] for o in detect_outliers(self.df, 1.5, mode=mode)}
+
+    def test_mahalanobis_finds_abnormal_combination(self):
+        self.assertNotIn('M0', self._flagged('iqr'))
+        self.assertNotIn('M0', self._flagged('robust_z'))
+        self.assertIn('M0', self._flagged('mahalanobis'))
+        entry = next(o for o in detect_outliers(self.df, 1.5, mode='mahalanobis') if o['equipment'] == 'M0')
+        param = entry['parameters'][0]
+        self.assertEqual(param['parameter'], 'mahalanobis')
+        self.assertGreater(param['value'], param['upper_bound'])
+
+    def test_robust_z_bounds(self):
+        df = pd.DataFrame({
+            'Equipment Name': list('ABCDEF'), 'Type': ['Pump'] * 6,
+            'Flowrate': [10.0, 11.0, 9.0, 10.0, 10.0, 50.0],
+            'Pressure': [1.0] * 6, 'Temperature': [1.0] * 6,
+        })
+        (entry,) = detect_outliers(df, 1.5, mode='robust_z')
+        self.assertEqual(entry['equipment'], 'F')
+        self.assertEqual(entry['parameters'][0]['parameter'], 'Flowrate')
+
+    def test_mode_setting_drives_upload_analysis(self):
+        response = self.client.put('/api/thresholds/', {'detection_mode': 'mahalanobis'}, format='json')
+        self.assertEqual(response.data['detection_mode'], 'mahalanobis')
+        self.assertEqual(self.client.get('/api/thresholds/').data['detection_mode'], 'mahalanobis')
+
+        f = io.StringIO(self.df.to_csv(index=False))
+        f.name = 'modes.csv'
+        response = self.client.post('/api/upload/', {'file': f}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['summary']['detection_mode'], 'mahalanobis')
+        self.assertIn('M0', {o['equipment'] for o in response.data['summary']['outliers']})
+
+    def test_per_type_bounds(self):
+        flow = [100.0, 101.0, 99.0, 100.0, 102.0, 98.0, 100.0, 101.0, 99.0, 130.0]
+        df = pd.DataFrame({
+            'Equipment Name': [f'P{i}' for i in range(10)] + ['HX1', 'HX2', 'HX3'],
+            'Type': ['Pump'] * 10 + ['Heat Exchanger'] * 3,
+            'Flowrate': flow + [400.0, 410.0, 405.0],
+            'Pressure': [5.0] * 13,
+            'Temperature': [100.0] * 13,
+        })
+        pooled = {o['equipment'] for o in detect_outliers(df, 1.5)}
+        self.assertTrue({'HX1', 'HX2', 'HX3'} <= pooled)
+        (entry,) = detect_outliers(df, 1.5, per_type=True)
+        self.assertEqual(entry['equipment'], 'P9')
+        self.assertLess(entry['parameters'][0]['upper_bound'], 130.0)
+
+        summary, records = analyze(df, 0.75, 1.5, per_type=True)
+        self.assertTrue(summary['bounds']['per_type'])
+        self.assertEqual(list(summary['bounds']['groups']), ['Pump', 'Heat Exchanger'])
+        self.assertEqual(summary['bounds']['groups']['Heat Exchanger']['Flowrate']['warning'], 407.5)
+        self.assertEqual({r['Equipment Name'] for r in records if r['health_status'] == 'critical'}, {'P9'})
+
+    def test_recompute_uses_stored_rows_and_current_settings(self):
+        f = io.StringIO(self.df.to_csv(index=False))
+        f.name = 'modes.csv'
+        pk = self.client.post('/api/upload/', {'file': f}, format='multipart').data['id']
+        UploadedFile.objects.get(pk=pk).file.delete(save=False)
+
+        self.client.put('/api/thresholds/', {'detection_mode': 'mahalanobis', 'per_type_bounds': True}, format='json')
+        summary = self.client.get('/api/history/').data[0]['summary']
+        self.assertEqual(summary['detection_mode'], 'mahalanobis')
+        self.assertTrue(summary['bounds']['per_type'])
+        self.assertIn('M0', {o['equipment'] for o in summary['outliers']})
+
+    def test_invalid_mode_rejected(self):
+        response = self.client.put('/api/thresholds/', {'detection_mode': 'magic'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('detection_mode', response.data['errors'])
+
+
+class TimeSeriesTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='historian', password='pw')
+        self.client.force_authenticate(user=self.user)
+
+    def _export(self):
+        # Three hours of 10-minute readings; P2's temperature climbs 30 degrees/hour in the last hour
+        times = pd.date_range('2026-03-01 00:00', periods=18, freq='10min')
+        frames = []
+        for name, eq_type in (('P1', 'Pump'), ('P2', 'Pump'), ('V1', 'Valve')):
+            temperature = np.full(18, 100.0)
+            if name == 'P2':
+                temperature[12:] = 100.0 + 5.0 * np.arange(1, 7)
+            frames.append(pd.DataFrame({
+                'Timestamp': times.strftime('%Y-%m-%d %H:%M:%S'), 'Equipment Name': name, 'Type': eq_type,
+                'Flowrate': 100.0, 'Pressure': 5.0, 'Temperature': temperature,
+            }))
+        return pd.concat(frames).sample(frac=1, random_state=0)
+
+    def test_latest_window_snapshot(self):
+        snapshot, summary = timeseries_snapshot(self._export().assign(
+            Timestamp=lambda d: pd.to_datetime(d['Timestamp'], utc=True)), 'Timestamp', window='1h')
+        self.assertEqual(sorted(snapshot['Equipment Name']), ['P1', 'P2', 'V1'])
+        p2 = snapshot.set_index('Equipment Name').loc['P2']
+        self.assertEqual(p2['Window Readings'], 6)
+        self.assertEqual(p2['Readings'], 18)
+        self.assertAlmostEqual(p2['Temperature'], 117.5)
+        self.assertAlmostEqual(p2['Temperature Rate/h'], 30.0)
+        self.assertEqual(p2['Last Reading'], '2026-03-01T02:50:00Z')
+        self.assertEqual(summary['resample_freq'], '1min')
+        self.assertEqual(summary['readings'], 54)
+
+    def test_retyped_equipment_takes_latest_type(self):
+        # In time order, so each tag's first row in the file has its old type
+        df = self._export().assign(Timestamp=lambda d: pd.to_datetime(d['Timestamp'], utc=True)).sort_values('Timestamp')
+        late = (df['Equipment Name'] == 'V1') & (df['Timestamp'] >= pd.Timestamp('2026-03-01 02:00', tz='UTC'))
+        df.loc[late, 'Type'] = 'Compressor'
+        snapshot, _ = timeseries_snapshot(df, 'Timestamp', window='1h')
+        self.assertEqual(snapshot.set_index('Equipment Name')['Type'].to_dict(), {'P1': 'Pump', 'P2': 'Pump', 'V1': 'Compressor'})
+
+    def test_timestamp_detection(self):
+        df = self._export()
+        self.assertEqual(timestamp_column(df), 'Timestamp')
+        # Named like a timestamp but holding shift numbers or labels: an ordinary column
+        self.assertIsNone(timestamp_column(df.rename(columns={'Timestamp': 'Time'}).assign(Time=3)))
+        labels = df.rename(columns={'Timestamp': 'Date'}).assign(Date='Q1')
+        self.assertIsNone(timestamp_column(labels))
+        self.assertIsNone(timestamp_column(labels.assign(Date=lambda d: d['Date'].where(d.index % 2 == 0, '2026-03-01'))))
+        # An explicit column is used as is, and only that one
+        self.assertEqual(timestamp_column(df.rename(columns={'Timestamp': 'Read At'}), 'Read At'), 'Read At')
+        self.assertIsNone(timestamp_column(df, 'Read At'))
+
+    @override_settings(TIMESERIES_COLUMN='Read At')
+    def test_upload_with_configured_timestamp_column(self):
+        f = io.StringIO(self._export().rename(columns={'Timestamp': 'Read At'}).to_csv(index=False))
+        f.name = 'historian.csv'
+        response = self.client.post('/api/upload/', {'file': f}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['summary']['timeseries']['timestamp_column'], 'Read At')
+        self.assertEqual(response.data['summary']['total_count'], 3)
+
+    def test_upload_with_timestamp_column(self):
+        csv = self._export().to_csv(index=False) + "2026-03-01 99:00:00,V1,Valve,100,5,100\n"
+        f = io.StringIO(csv)
+        f.name = 'historian.csv'
+        response = self.client.post('/api/upload/', {'file': f}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        summary = response.data['summary']
+        self.assertEqual(summary['total_count'], 3)
+        self.assertEqual(summary['timeseries']['equipment'], 3)
+        self.assertEqual(summary['timeseries']['window'], settings.TIMESERIES_WINDOW)
+        self.assertEqual(summary['validation']['errors'][0]['reasons'], ["invalid Timestamp: '2026-03-01 99:00:00'"])
+        rows = {r['Equipment Name']: r for r in response.data['processed_data']}
+        self.assertEqual(set(rows), {'P1', 'P2', 'V1'})
+        self.assertEqual(rows['P2']['health_status'], 'warning')
+        self.assertEqual(EquipmentReading.objects.count(), 3)
+
+
+class ThresholdSweepTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='sweeper', password='pw')
+        self.client.force_authenticate(user=self.user)
+        rng = np.random.default_rng(7)
+        df = pd.DataFrame({
+            'Equipment Name': [f'S{i}' for i in range(60)],
+            'Type': ['Pump', 'Valve', 'Reactor'] * 20,
+            'Flowrate': rng.normal(100, 10, 60).round(1),
+            'Pressure': rng.normal(5, 1, 60).round(2),
+            'Temperature': rng.normal(120, 5, 60).round(1),
+        })
+        f = io.StringIO(df.to_csv(index=False))
+        f.name = 'sweep.csv'
+        self.pk = self.client.post('/api/upload/', {'file': f}, format='multipart').data['id']
+        self.url = f'/api/upload/{self.pk}/threshold-sweep/'
+
+    def test_grid_matches_full_recompute(self):
+        response = self.client.post(self.url, {
+            'warning_percentiles': [0.5, 0.75, 0.9],
+            'outlier_iqr_multipliers': [0.5, 1.5, 3.0],
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 9)
+
+        df = upload_frame(UploadedFile.objects.get(pk=self.pk))
+        for result in response.data['results']:
+            _, statuses, _ = judge(df, result['warning_percentile'], result['outlier_iqr_multiplier'])
+            expected = {level: int((statuses == level).sum()) for level in ('normal', 'warning', 'critical')}
+            self.assertEqual(result['counts'], expected)
+
+        current = next(r for r in response.data['results'] if r['warning_percentile'] == 0.75 and r['outlier_iqr_multiplier'] == 1.5)
+        self.assertEqual(current['counts'], response.data['current']['counts'])
+        self.assertEqual(current['changed_count'], 0)
+        loose = response.data['results'][0]
+        self.assertGreater(loose['changed_count'], 0)
+        first = loose['changed'][0]
+        self.assertNotEqual(first['from'], first['to'])
+
+    def test_counts_include_alert_rules(self):
+        AlertRule.objects.create(user=self.user, name='Reactors', expression="Type == 'Reactor'", severity='critical')
+        response = self.client.post(self.url, {
+            'warning_percentiles': [0.5, 0.9], 'outlier_iqr_multipliers': [0.5, 3.0], 'changed_limit': 200,
+        }, format='json')
+        # The current counts agree with history, which escalates rows by the rules too
+        history = next(u for u in self.client.get('/api/history/').data if u['id'] == self.pk)
+        statuses = [row['health_status'] for row in history['processed_data']]
+        self.assertEqual(response.data['current']['counts'], {level: statuses.count(level) for level in ('normal', 'warning', 'critical')})
+        for result in response.data['results']:
+            self.assertGreaterEqual(result['counts']['critical'], 20)
+            # Reactors (every third row) stay critical whatever the thresholds
+            self.assertFalse([c for c in result['changed'] if int(c['equipment'][1:]) % 3 == 2])
+
+    def test_pairs_and_validation(self):
+        response = self.client.post(self.url, {
+            'pairs': [{'warning_percentile': 0.95, 'outlier_iqr_multiplier': 3.0}], 'changed_limit': 1,
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertLessEqual(len(response.data['results'][0]['changed']), 1)
+
+        response = self.client.post(self.url, {'pairs': [{'warning_percentile': 0.2, 'outlier_iqr_multiplier': 1.5}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('warning_percentile', response.data['errors'])
+        response = self.client.post(self.url, {'warning_percentiles': [0.75]}, format='json')
+        self.assertIn('outlier_iqr_multipliers', response.data['errors'])
+        self.assertEqual(self.client.post('/api/upload/999/threshold-sweep/', {}, format='json').status_code, 404)
+
+    def test_fence_hits_match_judge(self):
+        # Q1 = 0 and Q3 = 22.5, so -63 sits on the k = 2.8 fence, which rounds to just above -63
+        df = pd.DataFrame({
+            'Equipment Name': [f'F{i}' for i in range(11)],
+            'Type': ['Pump', 'Valve'] * 5 + ['Pump'],
+            'Flowrate': [-63.0, 0.0, 0.0, 0.0, 5.0, 10.0, 20.0, 22.0, 23.0, 30.0, 40.0],
+            'Pressure': [5.0] * 11,
+            'Temperature': [float(v % 4) for v in range(11)],
+        })
+        pairs = [(w, m) for w in (0.5, 0.6, 0.7, 0.75, 0.9) for m in (0.5, 0.75, 1.0, 1.5, 2.0, 2.05, 2.8, 3.0)]
+        frames = [df]
+        rng = np.random.default_rng(11)
+        for n in (10, 13, 16, 19):
+            frames.append(pd.DataFrame({
+                'Equipment Name': [f'F{i}' for i in range(n)],
+                'Type': (['Pump', 'Valve'] * n)[:n],
+                'Flowrate': rng.integers(0, 20, n).astype(float),
+                'Pressure': rng.integers(0, 9, n).astype(float),
+                'Temperature': rng.integers(50, 60, n).astype(float),
+            }))
+        for frame in frames:
+            for mode in ('iqr', 'robust_z', 'mahalanobis'):
+                for per_type in (False, True):
+                    result = threshold_sweep(frame, pairs, (0.75, 1.5), mode=mode, per_type=per_type)
+                    for item in result['results']:
+                        _, statuses, _ = judge(frame, item['warning_percentile'], item['outlier_iqr_multiplier'], mode=mode, per_type=per_type)
+                        expected = {level: int((statuses == level).sum()) for level in ('normal', 'warning', 'critical')}
+                        self.assertEqual(item['counts'], expected, (mode, per_type, item['warning_percentile'], item['outlier_iqr_multiplier']))
+
+        self.assertEqual(judge(df, 0.9, 2.8)[1][0], 'critical')
+        self.assertEqual(judge(df, 0.9, 3.0)[1][0], 'normal')
+
+
+class ParameterSchemaTests(TestCase):
+    SCHEMA = [
+        {'name': 'Flowrate', 'unit': 'm3/h', 'required': True},
+        {'name': 'Pressure', 'unit': 'bar', 'required': True},
+        {'name': 'Temperature', 'unit': 'C', 'required': True},
+        {'name': 'Vibration', 'unit': 'mm/s', 'outlier_iqr_multiplier': 3.0},
+        {'name': 'Level', 'unit': '%'},
+    ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='schema', password='pw')
+        self.client.force_authenticate(user=self.user)
+        rng = np.random.default_rng(11)
+        self.df = pd.DataFrame({
+            'Equipment Name': [f'E{i}' for i in range(40)],
+            'Type': ['Pump', 'Valve'] * 20,
+            'Flowrate': rng.normal(100, 10, 40).round(1),
+            'Pressure': rng.normal(5, 1, 40).round(2),
+            'Temperature': rng.normal(120, 5, 40).round(1),
+            'Vibration': rng.normal(2, 0.5, 40).round(2),
+        })
+        self.df.loc[3, 'Vibration'] = np.nan
+        self.df.loc[7, 'Vibration'] = 40.0
+
+    def _post(self, df, url='/api/upload/'):
+        f = io.StringIO(df.to_csv(index=False))
+        f.name = 'sensors.csv'
+        return self.client.post(url, {'file': f}, format='multipart')
+
+    @override_settings(PARAMETER_SCHEMA=SCHEMA)
+    def test_optional_parameters_are_analysed(self):
+        response = self._post(self.df)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        summary = response.data['summary']
+        # Level isn't in the CSV; the empty Vibration cell doesn't reject its row
+        self.assertEqual([p['name'] for p in summary['parameters']], ['Flowrate', 'Pressure', 'Temperature', 'Vibration'])
+        self.assertEqual(summary['validation']['rejected_rows'], 0)
+        vibration = summary['parameters'][3]
+        self.assertEqual((vibration['unit'], vibration['count']), ('mm/s', 39))
+        self.assertEqual(vibration['overrides'], {'outlier_iqr_multiplier': 3.0})
+        self.assertAlmostEqual(vibration['mean'], self.df['Vibration'].mean())
+        self.assertAlmostEqual(summary['avg_vibration'], self.df['Vibration'].mean())
+        self.assertIn('Vibration', summary['correlation_matrix'])
+        self.assertIn('Vibration', summary['bounds']['groups']['all'])
+        flagged = {o['equipment'] for o in summary['outliers'] if any(p['parameter'] == 'Vibration' for p in o['parameters'])}
+        self.assertEqual(flagged, {'E7'})
+
+        # The override holds on recompute, and the rows endpoint knows the extra column
+        rows = self.client.get(f"/api/upload/{response.data['id']}/rows/", {'ordering': '-vibration', 'vibration__gt': 10})
+        self.assertEqual(rows.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['Equipment Name'] for r in rows.data['results']], ['E7'])
+        detail = self.client.get('/api/history/')
+        self.assertEqual(detail.data[0]['summary']['outliers'], summary['outliers'])
+
+    def test_per_upload_parameters(self):
+        df = self.df[['Equipment Name', 'Type', 'Flowrate', 'Vibration']].dropna()
+        response = self._post(df, '/api/upload/?parameters=Flowrate,Vibration')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([p['name'] for p in response.data['summary']['parameters']], ['Flowrate', 'Vibration'])
+        self.assertNotIn('avg_pressure', response.data['summary'])
+
+        # Without the override the core columns are required again
+        response = self._post(df)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('Pressure', response.data['error'])
+        response = self._post(df, '/api/upload/?parameters=Flowrate,Level')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('Level', response.data['error'])
+        response = self._post(df, '/api/upload/?parameters=Flowrate,Type')
+        self.assertIn('parameters', response.data['errors'])
+
+    @override_settings(PARAMETER_SCHEMA=SCHEMA)
+    def test_report_lists_every_parameter(self):
+        # Critical equipment, no AI summary and over 25 rows: the alert table and
+        # "Showing first 25" paths that used to fail (PlatyTable, Helvetica-Italic)
+        response = self._post(self.df)
+        self.assertIn('critical', [r['health_status'] for r in response.data['processed_data']])
+        report = self.client.get(f"/api/report/{response.data['id']}/")
+        self.assertEqual(report.status_code, status.HTTP_200_OK)
+        import base64, re, zlib
+        streams = re.findall(rb'/ASCII85Decode /FlateDecode \] /Length \d+\s*>>\s*stream\r?\n(.*?)endstream', report.content, re.S)
+        text = b''.join(zlib.decompress(base64.a85decode(stream.strip(), adobe=True)) for stream in streams)
+        self.assertIn(b'Avg Vibration \\(mm/s\\)', text)
+        self.assertIn(b'Showing first 25 of 40', text)
+
+    def test_overrides_in_analytics_and_sweep(self):
+        from .analytics import Parameter, warning_bounds
+        columns = ['Flowrate', 'Pressure', 'Temperature', 'Vibration']
+        df = self.df.fillna({'Vibration': 2.0})
+        overrides = {'Vibration': {'outlier_iqr_multiplier': 3.0}, 'Pressure': {'warning_percentile': 0.9}}
+
+        thresholds = warning_bounds(df, [0.75, 0.9, 0.75, 0.75], columns)
+        single = warning_bounds(df, 0.9, ['Pressure'])
+        self.assertEqual(thresholds.upper[0, 1], single.upper[0, 0])
+
+        parameters = [Parameter(c, **overrides.get(c, {})) for c in columns]
+        _, records = analyze(df, 0.75, 1.5, parameters=parameters)
+        _, statuses, _ = judge(df, 0.75, 1.5, columns=columns, overrides=overrides)
+        self.assertEqual([r['health_status'] for r in records], statuses.tolist())
+
+        result = threshold_sweep(df, [(0.6, 0.5), (0.9, 2.5)], (0.75, 1.5), columns=columns, overrides=overrides)
+        for item in result['results']:
+            _, statuses, _ = judge(df, item['warning_percentile'], item['outlier_iqr_multiplier'], columns=columns, overrides=overrides)
+            self.assertEqual(item['counts'], {level: int((statuses == level).sum()) for level in ('normal', 'warning', 'critical')})
+
+
+class AlertRuleTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='rules', password='pw')
+        self.client.force_authenticate(user=self.user)
+        self.df = pd.DataFrame({
+            'Equipment Name': ['R1', 'R2', 'P1', 'P2', 'C1', 'V1'],
+            'Type': ['Reactor', 'Reactor', 'Pump', 'Pump', 'Compressor', 'Valve'],
+            'Flowrate': [100.0, 110.0, 40.0, 60.0, 90.0, 80.0],
+            'Pressure': [5.0, 5.5, 4.0, 4.5, 6.0, 5.0],
+            'Temperature': [185.0, 170.0, 120.0, 125.0, 130.0, 110.0],
+        })
+
+    def _rule(self, expression, **fields):
+        response = self.client.post('/api/alert-rules/', {'name': expression[:20], 'expression': expression, **fields}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        return response.data['id']
+
+    def _upload(self):
+        f = io.StringIO(self.df.to_csv(index=False))
+        f.name = 'rules.csv'
+        return self.client.post('/api/upload/', {'file': f}, format='multipart')
+
+    def test_crud_and_syntax_errors(self):
+        rule_id = self._rule("Type == 'Reactor' and Temperature > 180", severity='critical')
+        rule = self.client.get(f'/api/alert-rules/{rule_id}/').data
+        self.assertEqual(rule['columns'], ['Temperature', 'Type'])
+        self.assertEqual(rule['severity'], 'critical')
+
+        response = self.client.post('/api/alert-rules/', {'name': 'bad', 'expression': 'Temperature >'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('expression', response.data['errors'])
+        response = self.client.put(f'/api/alert-rules/{rule_id}/', {'severity': 'fatal', 'enabled': 'yes'}, format='json')
+        self.assertEqual(set(response.data['errors']), {'severity', 'enabled'})
+
+        response = self.client.put(f'/api/alert-rules/{rule_id}/', {'enabled': False}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.data['enabled'])
+        self.assertEqual(response.data['expression'], "Type == 'Reactor' and Temperature > 180")
+
+        other = APIClient()
+        other.force_authenticate(user=User.objects.create_user(username='other', password='pw'))
+        self.assertEqual(other.get(f'/api/alert-rules/{rule_id}/').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.delete(f'/api/alert-rules/{rule_id}/').status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.client.get('/api/alert-rules/').data, [])
+
+    def test_expressions(self):
+        from .rules import evaluate_rules, parse_rule, RuleSyntaxError
+        Rule = namedtuple('Rule', 'id name expression severity')
+        df = self.df.assign(**{'Temp Rate/h': [1.0, 9.0, np.nan, 2.0, 7.0, 0.0]})
+        cases = {
+            "Type == 'Reactor' and Temperature > 180": ['R1'],
+            "Type in ('Pump', 'Compressor') AND NOT Flowrate >= 50": ['P1'],
+            "`Temp Rate/h` > 5 or (Pressure < 4.5 and 120 <= Temperature)": ['R2', 'P1', 'C1'],
+            "`Temp Rate/h` != 2": ['R1', 'R2', 'C1', 'V1'],
+            "Type not in ('Pump') and -1 < Pressure - 0": None,
+        }
+        for expression, expected in cases.items():
+            if expected is None:
+                with self.assertRaises(RuleSyntaxError):
+                    parse_rule(expression)
+                continue
+            (match,), skipped = evaluate_rules(df, [Rule(1, 'r', expression, 'warning')])
+            self.assertEqual(df['Equipment Name'].iloc[match.positions].tolist(), expected, expression)
+
+        matches, skipped = evaluate_rules(df, [Rule(1, 'r', 'Vibration > 3', 'warning'), Rule(2, 'r', "Pressure == 'high'", 'warning')])
+        self.assertEqual((matches, [s['id'] for s in skipped]), ([], [1, 2]))
+
+    def test_rules_tag_uploads_and_rows(self):
+        reactor = self._rule("Type == 'Reactor' and Temperature > 180", severity='critical')
+        slow = self._rule("Flowrate < 50")
+        self._rule("Vibration > 3")
+        self._rule("Flowrate > 0", enabled=False)
+
+        response = self._upload()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        alerts = response.data['summary']['alerts']
+        self.assertEqual([(r['id'], r['matched']) for r in alerts['rules']], [(reactor, 1), (slow, 1)])
+        self.assertEqual(len(alerts['skipped']), 1)
+        self.assertEqual(alerts['matched_rows'], 2)
+        rows = {r['Equipment Name']: r for r in response.data['processed_data']}
+        self.assertEqual((rows['R1']['alert_rules'], rows['R1']['health_status']), ([reactor], 'critical'))
+        self.assertEqual(rows['P1']['alert_rules'], [slow])
+        self.assertIn(rows['P1']['health_status'], ('warning', 'critical'))
+        self.assertNotIn('alert_rules', rows['V1'])
+
+        page = self.client.get(f"/api/upload/{response.data['id']}/rows/", {'alert_rule': str(reactor)})
+        self.assertEqual([(r['Equipment Name'], r['health_status'], r['alert_rules']) for r in page.data['results']], [('R1', 'critical', [reactor])])
+
+        # Columns outside the reading index are read from the stored rows
+        self.df['Vibration'] = [1.0, 2.0, 5.0, 1.0, 1.0, 1.0]
+        upload = self._upload().data['id']
+        vibration = AlertRule.objects.get(expression='Vibration > 3').id
+        page = self.client.get(f'/api/upload/{upload}/rows/', {'alert_rule': str(vibration)})
+        self.assertEqual([(r['Equipment Name'], r['alert_rules']) for r in page.data['results']], [('P1', [slow, vibration])])
+        self.assertEqual(page.data['results'][0]['Vibration'], 5.0)
+        self.df = self.df.drop(columns='Vibration')
+
+        # Recompute picks up rule changes
+        self.client.put(f'/api/alert-rules/{reactor}/', {'expression': "Type == 'Reactor'"}, format='json')
+        history = self.client.get('/api/history/').data[0]
+        self.assertEqual(history['summary']['alerts']['rules'][0]['matched'], 2)
+        self.assertEqual([r['Equipment Name'] for r in history['processed_data'] if reactor in r.get('alert_rules', [])], ['R1', 'R2'])
+
+
+class BaselineTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='baseline', password='pw')
+        self.client.force_authenticate(user=self.user)
+
+    def _upload(self, rows):
+        f = io.StringIO("Equipment Name,Type,Flowrate,Pressure,Temperature\n" + "\n".join(rows))
+        f.name = 'shift.csv'
+        response = self.client.post('/api/upload/', {'file': f}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        return response.data
+
+    @override_settings(BASELINE_ALPHA=0.5, BASELINE_MIN_UPDATES=2)
+    def test_rows_are_scored_against_their_own_history(self):
+        for flowrate in (100, 102):
+            data = self._upload([f"P1,Pump,{flowrate},5,100", "P2,Pump,50,5,100", "P2,Pump,54,5,100"])
+            self.assertEqual(data['summary']['baseline']['scored_rows'], 0)
+            self.assertIsNone(data['processed_data'][0]['baseline_deviation'])
+
+        # Seeded at 100 with no spread, then one EWMA step towards 102
+        baseline = Equipment.objects.get(user=self.user, name='P1').baseline
+        self.assertEqual(baseline['Flowrate'], [101.0, 1.0, 2])
+        # P2's first upload seeds the variance from its two rows
+        self.assertEqual(Equipment.objects.get(user=self.user, name='P2').baseline['Flowrate'][1], 2.0)
+
+        data = self._upload(["P1,Pump,131,5,100", "P2,Pump,52,5,100"])
+        rows = {r['Equipment Name']: r for r in data['processed_data']}
+        # std 1.0 is under the 1%-of-mean floor (1.01)
+        self.assertAlmostEqual(rows['P1']['baseline_deviation'], 30 / 1.01, places=3)
+        self.assertLess(rows['P2']['baseline_deviation'], 1)
+        top = data['summary']['baseline']['top'][0]
+        self.assertEqual((top['equipment'], top['parameter']), ('P1', 'Flowrate'))
+        self.assertEqual(Equipment.objects.get(user=self.user, name='P1').baseline['Flowrate'][2], 3)
+
+        # Recompute keeps the stored score; search shows the baseline
+        history = self.client.get('/api/history/').data[0]
+        self.assertEqual(history['processed_data'][0]['baseline_deviation'], rows['P1']['baseline_deviation'])
+        result = self.client.get('/api/search/', {'q': 'P1'}).data['results'][0]
+        self.assertEqual(result['baseline']['Flowrate']['updates'], 3)
+
+    def test_only_the_uploads_tags_are_read_and_written(self):
+        from .baselines import load_baselines, update_baselines
+        self._upload(["P1,Pump,100,5,100", "P2,Valve,50,5,100"])
+        self.assertEqual(set(load_baselines(self.user, ['P1', 'P1', 'X9'])), {'P1'})
+
+        p2 = Equipment.objects.get(user=self.user, name='P2')
+        df = pd.DataFrame({'Equipment Name': ['P1', 'X9'], 'Flowrate': [110.0, 1.0]})
+        self.assertEqual(update_baselines(self.user, df, ['Flowrate'], 0.5), 1)
+        # The upsert rewrites the baseline only: no new tag, other fields and tags untouched
+        p1 = Equipment.objects.get(user=self.user, name='P1')
+        self.assertEqual(p1.baseline['Flowrate'], [105.0, 25.0, 2])
+        self.assertEqual(p1.baseline['Pressure'][2], 1)
+        self.assertEqual((p1.equipment_type, p1.latest_flowrate), ('Pump', 100.0))
+        self.assertFalse(Equipment.objects.filter(name='X9').exists())
+        self.assertEqual(Equipment.objects.get(pk=p2.pk).baseline, p2.baseline)
+
+    def test_failed_upload_rolls_back_every_write(self):
+        from unittest import mock
+        self._upload(["P1,Pump,100,5,100", "P2,Valve,50,5,100"])
+        before = list(Equipment.objects.filter(user=self.user).order_by('name').values())
+        counts = (EquipmentReading.objects.count(), TypeRollup.objects.count(), UploadedFile.objects.count())
+        files = set(os.listdir(os.path.join(settings.MEDIA_ROOT, 'uploads')))
+
+        f = io.StringIO("Equipment Name,Type,Flowrate,Pressure,Temperature\nP1,Compressor,140,7,120\nP3,Pump,60,5,100")
+        f.name = 'shift.csv'
+        with mock.patch('api.views.update_baselines', side_effect=RuntimeError('disk full')):
+            response = self.client.post('/api/upload/', {'file': f}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertEqual(response.data, {'error': 'disk full'})
+
+        # Latest values, types, baselines, new tags, readings and rollups are all as before
+        self.assertEqual(list(Equipment.objects.filter(user=self.user).order_by('name').values()), before)
+        self.assertEqual((EquipmentReading.objects.count(), TypeRollup.objects.count(), UploadedFile.objects.count()), counts)
+        self.assertEqual(set(os.listdir(os.path.join(settings.MEDIA_ROOT, 'uploads'))), files)
+
+    def test_scores_are_vectorized_per_equipment(self):
+        from .baselines import deviation_scores
+        df = pd.DataFrame({
+            'Equipment Name': ['A', 'B', 'A', 'C'],
+            'Flowrate': [12.0, 5.0, np.nan, 1.0],
+            'Pressure': [1.0, 5.0, 3.0, 1.0],
+        })
+        baselines = {'A': {'Flowrate': [10.0, 4.0, 5], 'Pressure': [1.0, 0.0, 5]}, 'B': {'Flowrate': [5.0, 1.0, 1]}}
+        scores, worst = deviation_scores(df, baselines, ['Flowrate', 'Pressure'], min_updates=2)
+        # Pressure's zero variance falls back to 1% of the mean
+        np.testing.assert_allclose(scores, [1.0, np.nan, 200.0, np.nan])
+        self.assertEqual(worst.tolist(), [0, -1, 1, -1])
+
+
+class ClusteringTests(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(5)
+        regimes = rng.integers(0, 3, 600)
+        centres = np.array([[50.0, 2.0, 80.0], [100.0, 5.0, 120.0], [150.0, 8.0, 300.0]])
+        values = centres[regimes] + rng.normal(0, [3.0, 0.2, 5.0], (600, 3))
+        self.regimes = regimes
+        self.df = pd.DataFrame(values.round(2), columns=['Flowrate', 'Pressure', 'Temperature'])
+        # The Type label doesn't follow the regimes
+        self.df.insert(0, 'Type', np.where(np.arange(600) % 2, 'Pump', 'Valve'))
+        self.df.insert(0, 'Equipment Name', [f'U{i}' for i in range(600)])
+
+    def test_regimes_are_recovered_from_a_sample(self):
+        from .analytics import operating_clusters
+        summary, labels = operating_clusters(self.df, 3, sample_size=200)
+        self.assertEqual(summary['sample_size'], 200)
+        self.assertEqual(sum(summary['sizes']), 600)
+        self.assertEqual(summary['sizes'], sorted(summary['sizes'], reverse=True))
+        # Every row lands with the rest of its regime
+        pairs = set(zip(self.regimes.tolist(), labels.tolist()))
+        self.assertEqual(len(pairs), 3)
+        centres = sorted(round(c['Pressure']) for c in summary['centroids'])
+        self.assertEqual(centres, [2, 5, 8])
+        self.assertEqual(set(summary['types'][0]), {'Pump', 'Valve'})
+
+        self.assertEqual(operating_clusters(self.df.head(1), 3), (None, None))
+
+    @override_settings(CLUSTER_COUNT=3)
+    def test_upload_summary_and_report(self):
+        client = APIClient()
+        client.force_authenticate(user=User.objects.create_user(username='clusters', password='pw'))
+        f = io.StringIO(self.df.to_csv(index=False))
+        f.name = 'fleet.csv'
+        response = client.post('/api/upload/', {'file': f}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        clusters = response.data['summary']['clusters']
+        self.assertEqual((clusters['k'], clusters['parameters']), (3, ['Flowrate', 'Pressure', 'Temperature']))
+        labels = [r['cluster'] for r in response.data['processed_data']]
+        self.assertEqual(np.bincount(labels).tolist(), clusters['sizes'])
+
+        report = client.get(f"/api/report/{response.data['id']}/")
+        self.assertEqual(report.status_code, status.HTTP_200_OK)
+        self.assertEqual(report['Content-Type'], 'application/pdf')
+
+
+class DataQualityTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=User.objects.create_user(username='quality', password='pw'))
+
+    def test_profile_of_the_file_as_sent(self):
+        csv = (
+            "Equipment Name,Type,Flowrate,Pressure,Temperature,Site\n"
+            "P1,Pump,100,5,120,North\n"
+            "P2,Pump,0,5,-300,North\n"
+            "P3,Pump,-4,high,121,North\n"
+            "P1,Pump,101,,122,North\n"
+            "P4,Pump,99,6,119,North\n"
+        )
+        f = io.StringIO(csv)
+        f.name = 'quality.csv'
+        response = self.client.post('/api/upload/', {'file': f}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        quality = response.data['summary']['data_quality']
+
+        self.assertEqual(quality['rows'], 5)
+        columns = quality['columns']
+        self.assertEqual(columns['Flowrate']['zeros'], 1)
+        # Negative flow and a temperature below absolute zero are out of physical range
+        self.assertEqual((columns['Flowrate']['negatives'], columns['Flowrate']['out_of_range']), (1, 1))
+        self.assertEqual(columns['Temperature']['out_of_range'], 1)
+        self.assertEqual(columns['Pressure']['physical_range'], [None, None])
+        self.assertEqual((columns['Pressure']['nulls'], columns['Pressure']['non_numeric']), (1, 1))
+        self.assertEqual(columns['Site']['dtype'], columns['Type']['dtype'])
+        self.assertEqual(quality['constant_columns'], ['Type', 'Site'])
+        self.assertEqual(quality['duplicate_names'], {'names': 1, 'rows': 2, 'examples': ['P1']})
+        self.assertEqual(quality['totals']['out_of_range'], 2)
+        # The profile covers rows that validation then set aside
+        self.assertEqual(response.data['summary']['validation']['rejected_rows'], 2)
+
+    def test_frozen_readings_and_schema_ranges(self):
+        from .analytics import data_quality
+        from .parameters import parse_schema, SchemaError
+        parameters = parse_schema([{'name': 'Level', 'physical_min': 0, 'physical_max': 100}, 'Flowrate'])
+        df = pd.DataFrame({
+            'Equipment Name': ['T1', 'T2', 'T1', 'T2', 'T1'],
+            'Type': ['Tank', 'Tank', 'Tank', 'Tank', 'Tank'],
+            'Level': [50.0, 101.0, 50.0, 70.0, 50.0],
+            'Flowrate': [1.0, 2.0, 3.0, 2.0, np.nan],
+        })
+        quality = data_quality(df, parameters)
+        # T1 repeats its level twice; T2's flow repeats once
+        self.assertEqual(quality['columns']['Level']['frozen'], 2)
+        self.assertEqual(quality['columns']['Flowrate']['frozen'], 1)
+        self.assertEqual(quality['columns']['Level']['out_of_range'], 1)
+        self.assertEqual(quality['duplicate_names']['rows'], 5)
+
+        with self.assertRaises(SchemaError):
+            parse_schema([{'name': 'Level', 'physical_min': 10, 'physical_max': 0}])
+
+
+class AnalyzeDryRunTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='dryrun', password='pw')
+        self.client.force_authenticate(user=self.user)
+
+    def _media(self):
+        uploads = os.path.join(settings.MEDIA_ROOT, 'uploads')
+        return set(os.listdir(uploads)) if os.path.isdir(uploads) else set()
+
+    def _post(self, url, csv):
+        f = io.StringIO(csv)
+        f.name = 'preview.csv'
+        return self.client.post(url, {'file': f}, format='multipart')
+
+    def test_same_analysis_nothing_stored(self):
+        csv = "Equipment Name,Type,Flowrate,Pressure,Temperature\n" + "\n".join(
+            f"E{i},{'Pump' if i % 2 else 'Valve'},{100 + i},{5 + i % 3},{120 + i % 7}" for i in range(30)
+        ) + "\nE99,Pump,900,5,120"
+        media = self._media()
+
+        response = self._post('/api/analyze/', csv)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertTrue(response.data['dry_run'])
+        self.assertEqual(response.data['file_name'], 'preview.csv')
+        preview = response.data
+        self.assertEqual(UploadedFile.objects.count(), 0)
+        self.assertEqual(Equipment.objects.count(), 0)
+        self.assertEqual(EquipmentReading.objects.count(), 0)
+        self.assertEqual(TypeRollup.objects.count(), 0)
+        self.assertEqual(self._media(), media)
+
+        # A real upload of the same file gives the same results
+        stored = self._post('/api/upload/', csv)
+        self.assertEqual(stored.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(preview['summary']['outliers'], stored.data['summary']['outliers'])
+        self.assertEqual(preview['processed_data'], stored.data['processed_data'])
+        UploadedFile.objects.get().file.delete(save=False)
+
+    def test_errors_match_upload(self):
+        response = self._post('/api/analyze/', "Equipment Name,Type,Flowrate\nE1,Pump,1\n")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('Pressure', response.data['error'])
+        response = self.client.post('/api/analyze/?parameters=Type', {}, format='multipart')
+        self.assertIn('parameters', response.data['errors'])
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self._post('/api/analyze/', "x\n").status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class UploadDiffTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='diffuser', password='testpassword')
+        self.client.force_authenticate(user=self.user)
+        # Diffs are cached by upload ids, which the test database hands out again
+        from django.core.cache import cache
+        cache.clear()
+
+    def _upload(self, rows):
+        f = io.StringIO("Equipment Name,Type,Flowrate,Pressure,Temperature\n" + "\n".join(rows))
+        f.name = 'shift.csv'
+        return self.client.post('/api/upload/', {'file': f}, format='multipart').data['id']
+
+    def test_diff_aligns_by_name(self):
+        base = [f"P{i},Pump,100,5,100" for i in range(8)]
+        a = self._upload(base + ["OLD,Valve,50,4,90"])
+        b = self._upload(base[:7] + ["P7,Pump,100,50,100", "NEW,Valve,50,4,90"])
+
+        response = self.client.get(f'/api/upload/{a}/diff/{b}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['added'], ['NEW'])
+        self.assertEqual(response.data['removed'], ['OLD'])
+
+        p7 = next(e for e in response.data['equipment'] if e['equipment'] == 'P7')
+        self.assertEqual(p7['Pressure_delta'], 45.0)
+        self.assertEqual(p7['health_before'], 'normal')
+        self.assertEqual(p7['health_after'], 'critical')
+        self.assertEqual(response.data['transitions'].get('normal->critical'), 1)
+        self.assertEqual(response.data['summary_changes']['total_count']['delta'], 0)
+
+    def test_diff_applies_alert_rules(self):
+        base = [f"P{i},Pump,100,5,{90 + 2 * i}" for i in range(8)]
+        a = self._upload(base + ["V1,Valve,100,5,95"])
+        b = self._upload(base + ["V1,Valve,100,5,99"])
+        url = f'/api/upload/{a}/diff/{b}/'
+        v1 = next(e for e in self.client.get(url).data['equipment'] if e['equipment'] == 'V1')
+        self.assertEqual((v1['health_before'], v1['health_after']), ('normal', 'normal'))
+
+        # A new rule is not hidden behind the cached diff; it raises V1 (99) but not its earlier 95
+        AlertRule.objects.create(user=self.user, name='Hot', expression="Temperature > 98", severity='critical')
+        response = self.client.get(url)
+        v1 = next(e for e in response.data['equipment'] if e['equipment'] == 'V1')
+        self.assertEqual((v1['health_before'], v1['health_after']), ('normal', 'critical'))
+        self.assertEqual(response.data['transitions'], {'normal->critical': 1})
+        rows = self.client.get(f'/api/upload/{b}/rows/', {'type': 'Valve'}).data['results']
+        self.assertEqual(rows[0]['health_status'], 'critical')
+
+    def test_diff_other_users_upload(self):
+        a = self._upload(["P1,Pump,100,5,100"])
+        other = User.objects.create_user(username='other', password='testpassword')
+        foreign = UploadedFile.objects.create(user=other, file='uploads/x.csv')
+        response = self.client.get(f'/api/upload/{a}/diff/{foreign.pk}/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='rollupuser', password='testpassword')
+        self.client.force_authenticate(user=self.user)
+
+    def _upload(self, rows):
+        f = io.StringIO("Equipment Name,Type,Flowrate,Pressure,Temperature\n" + "\n".join(rows))
+        f.name = 'shift.csv'
+        return self.client.post('/api/upload/', {'file': f}, format='multipart').data['id']
+
+    def test_rollups_accumulate_and_aggregate(self):
+        self._upload(["P1,Pump,100,5,100", "P2,Pump,200,7,100", "V1,Valve,50,4,90"])
+        self._upload(["P1,Pump,300,5,100"])
+
+        response = self.client.get('/api/rollups/?granularity=day')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        pump = next(r for r in response.data['results'] if r['type'] == 'Pump')
+        self.assertEqual(pump['rows'], 3)
+        self.assertEqual(pump['uploads'], 2)
+        self.assertAlmostEqual(pump['flowrate']['mean'], 200.0)
+        self.assertAlmostEqual(pump['flowrate']['std'], 100.0)
+
+    def test_delete_subtracts_but_retention_keeps(self):
+        first = self._upload(["P1,Pump,100,5,100"])
+        UploadedFile.objects.get(pk=first).delete()
+        self.assertFalse(TypeRollup.objects.exists())
+
+        for i in range(7):
+            self._upload([f"P{i},Pump,100,5,100"])
+        self.assertEqual(UploadedFile.objects.count(), 5)
+        self.assertEqual(TypeRollup.objects.get(equipment_type='Pump').row_count, 7)
+
+    def test_existing_bucket_is_added_to(self):
+        # A bucket another worker created between our check and insert
+        from django.utils import timezone
+        TypeRollup.objects.create(user=self.user, equipment_type='Pump', period=timezone.localdate(), row_count=4, upload_count=1)
+        self._upload(["P1,Pump,100,5,100", "V1,Valve,50,4,90"])
+        pump = TypeRollup.objects.get(equipment_type='Pump')
+        self.assertEqual((pump.row_count, pump.upload_count, pump.flowrate_sum), (5, 2, 100.0))
+        self.assertEqual(TypeRollup.objects.get(equipment_type='Valve').row_count, 1)
+
+    def test_fleet_scope_requires_staff(self):
+        response = self.client.get('/api/rollups/?scope=fleet')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_report_command(self):
+        self._upload(["P1,Pump,100,5,100"])
+        out = io.StringIO()
+        call_command('rollup_report', '--json', stdout=out)
+        self.assertEqual(json.loads(out.getvalue())[0]['type'], 'Pump')
+
+
+class UploadRowsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='rowsuser', password='testpassword')
+        self.client.force_authenticate(user=self.user)
+        rows = [f"P{i},Pump,{100 + i},{5 + i},100" for i in range(10)] + ["V1,Valve,50,4,90", "V2,Valve,55,40,90"]
+        f = io.StringIO("Equipment Name,Type,Flowrate,Pressure,Temperature\n" + "\n".join(rows))
+        f.name = 'rows.csv'
+        self.upload_id = self.client.post('/api/upload/', {'file': f}, format='multipart').data['id']
+        self.url = f'/api/upload/{self.upload_id}/rows/'
+
+    def test_filters_and_sorting(self):
+        response = self.client.get(self.url, {'type': 'Pump', 'pressure__gte': 10, 'ordering': '-pressure'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 5)
+        self.assertEqual([r['Equipment Name'] for r in response.data['results']], ['P9', 'P8', 'P7', 'P6', 'P5'])
+
+        response = self.client.get(self.url, {'health_status': 'critical'})
+        self.assertEqual([r['Equipment Name'] for r in response.data['results']], ['V1', 'V2'])
+
+    def test_offset_pagination(self):
+        response = self.client.get(self.url, {'page_size': 5, 'ordering': 'name'})
+        names = [r['Equipment Name'] for r in response.data['results']]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            names += [r['Equipment Name'] for r in response.data['results']]
+        self.assertEqual(len(names), 12)
+        self.assertEqual(names, sorted(names))
+        self.assertIn('offset=5', response.data['previous'])
+
+        response = self.client.get(self.url, {'page_size': 5, 'ordering': 'name', 'offset': 10})
+        self.assertEqual([r['Equipment Name'] for r in response.data['results']], names[10:])
+        self.assertIn('offset', self.client.get(self.url, {'offset': -1}).data['errors'])
+
+    def test_invalid_params(self):
+        response = self.client.get(self.url, {'ordering': 'colour', 'pressure__gt': 'high'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('ordering', response.data['errors'])
+        self.assertIn('pressure__gt', response.data['errors'])
+
+
+class EquipmentSearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='searchuser', password='testpassword')
+        self.client.force_authenticate(user=self.user)
+
+    def _upload(self, rows):
+        f = io.StringIO("Equipment Name,Type,Flowrate,Pressure,Temperature\n" + "\n".join(rows))
+        f.name = 'shift.csv'
+        self.client.post('/api/upload/', {'file': f}, format='multipart')
+
+    def test_prefix_and_substring(self):
+        self._upload(["Pump-3,Pump,100,5,100", "Pump-30,Pump,100,5,100", "HX-1,Heat Exchanger,80,3,150"])
+        self._upload(["Pump-3,Pump,120,6,100"])
+
+        response = self.client.get('/api/search/', {'q': 'pump-3'})
+        self.assertEqual([r['equipment'] for r in response.data['results']], ['Pump-3', 'Pump-30'])
+        self.assertEqual(response.data['results'][0]['latest']['flowrate'], 120.0)
+        self.assertIsNotNone(response.data['results'][0]['health_status'])
+
+        response = self.client.get('/api/search/', {'q': 'exchanger'})
+        self.assertEqual([r['equipment'] for r in response.data['results']], ['HX-1'])
+
+        response = self.client.get('/api/search/', {'q': 'hx'})
+        self.assertEqual([r['equipment'] for r in response.data['results']], ['HX-1'])
+
+    def test_short_queries_types_and_limit(self):
+        self._upload(["Pump-3,Pump,100,5,100", "HX-1,Heat Exchanger,80,3,150", "ABAB,Valve,90,4,120"])
+
+        # Short queries cover the type prefix too
+        response = self.client.get('/api/search/', {'q': 'he'})
+        self.assertEqual([r['equipment'] for r in response.data['results']], ['HX-1'])
+        # Every trigram of 'ababa' is in 'abab valve', but not as one substring
+        response = self.client.get('/api/search/', {'q': 'ababa'})
+        self.assertEqual(response.data['count'], 0)
+        response = self.client.get('/api/search/', {'q': 'p', 'limit': 1})
+        self.assertEqual([r['equipment'] for r in response.data['results']], ['Pump-3'])
+
+        from .indexing import search_equipment
+        with self.assertNumQueries(1):
+            self.assertEqual([e.name for e in search_equipment(self.user, 'ump', limit=1)], ['Pump-3'])
+
+    def test_latest_values_and_retype(self):
+        self._upload(["Pump-3,Pump,100,5,100", "HX-1,Heat Exchanger,80,3,150"])
+        first = {e.name: e for e in Equipment.objects.filter(user=self.user)}
+        self._upload(["Pump-3,Compressor,120,6,100", "HX-1,Heat Exchanger,80,3,150"])
+        pump, hx = (Equipment.objects.get(user=self.user, name=name) for name in ('Pump-3', 'HX-1'))
+
+        self.assertEqual((pump.equipment_type, pump.type_lower, pump.latest_flowrate), ('Compressor', 'compressor', 120.0))
+        self.assertEqual(pump.created_at, first['Pump-3'].created_at)
+        # Unchanged tags only move last_seen_at
+        self.assertEqual(hx.latest_temperature, 150.0)
+        self.assertGreater(hx.last_seen_at, first['HX-1'].last_seen_at)
+        response = self.client.get('/api/search/', {'q': 'compressor'})
+        self.assertEqual([r['equipment'] for r in response.data['results']], ['Pump-3'])
+
+    def test_search_is_user_scoped(self):
+        self._upload(["Pump-3,Pump,100,5,100"])
+        other = User.objects.create_user(username='other', password='testpassword')
+        self.client.force_authenticate(user=other)
+        response = self.client.get('/api/search/', {'q': 'pump'})
+        self.assertEqual(response.data['count'], 0)
+
+
+class BenchmarkSuiteTests(TestCase):
+    def test_generator_matches_sample_schema(self):
+        from benchmarks.synthetic import generate_equipment_frame
+        sample = pd.read_csv(os.path.join(settings.BASE_DIR.parent, 'sample_csv', 'sample_equipment_data.csv'))
+        df = generate_equipment_frame(500, type_cardinality=9, outlier_rate=0.05, seed=7)
+        self.assertEqual(list(df.columns), list(sample.columns))
+        self.assertEqual(df['Type'].nunique(), 9)
+        self.assertTrue(df.equals(generate_equipment_frame(500, type_cardinality=9, outlier_rate=0.05, seed=7)))
+
+    def test_pipeline_reports_every_stage(self):
+        from benchmarks.synthetic import generate_equipment_csv
+        from benchmarks.run_benchmarks import benchmark_user, run_pipeline, compare_to_baseline
+        with override_settings(CLUSTER_COUNT=2), benchmark_user() as user:
+            result = run_pipeline(generate_equipment_csv(200), user, repeat=1)
+            self.assertFalse(UploadedFile.objects.filter(user=user).exists())
+        for stage in ('parse', 'quality', 'stats', 'outliers', 'health', 'rules', 'baseline', 'clusters', 'index', 'serialize'):
+            self.assertIn('seconds', result[stage])
+            self.assertIn('peak_memory_bytes', result[stage])
+        self.assertGreater(result['db']['queries'], 0)
+        self.assertFalse(User.objects.filter(username='benchmark').exists())
+
+        report = {'results': {'200': {'index': {'seconds': 1.0}}}}
+        baseline = {'results': {'200': {'index': {'seconds': 0.5}}}}
+        self.assertEqual(compare_to_baseline(report, baseline)[0]['stage'], 'index')
+
+
+    def test_index_stage_scales_linearly(self):
+        from benchmarks.synthetic import generate_equipment_csv
+        from benchmarks.run_benchmarks import benchmark_user, run_pipeline, scaling_violations
+        report = {'results': {}}
+        for rows in (300, 3000):
+            csv_bytes = generate_equipment_csv(rows)
+            with benchmark_user(warm_up=csv_bytes) as user:
+                report['results'][str(rows)] = run_pipeline(csv_bytes, user, repeat=1, measure_memory=False)
+        self.assertNotIn('index', [v['stage'] for v in scaling_violations(report)])
+        # Refreshing existing tags is a handful of set-based statements, not per-row work (was ~2.5 ms/row)
+        self.assertLess(report['results']['3000']['index']['seconds'] / 3000, 0.001)
+
+
+class ServerTimingTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='timinguser', password='testpassword')
+        self.client.force_authenticate(user=self.user)
+
+    @override_settings(SERVER_TIMING_LOG_MS=0, SERVER_TIMING_SAMPLE_RATE=1.0)
+    def test_upload_reports_stage_timings(self):
+        self.user.is_staff = True
+        self.user.save()
+        f = io.StringIO("Equipment Name,Type,Flowrate,Pressure,Temperature\nP1,Pump,100,5,100\nV1,Valve,50,4,90")
+        f.name = 'timing.csv'
+        with self.assertLogs('api.timing', level='INFO') as logs:
+            response = self.client.post('/api/upload/', {'file': f}, format='multipart')
+
+        header = response['Server-Timing']
+        for stage in ('parse', 'stats', 'outliers', 'health', 'serialize', 'db;', 'total;'):
+            self.assertIn(stage, header)
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line['status'], 201)
+        self.assertGreater(line['db_queries'], 0)
+        self.assertGreater(line['bytes'], 0)
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=0.0)
+    def test_unsampled_requests_have_no_header(self):
+        response = self.client.get('/api/history/')
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(SERVER_TIMING_LOG_MS=0, SERVER_TIMING_SAMPLE_RATE=1.0)
+    def test_header_is_staff_only_but_always_logged(self):
+        with self.assertLogs('api.timing', level='INFO'):
+            response = self.client.get('/api/history/')
+        self.assertNotIn('Server-Timing', response)
+        with override_settings(SERVER_TIMING_HEADER='all'):
+            self.assertIn('Server-Timing', APIClient().get('/api/history/'))
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='metricsuser', password='testpassword')
+
+    def _sample(self, name, labels=None):
+        from prometheus_client import REGISTRY
+        return REGISTRY.get_sample_value(name, labels or {}) or 0.0
+
+    def test_metrics_restricted_to_staff_or_localhost(self):
+        response = self.client.get('/api/metrics', REMOTE_ADDR='10.1.2.3')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        # X-Real-IP counts only from a trusted proxy or a unix socket
+        response = self.client.get('/api/metrics', REMOTE_ADDR='', HTTP_X_REAL_IP='127.0.0.1')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get('/api/metrics', REMOTE_ADDR='127.0.0.1', HTTP_X_REAL_IP='10.1.2.3')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get('/api/metrics', REMOTE_ADDR='10.1.2.3', HTTP_X_REAL_IP='127.0.0.1')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.user.is_staff = True
+        self.user.save()
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get('/api/metrics', REMOTE_ADDR='10.1.2.3')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+
+    def test_upload_records_request_upload_and_stage_metrics(self):
+        self.client.force_authenticate(user=self.user)
+        uploads_before = self._sample('api_upload_rows_count')
+        requests_before = self._sample(
+            'api_requests_total', {'view': 'FileUploadView', 'method': 'POST', 'status': '201'}
+        )
+        outliers_before = self._sample('api_stage_duration_seconds_count', {'stage': 'outliers'})
+
+        f = io.StringIO("Equipment Name,Type,Flowrate,Pressure,Temperature\nP1,Pump,100,5,100\nV1,Valve,50,4,90")
+        f.name = 'metrics.csv'
+        with override_settings(SERVER_TIMING_SAMPLE_RATE=0.0):
+            self.client.post('/api/upload/', {'file': f}, format='multipart')
+
+        self.assertEqual(self._sample('api_upload_rows_count'), uploads_before + 1)
+        self.assertEqual(
+            self._sample('api_requests_total', {'view': 'FileUploadView', 'method': 'POST', 'status': '201'}),
+            requests_before + 1,
+        )
+        # Stage histograms fill in even when the request is not sampled for Server-Timing
+        self.assertEqual(self._sample('api_stage_duration_seconds_count', {'stage': 'outliers'}), outliers_before + 1)
+
+        from api.metrics import record_cache
+        record_cache('metrics_test', hit=True)
+        record_cache('metrics_test', hit=False)
+        body = self.client.get('/api/metrics').content.decode()
+        self.assertIn('api_request_duration_seconds_bucket{', body)
+        self.assertIn('api_requests_in_flight', body)
+        self.assertIn('api_cache_hit_ratio{cache="metrics_test"} 0.5', body)
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        import tempfile
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='profileuser', password='testpassword')
+        self.client.force_authenticate(user=self.user)
+        self.profile_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.profile_dir, ignore_errors=True)
+
+    def test_sampled_requests_write_bounded_ring(self):
+        from api.profiling import list_profiles
+        with override_settings(
+            PROFILING_ENABLED=True, PROFILING_VIEWS=['HistoryView'], PROFILING_SAMPLE_RATE=1.0,
+            PROFILING_SLOW_MS=0, PROFILING_DIR=self.profile_dir, PROFILING_MAX_FILES=2,
+        ):
+            for _ in range(3):
+                self.client.get('/api/history/')
+            # Not a configured view
+            self.client.get('/api/thresholds/')
+
+        profiles = list_profiles(self.profile_dir)
+        self.assertEqual(len(profiles), 2)
+        self.assertEqual({p['view'] for p in profiles}, {'HistoryView'})
+
+        out = io.StringIO()
+        call_command('profiles', '--dir', self.profile_dir, '--summary', '--top', '5', stdout=out)
+        self.assertIn('Merged 2 profile(s)', out.getvalue())
+        self.assertIn('function calls', out.getvalue())
+
+    def test_slow_threshold_keeps_only_slow_requests(self):
+        from api.profiling import list_profiles
+        with override_settings(
+            PROFILING_ENABLED=True, PROFILING_VIEWS=['HistoryView'], PROFILING_SAMPLE_RATE=0.0,
+            PROFILING_SLOW_MS=60_000, PROFILING_DIR=self.profile_dir,
+        ):
+            self.client.get('/api/history/')
+        self.assertEqual(list_profiles(self.profile_dir), [])
+
+class MemoryProfileTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='memoryuser', password='testpassword')
+        self.client.force_authenticate(user=self.user)
+        self.csv_text = "Equipment Name,Type,Flowrate,Pressure,Temperature\nP1,Pump,100,5,100\nV1,Valve,50,4,90\n"
+
+    def test_header_flag_reports_per_stage_memory_in_debug_only(self):
+        f = io.StringIO(self.csv_text)
+        f.name = 'memory.csv'
+        response = self.client.post('/api/upload/', {'file': f}, format='multipart', HTTP_X_MEMORY_PROFILE='1')
+        self.assertNotIn('Memory-Profile', response)
+
+        f = io.StringIO(self.csv_text)
+        f.name = 'memory.csv'
+        with override_settings(DEBUG=True), self.assertLogs('api.timing', level='INFO') as logs:
+            response = self.client.post('/api/upload/', {'file': f}, format='multipart', HTTP_X_MEMORY_PROFILE='1')
+        self.assertEqual(response.status_code, 201)
+        for stage in ('parse;peak=', 'health;peak=', 'total;peak='):
+            self.assertIn(stage, response['Memory-Profile'])
+        line = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(line['event'], 'memory_profile')
+        self.assertIn('top', line['stages']['parse'])
+
+    def test_command_enforces_per_row_budget(self):
+        import tempfile
+        from django.core.management.base import CommandError
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write(self.csv_text)
+        self.addCleanup(os.remove, f.name)
+
+        out = io.StringIO()
+        call_command('memory_profile', f.name, '--json', '--top', '0', stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['rows'], 2)
+        self.assertGreater(report['peak_bytes'], 0)
+        self.assertIn('outliers', report['stages'])
+
+        with self.assertRaises(CommandError):
+            call_command('memory_profile', f.name, '--budget', '1', '--top', '0', stdout=io.StringIO())
+
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        import tempfile
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='chunkuser', password='testpassword')
+        self.client.force_authenticate(user=self.user)
+        self.chunk_dir = tempfile.mkdtemp()
+        self.override = override_settings(CHUNKED_UPLOAD_DIR=self.chunk_dir)
+        self.override.enable()
+        lines = ["Equipment Name,Type,Flowrate,Pressure,Temperature"]
+        lines += [f"Pump-{i},Pump,{100 + i % 7},{5 + i % 3},{110 + i % 5}" for i in range(60)]
+        self.body = ("\n".join(lines) + "\n").encode()
+
+    def tearDown(self):
+        import shutil
+        self.override.disable()
+        shutil.rmtree(self.chunk_dir, ignore_errors=True)
+
+    def _init(self, body, **extra):
+        import hashlib
+        response = self.client.post('/api/uploads/chunked/', {
+            'file_name': 'big.csv', 'total_size': len(body), 'chunk_size': 1024,
+            'sha256': hashlib.sha256(body).hexdigest(), **extra,
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data
+
+    def _put(self, upload_id, number, data, checksum=None):
+        import hashlib
+        return self.client.generic(
+            'PUT', f'/api/uploads/chunked/{upload_id}/chunks/{number}/', data,
+            content_type='application/octet-stream',
+            HTTP_X_CHUNK_SHA256=checksum or hashlib.sha256(data).hexdigest(),
+        )
+
+    def test_resumable_upload_finalizes_into_pipeline(self):
+        session = self._init(self.body)
+        upload_id, total = session['upload_id'], session['total_chunks']
+        self.assertEqual(total, -(-len(self.body) // 1024))
+        chunks = [self.body[i:i + 1024] for i in range(0, len(self.body), 1024)]
+
+        # Last chunk first; a corrupted chunk is rejected and nothing is recorded
+        self.assertEqual(self._put(upload_id, total - 1, chunks[-1]).status_code, 200)
+        self.assertEqual(self._put(upload_id, 0, chunks[0], checksum='0' * 64).status_code, 400)
+
+        response = self.client.post(f'/api/uploads/chunked/{upload_id}/finalize/')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['missing_chunks'], list(range(total - 1)))
+
+        # "Reconnect": ask what is missing and send only that (one chunk twice)
+        missing = self.client.get(f'/api/uploads/chunked/{upload_id}/').data['missing_chunks']
+        for number in missing + [0]:
+            self.assertEqual(self._put(upload_id, number, chunks[number]).status_code, 200)
+        self.assertTrue(self.client.get(f'/api/uploads/chunked/{upload_id}/').data['complete'])
+
+        response = self.client.post(f'/api/uploads/chunked/{upload_id}/finalize/')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['summary']['total_count'], 60)
+        self.assertEqual(UploadedFile.objects.get().file.read(), self.body)
+        self.assertFalse(os.listdir(self.chunk_dir))
+
+    def test_concurrent_finalize_is_rejected(self):
+        from .chunked import claim_finalize, release_finalize
+        session = self._init(self.body)
+        upload_id = session['upload_id']
+        for number in range(session['total_chunks']):
+            self._put(upload_id, number, self.body[number * 1024:(number + 1) * 1024])
+
+        # Another request is mid-finalize: no second file, no chunk changes
+        upload = ChunkedUpload.objects.get(pk=upload_id)
+        self.assertTrue(claim_finalize(upload))
+        self.assertFalse(claim_finalize(upload))
+        response = self.client.post(f'/api/uploads/chunked/{upload_id}/finalize/')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(self._put(upload_id, 0, self.body[:1024]).status_code, status.HTTP_409_CONFLICT)
+        self.assertTrue(self.client.get(f'/api/uploads/chunked/{upload_id}/').data['finalizing'])
+        self.assertFalse(UploadedFile.objects.exists())
+
+        release_finalize(upload)
+        self.assertEqual(self.client.post(f'/api/uploads/chunked/{upload_id}/finalize/').status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.client.post(f'/api/uploads/chunked/{upload_id}/finalize/').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(UploadedFile.objects.count(), 1)
+
+    def test_bad_header_in_first_chunk_aborts_upload(self):
+        body = b"Name,Kind\n" + b"x,y\n" * 400
+        session = self._init(body)
+        response = self._put(session['upload_id'], 0, body[:1024])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('Missing required columns', response.data['error'])
+        self.assertEqual(self.client.get(f"/api/uploads/chunked/{session['upload_id']}/").status_code, 404)
+
+    def test_init_validates_sha256(self):
+        import hashlib
+        response = self.client.post('/api/uploads/chunked/', {
+            'file_name': 'big.csv', 'total_size': len(self.body), 'sha256': 'g' * 64,
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('sha256', response.data['errors'])
+        self._init(self.body, sha256=hashlib.sha256(self.body).hexdigest().upper())
+        self.assertEqual(ChunkedUpload.objects.get().sha256, hashlib.sha256(self.body).hexdigest())
+
+    def test_wrong_chunk_size_and_other_users_upload(self):
+        session = self._init(self.body)
+        self.assertEqual(self._put(session['upload_id'], 0, self.body[:100]).status_code, 400)
+
+        other = User.objects.create_user(username='otherchunk', password='testpassword')
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self._put(session['upload_id'], 0, self.body[:1024]).status_code, 404)
+
+class CompressedUploadTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='gzipuser', password='testpassword')
+        self.client.force_authenticate(user=self.user)
+        self.body = b"Equipment Name,Type,Flowrate,Pressure,Temperature\nP1,Pump,100,5,100\nV1,Valve,50,4,90\n"
+
+    def test_gzip_file_is_decompressed_and_stored_as_csv(self):
+        import gzip
+        import hashlib
+        f = io.BytesIO(gzip.compress(self.body))
+        f.name = 'export.csv.gz'
+        response = self.client.post('/api/upload/', {'file': f}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        upload = UploadedFile.objects.get()
+        self.assertTrue(upload.file.name.endswith('.csv'))
+        self.assertEqual(upload.file.read(), self.body)
+        self.assertEqual(upload.sha256, hashlib.sha256(self.body).hexdigest())
+
+    def test_gzip_content_encoding_body(self):
+        import gzip
+        from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+        f = io.BytesIO(self.body)
+        f.name = 'plain.csv'
+        payload = gzip.compress(encode_multipart(BOUNDARY, {'file': f}))
+        response = self.client.generic(
+            'POST', '/api/upload/', payload, content_type=MULTIPART_CONTENT, HTTP_CONTENT_ENCODING='gzip',
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['summary']['total_count'], 2)
+
+    def test_corrupt_or_unsupported_compression_is_rejected(self):
+        f = io.BytesIO(b'definitely not gzip')
+        f.name = 'broken.csv.gz'
+        response = self.client.post('/api/upload/', {'file': f}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('decompress', response.data['error'])
+
+        from api import uploads
+        if uploads.zstandard is None:
+            f = io.BytesIO(b'\x28\xb5\x2f\xfd')
+            f.name = 'export.csv.zst'
+            response = self.client.post('/api/upload/', {'file': f}, format='multipart')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('not supported', response.data['error'])
+        self.assertEqual(UploadedFile.objects.count(), 0)
+
+    @override_settings(UPLOAD_MAX_DECOMPRESSED_SIZE=1024)
+    def test_decompressed_size_is_capped(self):
+        import gzip
+        f = io.BytesIO(gzip.compress(self.body + b"P2,Pump,1,1,1\n" * 1000))
+        f.name = 'bomb.csv.gz'
+        response = self.client.post('/api/upload/', {'file': f}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('exceeds', response.data['error'])
+
+    def test_chunked_gzip_upload(self):
+        import gzip
+        import hashlib
+        import tempfile
+        chunk_dir = tempfile.mkdtemp()
+        self.addCleanup(__import__('shutil').rmtree, chunk_dir, True)
+        compressed = gzip.compress(self.body)
+        with override_settings(CHUNKED_UPLOAD_DIR=chunk_dir):
+            session = self.client.post('/api/uploads/chunked/', {
+                'file_name': 'export.csv.gz', 'total_size': len(compressed), 'chunk_size': 1024,
+            }, format='json').data
+            self.client.generic(
+                'PUT', f"/api/uploads/chunked/{session['upload_id']}/chunks/0/", compressed,
+                content_type='application/octet-stream',
+                HTTP_X_CHUNK_SHA256=hashlib.sha256(compressed).hexdigest(),
+            )
+            response = self.client.post(f"/api/uploads/chunked/{session['upload_id']}/finalize/")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(UploadedFile.objects.get().file.read(), self.body)
@@ -0,0 +1,318 @@
+"""
+Streaming receipt of CSV uploads.
+
+`CSVUploadHandler` sits in front of Django's default upload handlers for
+`FileUploadView`. As the multipart body streams in it:
+
+- decompresses `.csv.gz` / `.csv.zst` files chunk by chunk,
+- validates the CSV header row from the first chunk(s) and stops the upload
+  straight away when required columns are missing,
+- hashes the CSV content (SHA-256),
+- spools it into a single SpooledTemporaryFile that stays in memory up to
+  FILE_UPLOAD_MAX_MEMORY_SIZE and rolls over to disk beyond that (instead of
+  Django buffering the whole file and then copying it again).
+
+Whole request bodies sent with `Content-Encoding: gzip` are decoded on the
+fly by `decode_request_body()` before the multipart parser reads them.
+
+The view then parses and analyses the spooled file and only persists an
+`UploadedFile` when the analysis succeeded.
+"""
+import csv
+import hashlib
+import tempfile
+import zlib
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+
+try:
+    import zstandard
+except ImportError:  # optional: only needed for .csv.zst uploads
+    zstandard = None
+
+# Required header columns without a parameter schema (see api.parameters.required_columns)
+REQUIRED_COLUMNS = ('Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature')
+
+# Accepted file name suffixes -> compression codec
+CSV_SUFFIXES = {
+    '.csv': None,
+    '.csv.gz': 'gzip',
+    '.csv.zst': 'zstd',
+}
+
+# A header row longer than this is not an equipment CSV
+MAX_HEADER_BYTES = 64 * 1024
+
+
+class DecompressionError(ValueError):
+    """A compressed upload could not be decoded (corrupt, unsupported or too large)."""
+
+
+def csv_codec(file_name):
+    """(is_csv, codec) for an uploaded file name; codec is None for plain CSV."""
+    lower = file_name.lower()
+    for suffix in sorted(CSV_SUFFIXES, key=len, reverse=True):
+        if lower.endswith(suffix):
+            return True, CSV_SUFFIXES[suffix]
+    return False, None
+
+
+def csv_name(file_name):
+    """The stored name: compression suffix dropped, since the CSV is kept decompressed."""
+    for suffix in ('.gz', '.zst'):
+        if file_name.lower().endswith('.csv' + suffix):
+            return file_name[:-len(suffix)]
+    return file_name
+
+
+class _GzipDecoder:
+    """Incremental gzip decoder that also handles multi-member (concatenated) files."""
+
+    def __init__(self):
+        self._decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    def decompress(self, data):
+        out = []
+        while True:
+            out.append(self._decoder.decompress(data))
+            if self._decoder.eof and self._decoder.unused_data:
+                data = self._decoder.unused_data
+                self._decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                continue
+            return b''.join(out)
+
+    def flush(self):
+        return self._decoder.flush()
+
+
+class Decompressor:
+    """
+    Streaming decompression for one upload with a cap on the decoded size
+    (UPLOAD_MAX_DECOMPRESSED_SIZE), so a tiny compressed file cannot expand
+    without bound. codec None passes data through unchanged.
+    """
+
+    def __init__(self, codec):
+        self.limit = settings.UPLOAD_MAX_DECOMPRESSED_SIZE
+        self.size = 0
+        if codec == 'gzip':
+            self._decoder = _GzipDecoder()
+        elif codec == 'zstd':
+            if zstandard is None:
+                raise DecompressionError("Zstandard (.csv.zst) uploads are not supported on this server")
+            self._decoder = zstandard.ZstdDecompressor().decompressobj()
+        else:
+            self._decoder = None
+
+    def _run(self, step, data=None):
+        if self._decoder is None:
+            out = data or b''
+        else:
+            try:
+                out = step(data) if data is not None else step()
+            except Exception as e:
+                raise DecompressionError(f"Could not decompress upload: {e}")
+        self.size += len(out)
+        if self.size > self.limit:
+            raise DecompressionError(f"Decompressed upload exceeds {self.limit} bytes")
+        return out
+
+    def decompress(self, data):
+        return self._run(self._decoder and self._decoder.decompress, data)
+
+    def flush(self):
+        return self._run(self._decoder and self._decoder.flush)
+
+
+def header_error(header, required=REQUIRED_COLUMNS):
+    """Client-facing message when `header` lacks any of the `required` columns, else None."""
+    missing = [c for c in required if c not in header]
+    if missing:
+        return f"Missing required columns: {', '.join(missing)}. Expected: {set(required)}"
+    return None
+
+
+def parse_header(line):
+    """Column names from the raw first line of a CSV (handles quoting and a UTF-8 BOM)."""
+    text = line.decode('utf-8-sig', errors='replace').rstrip('\r\n')
+    return next(csv.reader([text]), [])
+
+
+def peek_header(data, codec=None):
+    """
+    Header of a CSV from the first bytes of a (possibly compressed) file,
+    or None when those bytes don't hold a whole header line yet.
+    """
+    if codec:
+        try:
+            data = Decompressor(codec).decompress(data)
+        except DecompressionError:
+            return None
+    end = data.find(b'\n')
+    if end == -1:
+        return None
+    return parse_header(data[:end])
+
+
+class SpooledCSVUpload(UploadedFile):
+    """A received CSV: the spooled body plus its parsed header and hash."""
+
+    def __init__(self, file, name, content_type, size, charset, header, sha256):
+        super().__init__(file, name, content_type, size, charset)
+        self.header = header
+        self.sha256 = sha256
+
+
+class CSVUploadHandler(FileUploadHandler):
+    """
+    Upload handler for the `file` field of CSV uploads. Other fields and
+    non-CSV files fall through to the next handler untouched. The header
+    must have every column in `required`.
+    """
+
+    field_name = 'file'
+
+    def __init__(self, request=None, required=REQUIRED_COLUMNS):
+        super().__init__(request)
+        self.required = required
+        self.active = False
+        self.error = None
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        is_csv, codec = csv_codec(file_name)
+        self.active = field_name == self.field_name and is_csv
+        if self.active:
+            self.spool = tempfile.SpooledTemporaryFile(max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+            self.digest = hashlib.sha256()
+            self.header = None
+            self.head = b''
+            try:
+                self.decompressor = Decompressor(codec)
+            except DecompressionError as e:
+                self._reject(str(e))
+
+    def _reject(self, message):
+        self.error = message
+        self.spool.close()
+        self.active = False
+        raise StopUpload(connection_reset=False)
+
+    def _consume(self, data):
+        """Header check, hash and spool for (decompressed) CSV bytes."""
+        if self.header is None:
+            self.head += data
+            end = self.head.find(b'\n')
+            if end == -1:
+                if len(self.head) > MAX_HEADER_BYTES:
+                    self._reject("CSV header row is too long")
+                return
+            self.header = parse_header(self.head[:end])
+            data, self.head = self.head, b''
+            error = header_error(self.header, self.required)
+            if error:
+                self._reject(error)
+
+        self.digest.update(data)
+        self.spool.write(data)
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.active:
+            return raw_data
+        try:
+            self._consume(self.decompressor.decompress(raw_data))
+        except DecompressionError as e:
+            self._reject(str(e))
+        return None
+
+    def file_complete(self, file_size):
+        if not self.active:
+            return None
+        try:
+            self._consume(self.decompressor.flush())
+        except DecompressionError as e:
+            self._reject(str(e))
+        self.active = False
+
+        if self.header is None:
+            # Body without a newline: the whole thing is (at most) a header
+            if not self.head.strip():
+                self.error = "The uploaded file is empty"
+                return None
+            self.header = parse_header(self.head)
+            self.error = header_error(self.header, self.required)
+            if self.error:
+                return None
+            self.digest.update(self.head)
+            self.spool.write(self.head)
+
+        size = self.spool.tell()
+        self.spool.seek(0)
+        return SpooledCSVUpload(
+            self.spool, csv_name(self.file_name), 'text/csv', size, self.charset,
+            header=self.header, sha256=self.digest.hexdigest(),
+        )
+
+
+class DecodedRequestStream:
+    """File-like view of a `Content-Encoding: gzip` request body, decoded as it is read."""
+
+    READ_SIZE = 64 * 1024
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.decompressor = Decompressor('gzip')
+        self.buffer = b''
+        self.finished = False
+
+    def _fill(self, size):
+        while not self.finished and (size < 0 or len(self.buffer) < size):
+            chunk = self.stream.read(self.READ_SIZE)
+            if chunk:
+                self.buffer += self.decompressor.decompress(chunk)
+            else:
+                self.buffer += self.decompressor.flush()
+                self.finished = True
+
+    def read(self, size=-1):
+        size = -1 if size is None else size
+        self._fill(size)
+        if size < 0:
+            data, self.buffer = self.buffer, b''
+        else:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def readline(self, size=-1):
+        size = -1 if size is None else size
+        while b'\n' not in self.buffer and not self.finished and (size < 0 or len(self.buffer) < size):
+            self._fill(len(self.buffer) + self.READ_SIZE)
+        end = self.buffer.find(b'\n') + 1 or len(self.buffer)
+        if size >= 0:
+            end = min(end, size)
+        data, self.buffer = self.buffer[:end], self.buffer[end:]
+        return data
+
+
+def decode_request_body(request):
+    """
+    Wrap the body of a `Content-Encoding: gzip` request so the multipart
+    parser reads the decoded bytes. Must run before the body is read.
+    """
+    if request.headers.get('Content-Encoding', '').lower() != 'gzip':
+        return
+    django_request = getattr(request, '_request', request)
+    django_request._stream = DecodedRequestStream(django_request._stream)
+
+
+def stream_csv_upload(request, required=REQUIRED_COLUMNS):
+    """
+    Install a CSVUploadHandler on `request` (before the body is read) and
+    return it, so the view can check `handler.error` after reading FILES.
+    """
+    decode_request_body(request)
+    handler = CSVUploadHandler(request, required)
+    request.upload_handlers = [handler] + list(request.upload_handlers)
+    return handler
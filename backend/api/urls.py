@@ -1,12 +1,30 @@
 from django.urls import path
-from .views import FileUploadView, HistoryView, PDFReportView, LoginView, RegisterView, ThresholdSettingsView, UpdateAISummaryView
+from .views import (
+    FileUploadView, AnalyzeView, HistoryView, PDFReportView, LoginView, RegisterView, ThresholdSettingsView, UpdateAISummaryView, EquipmentSeriesView, UploadDiffView, ThresholdSweepView, RollupView, UploadRowsView, EquipmentSearchView, MetricsView,
+    ChunkedUploadInitView, ChunkedUploadDetailView, ChunkedUploadChunkView, ChunkedUploadFinalizeView,
+    AlertRuleListView, AlertRuleDetailView,
+)
 
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
     path('login/', LoginView.as_view(), name='login'),
     path('upload/', FileUploadView.as_view(), name='file-upload'),
+    path('analyze/', AnalyzeView.as_view(), name='analyze'),
+    path('uploads/chunked/', ChunkedUploadInitView.as_view(), name='chunked-upload-init'),
+    path('uploads/chunked/<uuid:upload_id>/', ChunkedUploadDetailView.as_view(), name='chunked-upload-detail'),
+    path('uploads/chunked/<uuid:upload_id>/chunks/<int:number>/', ChunkedUploadChunkView.as_view(), name='chunked-upload-chunk'),
+    path('uploads/chunked/<uuid:upload_id>/finalize/', ChunkedUploadFinalizeView.as_view(), name='chunked-upload-finalize'),
     path('history/', HistoryView.as_view(), name='history'),
     path('upload/<int:pk>/summary/', UpdateAISummaryView.as_view(), name='update-summary'),
+    path('upload/<int:pk>/rows/', UploadRowsView.as_view(), name='upload-rows'),
+    path('upload/<int:a>/diff/<int:b>/', UploadDiffView.as_view(), name='upload-diff'),
+    path('upload/<int:pk>/threshold-sweep/', ThresholdSweepView.as_view(), name='threshold-sweep'),
     path('report/<int:pk>/', PDFReportView.as_view(), name='pdf-report'),
     path('thresholds/', ThresholdSettingsView.as_view(), name='thresholds'),
+    path('alert-rules/', AlertRuleListView.as_view(), name='alert-rules'),
+    path('alert-rules/<int:pk>/', AlertRuleDetailView.as_view(), name='alert-rule-detail'),
+    path('search/', EquipmentSearchView.as_view(), name='equipment-search'),
+    path('rollups/', RollupView.as_view(), name='rollups'),
+    path('equipment/<str:name>/series/', EquipmentSeriesView.as_view(), name='equipment-series'),
+    path('metrics', MetricsView.as_view(), name='metrics'),
 ]
@@ -1,8 +1,24 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, generics
-from .models import UploadedFile, UserThresholdSettings
+from .models import UploadedFile, UserThresholdSettings, Equipment, EquipmentReading, TypeRollup, ChunkedUpload, AlertRule, ALERT_SEVERITY_CHOICES
 from .serializers import UploadedFileSerializer
+from .indexing import index_equipment_readings, upload_frame, search_equipment, READING_FIELDS
+from .analytics import (
+    analyze, validate_rows, timestamp_column, timeseries_snapshot, diff_frames, judge, threshold_sweep, row_mask, sort_positions,
+    operating_clusters, data_quality,
+    NUMERIC_COLUMNS, TEXT_COLUMNS, HEALTH_COLORS, HEALTH_LEVELS, RANGE_OPERATORS, DETECTION_MODES,
+)
+from .rollups import add_upload_to_rollups, aggregate_rollups, GRANULARITIES
+from .instrumentation import span
+from .uploads import stream_csv_upload, header_error, peek_header, csv_codec, Decompressor, DecompressionError
+from .baselines import load_baselines, score_upload, update_baselines, describe_baseline
+from .rules import apply_rules, evaluate_rules, escalate, severity_codes, row_tags, parse_rule, rule_columns, referenced_columns, RuleSyntaxError
+from .parameters import (
+    upload_schema, required_columns, present_parameters, stored_parameters, analysis_options, SchemaError,
+)
+from .chunked import assemble, store_chunk, expire_stale_uploads, claim_finalize, release_finalize, is_finalizing
+from . import metrics
 import pandas as pd
 import os
 from reportlab.pdfgen import canvas
@@ -12,16 +28,24 @@ from reportlab.lib.utils import ImageReader
 from reportlab.platypus import Table, TableStyle
 from reportlab.lib import colors
 from django.http import HttpResponse
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.permissions import IsAuthenticated, AllowAny, BasePermission
+from django.conf import settings as django_settings
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime, parse_date
 from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework.utils.urls import replace_query_param, remove_query_param
 import matplotlib
 matplotlib.use('Agg')  # Use non-interactive backend
 import matplotlib.pyplot as plt
 import numpy as np
 from io import BytesIO
+import hashlib
+import re
+from collections import namedtuple
 from datetime import datetime
 
 def get_threshold_settings(user=None):
@@ -58,6 +82,31 @@ def get_threshold_settings(user=None):
     
     return warning, outlier
 
+def get_detection_options(user=None):
+    """
+    How outliers are detected, as keyword arguments for api.analytics:
+    - mode: 'iqr', 'robust_z' or 'mahalanobis'
+    - per_type: compute bounds within each equipment Type instead of over the whole file
+    The user's custom settings win, then DETECTION_MODE / PER_TYPE_BOUNDS from .env,
+    then ('iqr', False).
+    """
+    if user:
+        custom = UserThresholdSettings.objects.filter(user=user).values_list('detection_mode', 'per_type_bounds').first()
+        if custom:
+            return {'mode': custom[0], 'per_type': custom[1]}
+
+    mode = os.getenv('DETECTION_MODE', 'iqr')
+    return {
+        'mode': mode if mode in DETECTION_MODES else 'iqr',
+        'per_type': os.getenv('PER_TYPE_BOUNDS', 'False').lower() in ('true', '1', 'yes'),
+    }
+
+def get_alert_rules(user=None):
+    """The user's enabled alert rules (api.rules), oldest first."""
+    if not user or not user.is_authenticated:
+        return []
+    return list(AlertRule.objects.filter(user=user, enabled=True))
+
 class RegisterView(APIView):
     permission_classes = [AllowAny]
     
@@ -147,14 +196,25 @@ class ThresholdSettingsView(APIView):
         # Check if user has custom settings
         is_custom = UserThresholdSettings.objects.filter(user=request.user).exists()
         warning_percentile, iqr_multiplier = get_threshold_settings(request.user)
+        options = get_detection_options(request.user)
+        detection_mode = options['mode']
         
         return Response({
             'warning_percentile': warning_percentile,
             'outlier_iqr_multiplier': iqr_multiplier,
+            'detection_mode': detection_mode,
+            'detection_modes': list(DETECTION_MODES),
+            'per_type_bounds': options['per_type'],
             'is_custom': is_custom,
             'description': {
                 'warning_percentile': f'Equipment with parameters above the {int(warning_percentile * 100)}th percentile are marked as Warning',
-                'outlier_iqr_multiplier': f'Values beyond Q3 + {iqr_multiplier} × IQR are marked as outliers (Critical)'
+                'outlier_iqr_multiplier': f'Values beyond Q3 + {iqr_multiplier} × IQR are marked as outliers (Critical)',
+                'detection_mode': {
+                    'iqr': 'Each parameter is checked against its own IQR fences',
+                    'robust_z': 'Each parameter is checked with a median/MAD robust z-score at the same sensitivity',
+                    'mahalanobis': 'All parameters are checked together with a robust Mahalanobis distance, catching unusual combinations',
+                }[detection_mode],
+                'per_type_bounds': 'Bounds are computed within each equipment Type' if options['per_type'] else 'Bounds are computed over the whole file',
             }
         }, status=status.HTTP_200_OK)
     
@@ -162,6 +222,8 @@ class ThresholdSettingsView(APIView):
         """Create or update user's custom threshold settings."""
         warning_percentile = request.data.get('warning_percentile')
         iqr_multiplier = request.data.get('outlier_iqr_multiplier')
+        detection_mode = request.data.get('detection_mode')
+        per_type_bounds = request.data.get('per_type_bounds')
         
         # Validate inputs
         errors = {}
@@ -181,6 +243,12 @@ class ThresholdSettingsView(APIView):
             except (ValueError, TypeError):
                 errors['outlier_iqr_multiplier'] = 'Must be a valid number'
         
+        if detection_mode is not None and detection_mode not in DETECTION_MODES:
+            errors['detection_mode'] = f"Must be one of: {', '.join(DETECTION_MODES)}"
+        
+        if per_type_bounds is not None and not isinstance(per_type_bounds, bool):
+            errors['per_type_bounds'] = 'Must be true or false'
+        
         if errors:
             return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
         
@@ -189,7 +257,9 @@ class ThresholdSettingsView(APIView):
             user=request.user,
             defaults={
                 'warning_percentile': warning_percentile or 0.75,
-                'outlier_iqr_multiplier': iqr_multiplier or 1.5
+                'outlier_iqr_multiplier': iqr_multiplier or 1.5,
+                'detection_mode': detection_mode or get_detection_options()['mode'],
+                'per_type_bounds': per_type_bounds if per_type_bounds is not None else get_detection_options()['per_type'],
             }
         )
         
@@ -199,11 +269,17 @@ class ThresholdSettingsView(APIView):
                 settings.warning_percentile = warning_percentile
             if iqr_multiplier is not None:
                 settings.outlier_iqr_multiplier = iqr_multiplier
+            if detection_mode is not None:
+                settings.detection_mode = detection_mode
+            if per_type_bounds is not None:
+                settings.per_type_bounds = per_type_bounds
             settings.save()
         
         return Response({
             'warning_percentile': settings.warning_percentile,
             'outlier_iqr_multiplier': settings.outlier_iqr_multiplier,
+            'detection_mode': settings.detection_mode,
+            'per_type_bounds': settings.per_type_bounds,
             'is_custom': True,
             'message': 'Settings saved successfully'
         }, status=status.HTTP_200_OK)
@@ -218,174 +294,540 @@ class ThresholdSettingsView(APIView):
         return Response({
             'warning_percentile': warning_percentile,
             'outlier_iqr_multiplier': iqr_multiplier,
+            'detection_mode': get_detection_options()['mode'],
+            'per_type_bounds': get_detection_options()['per_type'],
             'is_custom': False,
             'message': 'Settings reset to defaults' if deleted else 'Already using defaults'
         }, status=status.HTTP_200_OK)
 
+class AlertRuleListView(APIView):
+    """
+    The user's alert rules (see api.rules for the expression language).
+
+    GET /api/alert-rules/  - all rules, oldest first
+    POST /api/alert-rules/ - create one: name, expression, optional
+      severity (warning | critical, default warning) and enabled (default true)
+    Expressions are parsed when saved; a syntax error is a 400 that names
+    the position. Enabled rules run on every upload and recompute: matching
+    rows get `alert_rules` (rule ids) and at least the rule's severity.
+    """
+    permission_classes = [IsAuthenticated]
+    MAX_RULES = 500
+
+    @staticmethod
+    def describe(rule):
+        return {
+            'id': rule.id,
+            'name': rule.name,
+            'expression': rule.expression,
+            'severity': rule.severity,
+            'enabled': rule.enabled,
+            'columns': sorted(rule_columns(parse_rule(rule.expression))),
+            'created_at': rule.created_at,
+            'updated_at': rule.updated_at,
+        }
+
+    @staticmethod
+    def validate(data, rule):
+        """Apply the fields present in `data` to `rule`; returns an errors dict."""
+        errors = {}
+        if 'name' in data or rule.pk is None:
+            name = str(data.get('name') or '').strip()
+            if not name:
+                errors['name'] = 'This field is required'
+            elif len(name) > 100:
+                errors['name'] = 'At most 100 characters'
+            rule.name = name
+        if 'expression' in data or rule.pk is None:
+            expression = str(data.get('expression') or '').strip()
+            try:
+                parse_rule(expression)
+            except RuleSyntaxError as e:
+                errors['expression'] = str(e)
+            rule.expression = expression
+        if 'severity' in data:
+            severities = [value for value, _ in ALERT_SEVERITY_CHOICES]
+            if data['severity'] not in severities:
+                errors['severity'] = f"Must be one of: {', '.join(severities)}"
+            rule.severity = data['severity']
+        if 'enabled' in data:
+            if not isinstance(data['enabled'], bool):
+                errors['enabled'] = 'Must be true or false'
+            rule.enabled = data['enabled']
+        return errors
+
+    def get(self, request):
+        rules = AlertRule.objects.filter(user=request.user)
+        return Response([self.describe(rule) for rule in rules], status=status.HTTP_200_OK)
+
+    def post(self, request):
+        if AlertRule.objects.filter(user=request.user).count() >= self.MAX_RULES:
+            return Response({"error": f"At most {self.MAX_RULES} alert rules per user"}, status=status.HTTP_400_BAD_REQUEST)
+        rule = AlertRule(user=request.user)
+        errors = self.validate(request.data, rule)
+        if errors:
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+        rule.save()
+        return Response(self.describe(rule), status=status.HTTP_201_CREATED)
+
+class AlertRuleDetailView(APIView):
+    """
+    GET / PUT / DELETE /api/alert-rules/<id>/
+    PUT updates the fields it is given (name, expression, severity, enabled).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def _rule(self, request, pk):
+        return AlertRule.objects.filter(pk=pk, user=request.user).first()
+
+    def get(self, request, pk):
+        rule = self._rule(request, pk)
+        if rule is None:
+            return Response({"error": "Alert rule not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(AlertRuleListView.describe(rule), status=status.HTTP_200_OK)
+
+    def put(self, request, pk):
+        rule = self._rule(request, pk)
+        if rule is None:
+            return Response({"error": "Alert rule not found"}, status=status.HTTP_404_NOT_FOUND)
+        errors = AlertRuleListView.validate(request.data, rule)
+        if errors:
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+        rule.save()
+        return Response(AlertRuleListView.describe(rule), status=status.HTTP_200_OK)
+
+    def delete(self, request, pk):
+        deleted, _ = AlertRule.objects.filter(pk=pk, user=request.user).delete()
+        if not deleted:
+            return Response({"error": "Alert rule not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+# One analysed upload: the validated frame, the parameter columns, summary and row records
+UploadAnalysis = namedtuple('UploadAnalysis', 'df columns summary records')
+
+
+def analyze_upload(user, file, schema=None):
+    """
+    Parse and analyse `file` (an UploadedFile, typically a SpooledCSVUpload)
+    in memory on the numeric parameters of `schema` (default: the
+    deployment's, see api.parameters), with the user's thresholds, alert
+    rules and baselines. Nothing is written.
+    Returns (UploadAnalysis, None), or (None, error Response).
+    """
+    if schema is None:
+        schema = upload_schema()
+    # Time to crunch some numbers - straight from the spooled upload, nothing is stored yet.
+    try:
+        with span('parse'):
+            df = pd.read_csv(file)
+    except (ValueError, pd.errors.ParserError, UnicodeDecodeError) as e:
+        return None, Response({"error": f"Could not parse CSV: {e}"}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Validation: Check for required columns (the handler already checked the header)
+    error = header_error(df.columns, required_columns(schema))
+    if error:
+        return None, Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Every schema parameter the CSV has is analysed; optional ones may have gaps
+    parameters = present_parameters(schema, df.columns)
+    if not parameters:
+        expected = ', '.join(p.name for p in schema)
+        return None, Response({"error": f"No numeric parameter columns found. Expected any of: {expected}"}, status=status.HTTP_400_BAD_REQUEST)
+    columns = [p.name for p in parameters]
+
+    # Rows with missing, non-numeric or duplicated values are set aside (and reported)
+    # instead of failing the whole upload; the analysis runs on the rest.
+    timestamp = timestamp_column(df, django_settings.TIMESERIES_COLUMN, django_settings.TIMESERIES_MIN_PARSED)
+    # Profile the file as sent (nulls, zeros, frozen sensors, ...) before any row is dropped
+    with span('quality'):
+        quality = data_quality(df, parameters)
+    with span('validate'):
+        df, validation = validate_rows(
+            df, [p.name for p in parameters if p.required], timestamp=timestamp,
+            optional=[p.name for p in parameters if not p.required],
+        )
+    if not validation['valid_rows']:
+        return None, Response(
+            {"error": "No valid rows to analyze", "validation": validation},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    # Historian exports (a Timestamp column, many readings per equipment) are
+    # collapsed to each equipment's latest window before the usual analysis.
+    timeseries = None
+    if timestamp:
+        with span('timeseries'):
+            df, timeseries = timeseries_snapshot(
+                df, timestamp,
+                window=django_settings.TIMESERIES_WINDOW,
+                max_points=django_settings.TIMESERIES_MAX_POINTS,
+                columns=columns,
+            )
+
+    # === ENHANCED ANALYTICS BLOCK ===
+    # api.analytics.analyze performs 5 key analysis steps:
+    # 1. Basic Stats (Min, Max, Mean, Std)
+    # 2. Type-based grouping
+    # 3. Correlation Matrix
+    # 4. Outlier Detection (IQR Method)
+    # 5. Health Status Classification
+    
+    # Get configurable thresholds - user's custom or defaults
+    warning_percentile, iqr_multiplier = get_threshold_settings(user)
+    detection_options = get_detection_options(user)
+    
+    # Critical: Any parameter is an outlier
+    # Warning: Parameters above warning_percentile (configurable)
+    # Normal: Everything else
+    try:
+        stats, data_json = analyze(df, warning_percentile, iqr_multiplier, parameters=parameters, **detection_options)
+    except Exception as e:
+        return None, Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    stats['validation'] = validation
+    stats['data_quality'] = quality
+    if timeseries:
+        stats['timeseries'] = timeseries
+
+    # The user's alert rules tag matching rows and can raise their health
+    rules = get_alert_rules(user)
+    if rules:
+        with span('rules'):
+            stats['alerts'] = apply_rules(df, data_json, rules)
+
+    # Each row's deviation from its own equipment's history, before this upload joins it
+    with span('baseline'):
+        baselines = load_baselines(user, df['Equipment Name'].astype(str).unique())
+        stats['baseline'] = score_upload(
+            df, data_json, baselines, columns, min_updates=django_settings.BASELINE_MIN_UPDATES,
+        )
+
+    # Optional: group rows into operating regimes across types (summary.clusters, row `cluster`)
+    if django_settings.CLUSTER_COUNT:
+        with span('clusters'):
+            clusters, labels = operating_clusters(df, django_settings.CLUSTER_COUNT, columns)
+            if clusters:
+                stats['clusters'] = clusters
+                for record, label in zip(data_json, labels.tolist()):
+                    record['cluster'] = label
+    metrics.observe_upload(file.size, validation['total_rows'])
+    return UploadAnalysis(df, columns, stats, data_json), None
+
+
+def analyze_and_store_upload(user, file, schema=None):
+    """
+    The upload pipeline shared by direct and chunked uploads: analyse `file`
+    (see analyze_upload), then store it with its results, index it and
+    apply retention.
+    Returns the API Response (201 with the serialized upload, or an error).
+    """
+    analysis, error = analyze_upload(user, file, schema)
+    if error:
+        return error
+    df, columns, stats, data_json = analysis
+
+    # Save the file and the results in one insert so we don't have to re-process it later.
+    # The file lands in /media/uploads, associated with the uploading user.
+    file.seek(0)
+    upload_instance = UploadedFile(
+        file=file, user=user, sha256=getattr(file, 'sha256', ''),
+        summary=stats, processed_data=data_json,
+    )
+    try:
+        # One transaction: a failure at any step leaves no upload, readings, rollups,
+        # latest values or baselines behind
+        with transaction.atomic():
+            with span('save'):
+                upload_instance.save()
+
+            with span('index'):
+                # Copy rows into the cross-upload equipment time-series and search indexes
+                index_equipment_readings(upload_instance, df, [row['health_status'] for row in data_json])
+                # ...and into the per-type daily rollups
+                add_upload_to_rollups(upload_instance, df)
+                # ...and into each equipment's EWMA baseline
+                update_baselines(user, df, columns, django_settings.BASELINE_ALPHA)
+
+            # Housekeeping: We only want to keep the last 5 uploads PER USER to avoid cluttering the server.
+            # If we represent a real production app, we might archive these instead or use S3 with lifecycle policies.
+            with span('retention'):
+                user_files = UploadedFile.objects.filter(user=user)
+                if user_files.count() > 5:
+                    # Get the IDs of the 5 newest files for this user, and delete anything that's NOT in that list.
+                    # Pruned uploads stay counted in the type rollups so long-range dashboards keep their history.
+                    ids_to_keep = user_files[:5].values_list('id', flat=True)
+                    for stale in UploadedFile.objects.filter(user=user).exclude(id__in=ids_to_keep):
+                        stale.keep_rollups = True
+                        stale.delete()
+
+            with span('serialize'):
+                serializer = UploadedFileSerializer(upload_instance)
+                data = serializer.data
+        return Response(data, status=status.HTTP_201_CREATED)
+
+    except Exception as e:
+        # If anything goes wrong while storing (permissions, disk, DB), the database changes are
+        # rolled back; only the stored CSV is left to remove.
+        if upload_instance.pk:
+            upload_instance.file.delete(save=False)
+        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+def receive_csv_upload(request):
+    """
+    Read the CSV of a direct upload request (`file` field, optional
+    `?parameters=`). Returns (file, schema, None), or (None, None, error Response).
+    """
+    # From the query string, so the header can be checked against it while streaming
+    try:
+        schema = upload_schema(request.query_params.get('parameters'))
+    except SchemaError as e:
+        return None, None, Response({'errors': {'parameters': str(e)}}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Must run before request.FILES is touched: header checks, hashing and
+    # spooling happen as the chunks arrive.
+    handler = stream_csv_upload(request, required_columns(schema))
+    try:
+        file = request.FILES.get('file')
+    except DecompressionError as e:
+        # Content-Encoding: gzip body that does not decode
+        return None, None, Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    if handler.error:
+        return None, None, Response({"error": handler.error}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Simple check: did they actually send a file?
+    if not file:
+        return None, None, Response({"error": "No file uploaded"}, status=status.HTTP_400_BAD_REQUEST)
+
+    # We only want CSVs here.
+    # (.csv.gz / .csv.zst arrive here already decompressed and renamed to .csv)
+    if not file.name.endswith('.csv'):
+        return None, None, Response({"error": "Only CSV files (.csv, .csv.gz, .csv.zst) are allowed"}, status=status.HTTP_400_BAD_REQUEST)
+    return file, schema, None
+
 class FileUploadView(APIView):
     """
     Handles CSV file uploads and performs data analysis.
     
     POST:
     - Accepts a CSV file.
-    - Validates file format/content.
-    - Saves file to disk/DB.
-    - Performs statistical analysis (Pandas).
+    - Optional `?parameters=Flowrate,Vibration` analyses those numeric
+      columns instead of the deployment's PARAMETER_SCHEMA.
+    - Validates the header row while the body is still streaming in
+      (api.uploads.CSVUploadHandler) and rejects bad files with a 400.
+    - Performs statistical analysis (Pandas) on the spooled upload.
     - Detects outliers using IQR.
+    - Saves file to disk/DB only once the analysis succeeded.
     - Returns analysis summary + processed data.
     """
     permission_classes = [IsAuthenticated]
     
     def post(self, request, *args, **kwargs):
-        file = request.FILES.get('file')
-        # Simple check: did they actually send a file?
-        if not file:
-            return Response({"error": "No file uploaded"}, status=status.HTTP_400_BAD_REQUEST)
+        file, schema, error = receive_csv_upload(request)
+        if error:
+            return error
+        return analyze_and_store_upload(request.user, file, schema)
 
-        # We only want CSVs here.
-        if not file.name.endswith('.csv'):
-             return Response({"error": "Only CSV files are allowed"}, status=status.HTTP_400_BAD_REQUEST)
+class AnalyzeView(APIView):
+    """
+    Dry run of /api/upload/: the same request and the same analysis, without
+    saving anything.
 
-        # Save the file temporarily so we can pass the path to Pandas.
-        # This creates a record in the DB and puts the file in /media/uploads
-        # Associate upload with the logged-in user
-        upload_instance = UploadedFile(file=file, user=request.user)
-        upload_instance.save() 
+    POST /api/analyze/
+    - Accepts the same file (and `?parameters=`) as /api/upload/, streamed
+      and spooled the same way.
+    - Runs the full analysis in memory with the user's thresholds, alert
+      rules and baselines (read, not updated).
+    - Creates no UploadedFile, media file, index rows or rollups, and never
+      triggers retention. Returns 200 with `summary` and `processed_data`.
+    """
+    permission_classes = [IsAuthenticated]
 
-        try:
-            # Time to crunch some numbers.
-            file_path = upload_instance.file.path
-            df = pd.read_csv(file_path)
-            
-            # Validation: Check for required columns
-            required_columns = {'Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature'}
-            if not required_columns.issubset(df.columns):
-                raise ValueError(f"Missing required columns. Expected: {required_columns}")
-
-            # === ENHANCED ANALYTICS BLOCK ===
-            # The following section performs 5 key analysis steps:
-            # 1. Basic Stats (Min, Max, Mean, Std)
-            # 2. Type-based grouping
-            # 3. Correlation Matrix
-            # 4. Outlier Detection (IQR Method)
-            # 5. Health Status Classification
-            
-            # 1. Basic Statistics with Min/Max/Std Dev
-            numeric_cols = ['Flowrate', 'Pressure', 'Temperature']
-            stats = {
-                "total_count": int(len(df)),
-                "avg_flowrate": float(df['Flowrate'].mean()),
-                "avg_pressure": float(df['Pressure'].mean()),
-                "avg_temperature": float(df['Temperature'].mean()),
-                "min_flowrate": float(df['Flowrate'].min()),
-                "max_flowrate": float(df['Flowrate'].max()),
-                "std_flowrate": float(df['Flowrate'].std()),
-                "min_pressure": float(df['Pressure'].min()),
-                "max_pressure": float(df['Pressure'].max()),
-                "std_pressure": float(df['Pressure'].std()),
-                "min_temperature": float(df['Temperature'].min()),
-                "max_temperature": float(df['Temperature'].max()),
-                "std_temperature": float(df['Temperature'].std()),
-                "type_distribution": df['Type'].value_counts().to_dict()
+    def post(self, request, *args, **kwargs):
+        file, schema, error = receive_csv_upload(request)
+        if error:
+            return error
+        analysis, error = analyze_upload(request.user, file, schema)
+        if error:
+            return error
+        with span('serialize'):
+            data = {
+                'file_name': file.name,
+                'dry_run': True,
+                'summary': analysis.summary,
+                'processed_data': analysis.records,
             }
-            
-            # 2. Type-based Comparison
-            type_comparison = {}
-            for eq_type in df['Type'].unique():
-                type_df = df[df['Type'] == eq_type]
-                type_comparison[eq_type] = {
-                    "count": int(len(type_df)),
-                    "avg_flowrate": float(type_df['Flowrate'].mean()),
-                    "avg_pressure": float(type_df['Pressure'].mean()),
-                    "avg_temperature": float(type_df['Temperature'].mean())
-                }
-            stats['type_comparison'] = type_comparison
-            
-            # 3. Correlation Matrix
-            correlation_matrix = df[numeric_cols].corr().to_dict()
-            stats['correlation_matrix'] = correlation_matrix
-            
-            # 4. Outlier Detection (using IQR method)
-            # Get configurable thresholds - user's custom or defaults
-            warning_percentile, iqr_multiplier = get_threshold_settings(request.user)
-            
-            outliers = []
-            for col in numeric_cols:
-                Q1 = df[col].quantile(0.25)
-                Q3 = df[col].quantile(0.75)
-                IQR = Q3 - Q1
-                lower_bound = Q1 - iqr_multiplier * IQR  # Configurable
-                upper_bound = Q3 + iqr_multiplier * IQR  # Configurable
-                
-                outlier_mask = (df[col] < lower_bound) | (df[col] > upper_bound)
-                for idx in df[outlier_mask].index:
-                    equipment_name = df.loc[idx, 'Equipment Name']
-                    if equipment_name not in [o['equipment'] for o in outliers]:
-                        outliers.append({
-                            'equipment': equipment_name,
-                            'parameters': []
-                        })
-                    
-                    outlier_entry = next(o for o in outliers if o['equipment'] == equipment_name)
-                    outlier_entry['parameters'].append({
-                        'parameter': col,
-                        'value': float(df.loc[idx, col]),
-                        'lower_bound': float(lower_bound),
-                        'upper_bound': float(upper_bound)
-                    })
-            
-            stats['outliers'] = outliers
-            
-            # 5. Health Status for each equipment
-            data_json = df.to_dict(orient='records')
-            for i, row in enumerate(data_json):
-                equipment_name = row['Equipment Name']
-                
-                # Check if equipment has outliers
-                is_outlier = any(o['equipment'] == equipment_name for o in outliers)
-                
-                # Simple health status based on parameter ranges
-                # Critical: Any parameter is an outlier
-                # Warning: Parameters above warning_percentile (configurable)
-                # Normal: Everything else
-                if is_outlier:
-                    health_status = 'critical'
-                    health_color = '#ef4444'  # red
-                elif (row['Flowrate'] > df['Flowrate'].quantile(warning_percentile) or 
-                      row['Pressure'] > df['Pressure'].quantile(warning_percentile) or 
-                      row['Temperature'] > df['Temperature'].quantile(warning_percentile)):
-                    health_status = 'warning'
-                    health_color = '#f59e0b'  # yellow
-                else:
-                    health_status = 'normal'
-                    health_color = '#10b981'  # green
-                
-                data_json[i]['health_status'] = health_status
-                data_json[i]['health_color'] = health_color
+        return Response(data, status=status.HTTP_200_OK)
+
+class ChunkedUploadInitView(APIView):
+    """
+    Starts a resumable upload for files too big (or links too flaky) for one POST.
 
-            # We also send back the raw data so the frontend can display the table.
-            # .to_dict('records') gives us a nice list of JSON objects.
+    POST /api/uploads/chunked/
+    - Body: file_name (.csv, .csv.gz or .csv.zst), total_size (bytes of the
+      file as sent), optional chunk_size, sha256 (of the file as sent,
+      verified on finalize) and parameters (comma-separated numeric columns,
+      as for /api/upload/).
+    - Returns the upload id, chunk_size and total_chunks. Then PUT each chunk
+      to chunks/<n>/ and POST finalize/.
+    """
+    permission_classes = [IsAuthenticated]
 
-            # Save the results back to the instance so we don't have to re-process it later.
-            upload_instance.summary = stats
-            upload_instance.processed_data = data_json
-            upload_instance.save()
+    def post(self, request):
+        expire_stale_uploads()
 
-            # Housekeeping: We only want to keep the last 5 uploads PER USER to avoid cluttering the server.
-            # If we represent a real production app, we might archive these instead or use S3 with lifecycle policies.
-            user_files = UploadedFile.objects.filter(user=request.user)
-            if user_files.count() > 5:
-                # Get the IDs of the 5 newest files for this user, and delete anything that's NOT in that list.
-                ids_to_keep = user_files[:5].values_list('id', flat=True)
-                UploadedFile.objects.filter(user=request.user).exclude(id__in=ids_to_keep).delete()
+        file_name = str(request.data.get('file_name', ''))
+        errors = {}
+        is_csv, codec = csv_codec(file_name)
+        if not is_csv:
+            errors['file_name'] = 'Only CSV files (.csv, .csv.gz, .csv.zst) are allowed'
+        else:
+            try:
+                Decompressor(codec)
+            except DecompressionError as e:
+                errors['file_name'] = str(e)
+        try:
+            total_size = int(request.data.get('total_size'))
+            if not (0 < total_size <= django_settings.CHUNKED_UPLOAD_MAX_SIZE):
+                errors['total_size'] = f'Must be between 1 and {django_settings.CHUNKED_UPLOAD_MAX_SIZE} bytes'
+        except (ValueError, TypeError):
+            errors['total_size'] = 'Must be a valid integer'
+        try:
+            chunk_size = int(request.data.get('chunk_size', django_settings.CHUNKED_UPLOAD_CHUNK_SIZE))
+            # Each chunk is read as a request body, so it must fit DATA_UPLOAD_MAX_MEMORY_SIZE
+            if not (1024 <= chunk_size <= django_settings.DATA_UPLOAD_MAX_MEMORY_SIZE):
+                errors['chunk_size'] = f'Must be between 1024 and {django_settings.DATA_UPLOAD_MAX_MEMORY_SIZE} bytes'
+        except (ValueError, TypeError):
+            errors['chunk_size'] = 'Must be a valid integer'
+        sha256 = str(request.data.get('sha256', '')).lower()
+        if sha256 and not re.fullmatch(r'[0-9a-f]{64}', sha256):
+            errors['sha256'] = 'Must be a hex SHA-256 digest'
+        parameters = str(request.data.get('parameters') or '')
+        try:
+            upload_schema(parameters)
+        except SchemaError as e:
+            errors['parameters'] = str(e)
+        if errors:
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
 
-            serializer = UploadedFileSerializer(upload_instance)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        upload = ChunkedUpload.objects.create(
+            user=request.user, file_name=file_name, total_size=total_size, chunk_size=chunk_size, sha256=sha256,
+            parameters=parameters,
+        )
+        return Response(self.describe(upload), status=status.HTTP_201_CREATED)
 
-        except Exception as e:
-            # If anything goes wrong (bad CSV format, permissions, etc), cleanup the database record.
-            upload_instance.delete()
-            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    @staticmethod
+    def describe(upload):
+        return {
+            'upload_id': str(upload.pk),
+            'file_name': upload.file_name,
+            'total_size': upload.total_size,
+            'chunk_size': upload.chunk_size,
+            'total_chunks': upload.total_chunks,
+            'received_chunks': upload.received_chunks,
+            'missing_chunks': upload.missing_chunks(),
+            'complete': not upload.missing_chunks(),
+            'finalizing': is_finalizing(upload),
+        }
+
+class ChunkedUploadDetailView(APIView):
+    """
+    GET /api/uploads/chunked/<id>/    - which chunks arrived (resume from `missing_chunks`)
+    DELETE /api/uploads/chunked/<id>/ - abandon the upload
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, upload_id):
+        upload = ChunkedUpload.objects.filter(pk=upload_id, user=request.user).first()
+        if upload is None:
+            return Response({"error": "Upload not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(ChunkedUploadInitView.describe(upload), status=status.HTTP_200_OK)
+
+    def delete(self, request, upload_id):
+        deleted, _ = ChunkedUpload.objects.filter(pk=upload_id, user=request.user).delete()
+        if not deleted:
+            return Response({"error": "Upload not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class ChunkedUploadChunkView(APIView):
+    """
+    PUT /api/uploads/chunked/<id>/chunks/<n>/
+    - Raw body (application/octet-stream) of chunk n (0-based).
+    - Header X-Chunk-SHA256: hex SHA-256 of the body; mismatches are rejected
+      so the client can simply resend. Re-sending a stored chunk is harmless.
+    - Chunk 0's header row is validated right away.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def put(self, request, upload_id, number):
+        upload = ChunkedUpload.objects.filter(pk=upload_id, user=request.user).first()
+        if upload is None:
+            return Response({"error": "Upload not found"}, status=status.HTTP_404_NOT_FOUND)
+        if number >= upload.total_chunks:
+            return Response({"error": f"Chunk number must be below {upload.total_chunks}"}, status=status.HTTP_400_BAD_REQUEST)
+        if is_finalizing(upload):
+            return Response({"error": "Upload is being finalized"}, status=status.HTTP_409_CONFLICT)
+
+        data = request.body
+        expected = upload.expected_chunk_size(number)
+        if len(data) != expected:
+            return Response({"error": f"Chunk {number} must be {expected} bytes, got {len(data)}"}, status=status.HTTP_400_BAD_REQUEST)
+        checksum = request.headers.get('X-Chunk-SHA256', '').lower()
+        if not checksum:
+            return Response({"error": "X-Chunk-SHA256 header is required"}, status=status.HTTP_400_BAD_REQUEST)
+        if hashlib.sha256(data).hexdigest() != checksum:
+            return Response({"error": f"Checksum mismatch for chunk {number}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        header = peek_header(data, csv_codec(upload.file_name)[1]) if number == 0 else None
+        if header is not None:
+            error = header_error(header, required_columns(upload_schema(upload.parameters)))
+            if error:
+                upload.delete()
+                return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+
+        upload = store_chunk(upload, number, data)
+        return Response({
+            'chunk': number,
+            'received': len(upload.received_chunks),
+            'total_chunks': upload.total_chunks,
+        }, status=status.HTTP_200_OK)
+
+class ChunkedUploadFinalizeView(APIView):
+    """
+    POST /api/uploads/chunked/<id>/finalize/
+    - Requires every chunk; otherwise 409 with `missing_chunks`.
+    - Assembles the file, verifies size and checksum, and runs the same
+      analysis pipeline as /api/upload/ (same 201 response).
+    - One finalize at a time: the upload is claimed atomically first, and a
+      concurrent finalize gets 409 instead of storing the file twice. Once
+      it is done the session is gone (404).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, upload_id):
+        upload = ChunkedUpload.objects.filter(pk=upload_id, user=request.user).first()
+        if upload is None:
+            return Response({"error": "Upload not found"}, status=status.HTTP_404_NOT_FOUND)
+        missing = upload.missing_chunks()
+        if missing:
+            return Response({"error": "Upload is incomplete", "missing_chunks": missing}, status=status.HTTP_409_CONFLICT)
+        if not claim_finalize(upload):
+            return Response({"error": "Upload is already being finalized"}, status=status.HTTP_409_CONFLICT)
+
+        try:
+            file = assemble(upload)
+        except (ValueError, OSError) as e:
+            release_finalize(upload)
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = None
+        try:
+            response = analyze_and_store_upload(request.user, file, upload_schema(upload.parameters))
+        finally:
+            if response is not None and response.status_code < 500:
+                # Done (or the file itself is bad): the chunks are no longer needed
+                upload.delete()
+            else:
+                release_finalize(upload)
+        return response
 
 class HistoryView(generics.ListAPIView):
     serializer_class = UploadedFileSerializer
@@ -395,6 +837,480 @@ class HistoryView(generics.ListAPIView):
         # Return only the current user's uploads
         return UploadedFile.objects.filter(user=self.request.user)[:5]
 
+class EquipmentSeriesView(APIView):
+    """
+    Cross-upload time series for a single equipment tag.
+
+    GET /api/equipment/<name>/series/
+    - parameters: comma-separated subset of flowrate,pressure,temperature (default: all)
+    - limit: newest N readings to return (default 60, max 1000)
+    - start / end: optional ISO-8601 bounds on the upload time
+    Served from the EquipmentReading index, no upload JSON is parsed.
+    """
+    permission_classes = [IsAuthenticated]
+    DEFAULT_LIMIT = 60
+    MAX_LIMIT = 1000
+
+    def get(self, request, name):
+        try:
+            equipment = Equipment.objects.get(user=request.user, name=name)
+        except Equipment.DoesNotExist:
+            return Response({"error": "Equipment not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        valid_params = list(READING_FIELDS.values())
+        requested = request.query_params.get('parameters')
+        parameters = [p.strip().lower() for p in requested.split(',') if p.strip()] if requested else valid_params
+        unknown = [p for p in parameters if p not in valid_params]
+        if unknown:
+            return Response(
+                {"error": f"Unknown parameters: {', '.join(unknown)}. Expected any of: {', '.join(valid_params)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            limit = int(request.query_params.get('limit', self.DEFAULT_LIMIT))
+        except (ValueError, TypeError):
+            return Response({"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, self.MAX_LIMIT))
+
+        readings = EquipmentReading.objects.filter(equipment=equipment)
+        for param, lookup in (('start', 'recorded_at__gte'), ('end', 'recorded_at__lte')):
+            raw = request.query_params.get(param)
+            if raw:
+                parsed = parse_datetime(raw)
+                if parsed is None:
+                    return Response({"error": f"{param} must be an ISO-8601 datetime"}, status=status.HTTP_400_BAD_REQUEST)
+                if timezone.is_naive(parsed):
+                    parsed = timezone.make_aware(parsed)
+                readings = readings.filter(**{lookup: parsed})
+
+        # Newest N via the (equipment, recorded_at) index, returned oldest-first
+        rows = list(
+            readings.order_by('-recorded_at', '-id')
+            .values_list('recorded_at', 'upload_id', *parameters)[:limit]
+        )
+        rows.reverse()
+
+        points = []
+        for recorded_at, upload_id, *values in rows:
+            point = {'recorded_at': recorded_at, 'upload_id': upload_id}
+            point.update(zip(parameters, values))
+            points.append(point)
+
+        return Response({
+            'equipment': equipment.name,
+            'type': equipment.equipment_type,
+            'parameters': parameters,
+            'count': len(points),
+            'points': points,
+        }, status=status.HTTP_200_OK)
+
+class EquipmentSearchView(APIView):
+    """
+    Search the user's equipment tags across all uploads.
+
+    GET /api/search/?q=<term>&limit=20
+    Matches name and type prefixes and substrings of names and types, and returns each
+    tag with its latest reading and health status from the search index, and
+    its EWMA baseline per parameter (api.baselines).
+    """
+    permission_classes = [IsAuthenticated]
+    DEFAULT_LIMIT = 20
+    MAX_LIMIT = 100
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({"error": "Query parameter 'q' is required"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', self.DEFAULT_LIMIT)), self.MAX_LIMIT))
+        except (ValueError, TypeError):
+            return Response({"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+        results = [
+            {
+                'equipment': e.name,
+                'type': e.equipment_type,
+                'last_seen_at': e.last_seen_at,
+                'health_status': e.latest_health_status or None,
+                'latest': {field: getattr(e, f'latest_{field}') for field in READING_FIELDS.values()},
+                'baseline': describe_baseline(e.baseline),
+            }
+            for e in search_equipment(request.user, query, limit)
+        ]
+        return Response({'query': query, 'count': len(results), 'results': results}, status=status.HTTP_200_OK)
+
+class UploadDiffView(APIView):
+    """
+    Compares two of the user's uploads.
+
+    GET /api/upload/<a>/diff/<b>/
+    - Aligns rows by Equipment Name (a = before, b = after).
+    - Returns per-equipment deltas, health-status transitions under the
+      user's current thresholds and alert rules, and changes to the summary stats.
+    - Results are cached per (a, b, thresholds, rules); uploads are immutable.
+    """
+    permission_classes = [IsAuthenticated]
+    CACHE_TIMEOUT = 60 * 15
+
+    def get(self, request, a, b):
+        uploads = {u.pk: u for u in UploadedFile.objects.filter(pk__in=[a, b], user=request.user)}
+        if a not in uploads or b not in uploads:
+            return Response({"error": "Upload not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        warning_percentile, iqr_multiplier = get_threshold_settings(request.user)
+        options = get_detection_options(request.user)
+        rules = get_alert_rules(request.user)
+        # Editing, adding or disabling a rule changes the key, as a threshold change does
+        rules_key = hashlib.sha256(repr([(r.id, r.expression, r.severity) for r in rules]).encode()).hexdigest()[:16]
+        cache_key = f"upload-diff:{a}:{b}:{warning_percentile}:{iqr_multiplier}:{options['mode']}:{options['per_type']}:{rules_key}"
+        result = cache.get(cache_key)
+        metrics.record_cache('upload_diff', result is not None)
+        if result is None:
+            # Parameters both uploads were analysed on, with the newer upload's overrides
+            before_names = {p.name for p in stored_parameters(uploads[a].summary)}
+            shared = analysis_options([p for p in stored_parameters(uploads[b].summary) if p.name in before_names])
+            # Rules on columns the reading index doesn't hold read the stored rows instead
+            extra = sorted(referenced_columns(rules) - set(TEXT_COLUMNS) - set(shared['columns']))
+            frames = [upload_frame(uploads[pk], shared['columns'] + extra) for pk in (a, b)]
+            floors = [severity_codes(evaluate_rules(df, rules)[0], len(df)) for df in frames]
+            result = diff_frames(
+                *frames, warning_percentile, iqr_multiplier, floors=floors, **shared, **options
+            )
+            cache.set(cache_key, result, self.CACHE_TIMEOUT)
+
+        return Response({
+            'before': {'id': a, 'user_upload_index': uploads[a].user_upload_index, 'uploaded_at': uploads[a].uploaded_at},
+            'after': {'id': b, 'user_upload_index': uploads[b].user_upload_index, 'uploaded_at': uploads[b].uploaded_at},
+            'thresholds': {
+                'warning_percentile': warning_percentile,
+                'outlier_iqr_multiplier': iqr_multiplier,
+                'detection_mode': options['mode'],
+                'per_type_bounds': options['per_type'],
+            },
+            **result,
+        }, status=status.HTTP_200_OK)
+
+class ThresholdSweepView(APIView):
+    """
+    What-if preview of threshold settings for one upload.
+
+    POST /api/upload/<pk>/threshold-sweep/
+    - pairs: [{"warning_percentile", "outlier_iqr_multiplier"}, ...], or
+      warning_percentiles + outlier_iqr_multipliers: lists whose full grid is swept
+    - changed_limit: equipment listed per pair (default 20, max 200)
+    Returns normal/warning/critical counts and the equipment whose status
+    changes versus the user's current thresholds, for every pair, under the
+    user's detection mode. Rows matching the user's alert rules are raised
+    to the rules' severity, as in history and the rows endpoint. Nothing is
+    saved.
+    """
+    permission_classes = [IsAuthenticated]
+    MAX_PAIRS = 400
+    DEFAULT_CHANGED_LIMIT = 20
+    MAX_CHANGED_LIMIT = 200
+    RANGES = {
+        'warning_percentile': (0.5, 0.95),
+        'outlier_iqr_multiplier': (0.5, 3.0),
+    }
+
+    def _value(self, field, raw, errors):
+        low, high = self.RANGES[field]
+        try:
+            value = float(raw)
+        except (ValueError, TypeError):
+            errors[field] = 'Must be a valid number'
+            return None
+        if not (low <= value <= high):
+            errors[field] = f'Must be between {low} and {high}'
+            return None
+        return value
+
+    def post(self, request, pk):
+        try:
+            instance = UploadedFile.objects.get(pk=pk, user=request.user)
+        except UploadedFile.DoesNotExist:
+            return Response({"error": "Upload not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        data = request.data
+        errors = {}
+        pairs = []
+        if 'pairs' in data:
+            if not isinstance(data['pairs'], list):
+                errors['pairs'] = 'Must be a list of {warning_percentile, outlier_iqr_multiplier} objects'
+            else:
+                for item in data['pairs']:
+                    if not isinstance(item, dict):
+                        errors['pairs'] = 'Must be a list of {warning_percentile, outlier_iqr_multiplier} objects'
+                        break
+                    pairs.append((
+                        self._value('warning_percentile', item.get('warning_percentile'), errors),
+                        self._value('outlier_iqr_multiplier', item.get('outlier_iqr_multiplier'), errors),
+                    ))
+        else:
+            grid = {}
+            for field, key in (('warning_percentile', 'warning_percentiles'), ('outlier_iqr_multiplier', 'outlier_iqr_multipliers')):
+                values = data.get(key)
+                if not isinstance(values, list) or not values:
+                    errors[key] = 'Must be a non-empty list of numbers'
+                    continue
+                grid[field] = [self._value(field, v, errors) for v in values]
+            if not errors:
+                pairs = [(w, m) for w in grid['warning_percentile'] for m in grid['outlier_iqr_multiplier']]
+
+        if not errors and not pairs:
+            errors['pairs'] = 'At least one threshold pair is required'
+        if len(pairs) > self.MAX_PAIRS:
+            errors['pairs'] = f'At most {self.MAX_PAIRS} pairs per request'
+
+        try:
+            changed_limit = max(0, min(int(data.get('changed_limit', self.DEFAULT_CHANGED_LIMIT)), self.MAX_CHANGED_LIMIT))
+        except (ValueError, TypeError):
+            errors['changed_limit'] = 'Must be an integer'
+
+        if errors:
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        current = get_threshold_settings(request.user)
+        options = get_detection_options(request.user)
+        parameters = analysis_options(stored_parameters(instance.summary))
+        rules = get_alert_rules(request.user)
+        with span('sweep'):
+            # Rules on columns the reading index doesn't hold read the stored rows instead
+            extra = referenced_columns(rules) - set(TEXT_COLUMNS) - set(parameters['columns'])
+            frame = upload_frame(instance, parameters['columns'] + sorted(extra))
+            matches, _ = evaluate_rules(frame, rules)
+            result = threshold_sweep(
+                frame, pairs, current, changed_limit=changed_limit,
+                floor=severity_codes(matches, len(frame)), **parameters, **options,
+            )
+
+        return Response({
+            'upload': {'id': instance.pk, 'user_upload_index': instance.user_upload_index},
+            'detection_mode': options['mode'],
+            'per_type_bounds': options['per_type'],
+            **result,
+        }, status=status.HTTP_200_OK)
+
+class UploadRowsView(APIView):
+    """
+    Filtered, sorted and paginated rows of one upload.
+
+    GET /api/upload/<pk>/rows/
+    - health_status / type: comma-separated allowed values
+    - alert_rule: comma-separated rule ids; rows matching any of them
+    - <parameter>__gt|gte|lt|lte: numeric range filters, e.g. pressure__gt=30
+    - ordering: comma-separated keys (name, type, health_status or any
+      parameter of the upload, lower-cased); prefix with '-' for descending
+    - page_size (default 50, max 500) and offset (rows to skip, default 0);
+      next/previous links carry the offset
+    Health uses the user's current thresholds (and alert rules) over the
+    whole upload, then the filters are applied as vectorized masks. Rules
+    that read columns outside the reading index are evaluated on the
+    stored rows. Every page repeats that whole-upload pass (the statuses
+    depend on all rows), so a page costs O(rows) wherever it starts; the
+    offset only picks the slice of the sorted, filtered positions.
+    """
+    permission_classes = [IsAuthenticated]
+    DEFAULT_PAGE_SIZE = 50
+    MAX_PAGE_SIZE = 500
+    SORT_KEYS = {
+        'name': 'Equipment Name',
+        'type': 'Type',
+        'health_status': 'health_status',
+    }
+
+    @staticmethod
+    def _split(value):
+        return [v.strip() for v in value.split(',') if v.strip()] if value else []
+
+    def get(self, request, pk):
+        try:
+            instance = UploadedFile.objects.get(pk=pk, user=request.user)
+        except UploadedFile.DoesNotExist:
+            return Response({"error": "Upload not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        parameters = analysis_options(stored_parameters(instance.summary))
+        numeric = {col.lower(): col for col in parameters['columns']}
+        sort_keys = {**self.SORT_KEYS, **numeric}
+        params = request.query_params
+        errors = {}
+
+        health_statuses = [h.lower() for h in self._split(params.get('health_status'))]
+        if any(h not in HEALTH_LEVELS for h in health_statuses):
+            errors['health_status'] = f"Must be any of: {', '.join(HEALTH_LEVELS)}"
+
+        try:
+            alert_rule_ids = {int(r) for r in self._split(params.get('alert_rule'))}
+        except ValueError:
+            errors['alert_rule'] = "Must be comma-separated rule ids"
+
+        ranges = []
+        for key, raw in params.items():
+            name, sep, op = key.rpartition('__')
+            if not sep or op not in RANGE_OPERATORS or name.lower() not in sort_keys:
+                continue
+            column = sort_keys[name.lower()]
+            if column not in parameters['columns']:
+                errors[key] = "Range filters only apply to numeric parameters"
+                continue
+            try:
+                ranges.append((column, op, float(raw)))
+            except (ValueError, TypeError):
+                errors[key] = "Must be a valid number"
+
+        ordering = []
+        for key in self._split(params.get('ordering')):
+            descending = key.startswith('-')
+            column = sort_keys.get(key.lstrip('-').lower())
+            if column is None:
+                errors['ordering'] = f"Unknown sort key '{key}'. Expected any of: {', '.join(sort_keys)}"
+                break
+            ordering.append((column, descending))
+
+        try:
+            page_size = max(1, min(int(params.get('page_size', self.DEFAULT_PAGE_SIZE)), self.MAX_PAGE_SIZE))
+        except (ValueError, TypeError):
+            errors['page_size'] = "Must be an integer"
+
+        try:
+            offset = int(params.get('offset', 0))
+            if offset < 0:
+                raise ValueError
+        except (ValueError, TypeError):
+            errors['offset'] = "Must be a non-negative integer"
+
+        if errors:
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        rules = get_alert_rules(request.user)
+        # Rules on columns the reading index doesn't hold read the stored rows instead
+        extra = referenced_columns(rules) - set(TEXT_COLUMNS) - set(parameters['columns'])
+        df = upload_frame(instance, parameters['columns'] + sorted(extra))
+        warning_percentile, iqr_multiplier = get_threshold_settings(request.user)
+        _, statuses, _ = judge(df, warning_percentile, iqr_multiplier, **parameters, **get_detection_options(request.user))
+        matches, _ = evaluate_rules(df, rules)
+        statuses = escalate(statuses, matches)
+        tags = row_tags(matches)
+
+        mask = row_mask(df, statuses, health_statuses, self._split(params.get('type')), ranges)
+        if 'alert_rule' in params:
+            matched = np.zeros(len(df), dtype=bool)
+            for match in matches:
+                if match.rule.id in alert_rule_ids:
+                    matched[match.positions] = True
+            mask &= matched
+        positions = sort_positions(df, statuses, ordering)
+        positions = positions[mask[positions]]
+
+        page = positions[offset:offset + page_size]
+        rows = df.iloc[page]
+        results = rows.astype(object).where(rows.notna(), None).to_dict(orient='records')
+        for position, record, health_status in zip(page.tolist(), results, statuses[page].tolist()):
+            record['health_status'] = health_status
+            record['health_color'] = HEALTH_COLORS[health_status]
+            if position in tags:
+                record['alert_rules'] = tags[position]
+
+        url = request.build_absolute_uri()
+        next_url = None
+        if offset + page_size < len(positions):
+            next_url = replace_query_param(url, 'offset', offset + page_size)
+        previous_url = None
+        if offset > 0:
+            previous_offset = max(0, offset - page_size)
+            previous_url = (
+                replace_query_param(url, 'offset', previous_offset)
+                if previous_offset else remove_query_param(url, 'offset')
+            )
+
+        return Response({
+            'count': int(len(positions)),
+            'next': next_url,
+            'previous': previous_url,
+            'results': results,
+        }, status=status.HTTP_200_OK)
+
+class RollupView(APIView):
+    """
+    Aggregates from the materialized per-type rollups.
+
+    GET /api/rollups/
+    - granularity: day | month | year (default month)
+    - start / end: optional ISO dates (inclusive)
+    - type: optional equipment type filter
+    - scope: user (default) or fleet (staff only, all users)
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        granularity = request.query_params.get('granularity', 'month')
+        if granularity not in GRANULARITIES:
+            return Response(
+                {"error": f"granularity must be one of: {', '.join(GRANULARITIES)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        scope = request.query_params.get('scope', 'user')
+        if scope == 'fleet':
+            if not request.user.is_staff:
+                return Response({"error": "Fleet scope requires staff access"}, status=status.HTTP_403_FORBIDDEN)
+            rollups = TypeRollup.objects.all()
+        elif scope == 'user':
+            rollups = TypeRollup.objects.filter(user=request.user)
+        else:
+            return Response({"error": "scope must be 'user' or 'fleet'"}, status=status.HTTP_400_BAD_REQUEST)
+
+        for param, lookup in (('start', 'period__gte'), ('end', 'period__lte')):
+            raw = request.query_params.get(param)
+            if raw:
+                parsed = parse_date(raw)
+                if parsed is None:
+                    return Response({"error": f"{param} must be an ISO date (YYYY-MM-DD)"}, status=status.HTTP_400_BAD_REQUEST)
+                rollups = rollups.filter(**{lookup: parsed})
+
+        eq_type = request.query_params.get('type')
+        if eq_type:
+            rollups = rollups.filter(equipment_type=eq_type)
+
+        return Response({
+            'scope': scope,
+            'granularity': granularity,
+            'results': aggregate_rollups(rollups, granularity),
+        }, status=status.HTTP_200_OK)
+
+class IsStaffOrMetricsHost(BasePermission):
+    """
+    Staff users, or requests from an address in METRICS_ALLOWED_IPS.
+    X-Real-IP names the client only when the connection comes from a
+    METRICS_TRUSTED_PROXIES address or a unix socket (empty REMOTE_ADDR);
+    from anywhere else it is client-supplied and ignored.
+    """
+
+    def has_permission(self, request, view):
+        if request.user and request.user.is_staff:
+            return True
+        client = request.META.get('REMOTE_ADDR') or ''
+        if not client or client in django_settings.METRICS_TRUSTED_PROXIES:
+            client = request.META.get('HTTP_X_REAL_IP') or client
+        return client in django_settings.METRICS_ALLOWED_IPS
+
+class MetricsView(APIView):
+    """
+    Prometheus scrape endpoint.
+
+    GET /api/metrics
+    - Text exposition format; aggregated across gunicorn workers when
+      PROMETHEUS_MULTIPROC_DIR is set.
+    - Staff (JWT) or local scrapers only; not throttled.
+    """
+    permission_classes = [IsStaffOrMetricsHost]
+    throttle_classes = []
+
+    def get(self, request):
+        body, content_type = metrics.render_metrics()
+        return HttpResponse(body, content_type=content_type)
+
 class UpdateAISummaryView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -417,7 +1333,8 @@ class PDFReportView(APIView):
     
     GET:
     - Returns a downloadable PDF file for a specific upload.
-    - Includes summary stats, AI insights (if available), and visualization charts.
+    - Includes summary stats, AI insights (if available), and visualization charts,
+      plus an operating-regime page when the upload was clustered.
     - Charts are generated on-the-fly using Matplotlib (Agg backend).
     """
     permission_classes = [IsAuthenticated]
@@ -455,6 +1372,30 @@ class PDFReportView(APIView):
         p.line(50, height - 65, 250, height - 65)
         
         return height - 100  # Return new Y position
+
+    # Parameters listed individually in the summary table / charted side by side
+    MAX_TABLE_PARAMETERS = 12
+    MAX_TYPE_CHART_PARAMETERS = 4
+    CHART_COLORS = ['#58a6ff', '#2ea043', '#f85149', '#ee82ee', '#f59e0b', '#14b8a6']
+    # Rows drawn in the operating-regime scatter (a fixed sample beyond that)
+    MAX_CLUSTER_POINTS = 5000
+
+    @staticmethod
+    def report_parameters(stats):
+        """summary['parameters'], or the core three from the flat keys of older uploads."""
+        if stats.get('parameters'):
+            return stats['parameters']
+        return [
+            {
+                'name': col, 'unit': '',
+                **{stat: stats.get(f'{prefix}_{col.lower()}') for stat, prefix in (('mean', 'avg'), ('min', 'min'), ('max', 'max'))},
+            }
+            for col in NUMERIC_COLUMNS if f'avg_{col.lower()}' in stats
+        ]
+
+    @staticmethod
+    def parameter_label(parameter):
+        return f"{parameter['name']} ({parameter['unit']})" if parameter.get('unit') else parameter['name']
     
     def draw_footer(self, p, width, page_num, total_pages=3):
         """Draw a professional footer."""
@@ -466,6 +1407,76 @@ class PDFReportView(APIView):
         p.drawString(50, 15, "Chemical Equipment Visualizer")
         p.drawRightString(width - 50, 15, f"Page {page_num} of {total_pages}")
     
+    def draw_clusters_page(self, p, width, height, clusters, df):
+        """Operating regimes: a table of the clusters and a scatter of the rows on the first two parameters."""
+        current_y = self.draw_header(p, width, height, "Operating Regimes")
+        parameters = clusters['parameters']
+        shown = parameters[:self.MAX_TYPE_CHART_PARAMETERS]
+        total = max(sum(clusters['sizes']), 1)
+
+        p.setFillColor(self.COLORS['text'])
+        p.setFont("Helvetica", 10)
+        p.drawString(50, current_y - 10, (
+            f"{clusters['k']} regimes from mini-batch k-means on {len(parameters)} standardized parameters "
+            f"(fitted on {clusters['sample_size']:,} rows)."
+        ))
+        current_y -= 30
+
+        table_data = [["Regime", "Units", "Share", "Main types"] + shown]
+        for i, (size, centroid, types) in enumerate(zip(clusters['sizes'], clusters['centroids'], clusters['types'])):
+            table_data.append(
+                [f"#{i + 1}", f"{size:,}", f"{size / total:.1%}", ", ".join(types)[:30]]
+                + [f"{centroid[name]:.2f}" if centroid.get(name) is not None else "-" for name in shown]
+            )
+        table = Table(table_data, colWidths=[45, 55, 45, 135] + [(width - 380) / max(len(shown), 1)] * len(shown))
+        table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), self.COLORS['table_header']),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 0), (-1, -1), 8),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            *[('BACKGROUND', (0, i), (-1, i), self.COLORS['table_alt']) for i in range(2, len(table_data), 2)],
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#d1d5db')),
+        ]))
+        w, h = table.wrap(width - 100, height)
+        table.drawOn(p, 50, current_y - h)
+        current_y -= (h + 20)
+
+        if len(parameters) < 2 or 'cluster' not in df.columns:
+            return
+        fig = None
+        try:
+            x_name, y_name = parameters[:2]
+            points = df.dropna(subset=[x_name, y_name, 'cluster'])
+            if len(points) > self.MAX_CLUSTER_POINTS:
+                points = points.sample(self.MAX_CLUSTER_POINTS, random_state=0)
+            fig, ax = plt.subplots(figsize=(10, 7))
+            for i, centroid in enumerate(clusters['centroids']):
+                color = self.CHART_COLORS[i % len(self.CHART_COLORS)]
+                members = points[points['cluster'] == i]
+                ax.scatter(members[x_name], members[y_name], s=8, alpha=0.4, color=color, label=f"#{i + 1}")
+                ax.scatter([centroid[x_name]], [centroid[y_name]], s=160, marker='X', color=color, edgecolors='black')
+            ax.set_xlabel(x_name)
+            ax.set_ylabel(y_name)
+            ax.set_title('Rows by Operating Regime (X = centroid)', fontweight='bold')
+            ax.legend()
+            ax.grid(alpha=0.3)
+
+            chart_buffer = BytesIO()
+            with span('charts'):
+                plt.tight_layout()
+                plt.savefig(chart_buffer, format='png', dpi=200, bbox_inches='tight', facecolor='white')
+            chart_buffer.seek(0)
+            img_height = min(current_y - 60, 420)
+            p.drawImage(ImageReader(chart_buffer), 30, current_y - img_height, width=width - 60, height=img_height, preserveAspectRatio=True)
+        except Exception as chart_error:
+            p.setFont("Helvetica", 10)
+            p.drawString(50, current_y - 20, f"Chart generation error: {str(chart_error)}")
+        finally:
+            if fig:
+                plt.close(fig)
+
     # Fix 406 error by allowing any content type
     def get(self, request, pk, *args, **kwargs):
         try:
@@ -479,12 +1490,15 @@ class PDFReportView(APIView):
             width, height = A4
             
             # Use serializer to get freshly calculated data (respecting current thresholds)
-            serializer = UploadedFileSerializer(instance, context={'request': request})
-            serialized_data = serializer.data
+            with span('serialize'):
+                serializer = UploadedFileSerializer(instance, context={'request': request})
+                serialized_data = serializer.data
             stats = serialized_data['summary']
             processed_data = serialized_data['processed_data']
             
             df = pd.DataFrame(processed_data)
+            clusters = stats.get('clusters')
+            total_pages = 4 if clusters else 3
             
             # --- PAGE 1: Summary ---
             current_y = self.draw_header(p, width, height)
@@ -519,17 +1533,23 @@ class PDFReportView(APIView):
             p.drawString(50, current_y - 18, "📊 Summary Statistics")
             current_y -= 40
             
-            # Summary Table Data with better styling
+            # Summary Table Data with better styling: one row per parameter
+            parameters = self.report_parameters(stats)
+            fmt = lambda value: '-' if value is None else f"{value:.2f}"
             summary_data = [
                 ["Metric", "Value", "Metric", "Value"],
-                ["Total Equipment", str(stats.get('total_count', 0)), "Avg Flowrate", f"{stats.get('avg_flowrate', 0):.2f}"],
-                ["Avg Pressure", f"{stats.get('avg_pressure', 0):.2f}", "Avg Temperature", f"{stats.get('avg_temperature', 0):.2f}"],
-                ["Min Flowrate", f"{stats.get('min_flowrate', 0):.2f}", "Max Flowrate", f"{stats.get('max_flowrate', 0):.2f}"],
-                ["Min Pressure", f"{stats.get('min_pressure', 0):.2f}", "Max Pressure", f"{stats.get('max_pressure', 0):.2f}"],
-                ["Min Temperature", f"{stats.get('min_temperature', 0):.2f}", "Max Temperature", f"{stats.get('max_temperature', 0):.2f}"],
+                ["Total Equipment", str(stats.get('total_count', 0)), "Parameters", str(len(parameters))],
             ]
+            for parameter in parameters[:self.MAX_TABLE_PARAMETERS]:
+                label = self.parameter_label(parameter)
+                summary_data.append([
+                    f"Avg {label}", fmt(parameter.get('mean')),
+                    "Min / Max", f"{fmt(parameter.get('min'))} / {fmt(parameter.get('max'))}",
+                ])
+            if len(parameters) > self.MAX_TABLE_PARAMETERS:
+                summary_data.append([f"+ {len(parameters) - self.MAX_TABLE_PARAMETERS} more parameters", "", "", ""])
             
-            table = Table(summary_data, colWidths=[120, 80, 120, 80])
+            table = Table(summary_data, colWidths=[150, 70, 90, 110])
             table.setStyle(TableStyle([
                 ('BACKGROUND', (0, 0), (-1, 0), self.COLORS['table_header']),
                 ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
@@ -540,8 +1560,7 @@ class PDFReportView(APIView):
                 ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
                 ('TOPPADDING', (0, 0), (-1, -1), 6),
                 ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
-                ('BACKGROUND', (0, 2), (-1, 2), self.COLORS['table_alt']),
-                ('BACKGROUND', (0, 4), (-1, 4), self.COLORS['table_alt']),
+                *[('BACKGROUND', (0, row), (-1, row), self.COLORS['table_alt']) for row in range(2, len(summary_data), 2)],
                 ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#d1d5db')),
                 ('ROUNDEDCORNERS', [5, 5, 5, 5]),
             ]))
@@ -622,7 +1641,7 @@ class PDFReportView(APIView):
                             w, h = t.wrap(width - 100, height)
                             
                             if current_y - h < 50:
-                                self.draw_footer(p, width, 1)
+                                self.draw_footer(p, width, 1, total_pages)
                                 p.showPage()
                                 current_y = self.draw_header(p, width, height, "AI Analysis (continued)")
                                 
@@ -655,7 +1674,7 @@ class PDFReportView(APIView):
                         w, h = para.wrap(width - 100, height)
                         
                         if current_y - h < 50:
-                            self.draw_footer(p, width, 1)
+                            self.draw_footer(p, width, 1, total_pages)
                             p.showPage()
                             current_y = self.draw_header(p, width, height, "AI Analysis (continued)")
                         
@@ -676,7 +1695,7 @@ class PDFReportView(APIView):
             
             for k, v in type_dist.items():
                 if current_y < 80:
-                    self.draw_footer(p, width, 1)
+                    self.draw_footer(p, width, 1, total_pages)
                     p.showPage()
                     current_y = self.draw_header(p, width, height, "Summary (continued)")
                     p.setFont("Helvetica", 10)
@@ -690,7 +1709,7 @@ class PDFReportView(APIView):
             if outliers and len(outliers) > 0:
                 current_y -= 25
                 if current_y < 80:
-                    self.draw_footer(p, width, 1)
+                    self.draw_footer(p, width, 1, total_pages)
                     p.showPage()
                     current_y = self.draw_header(p, width, height, "Summary (continued)")
                 
@@ -724,7 +1743,7 @@ class PDFReportView(APIView):
                         ])
                 
                 # ALERT Table
-                t_alert = PlatyTable(alert_data, colWidths=[120, 100, 80, 120, 80])
+                t_alert = Table(alert_data, colWidths=[120, 100, 80, 120, 80])
                 t_style = [
                     ('BACKGROUND', (0, 0), (-1, 0), self.COLORS['danger']),
                     ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
@@ -734,13 +1753,13 @@ class PDFReportView(APIView):
                     ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#fef2f2')),
                     ('TEXTCOLOR', (0, 1), (-1, -1), self.COLORS['danger']),
                 ]
-                t_alert.setStyle(PlatyTableStyle(t_style))
+                t_alert.setStyle(TableStyle(t_style))
                 
                 w, h = t_alert.wrap(width - 100, height)
                 t_alert.drawOn(p, 50, current_y - h)
                 current_y -= (h + 20)
 
-            self.draw_footer(p, width, 1)
+            self.draw_footer(p, width, 1, total_pages)
             p.showPage()
             
             # --- PAGE 2: Charts ---
@@ -761,24 +1780,29 @@ class PDFReportView(APIView):
                     ax1.text(0.5, 0.5, 'No Type Data', ha='center', va='center', transform=ax1.transAxes)
                     ax1.axis('off')
                 
-                # Chart 2: Parameter Averages (Bar)
-                params = ['Flowrate', 'Pressure', 'Temperature']
-                avg_vals = [stats['avg_flowrate'], stats['avg_pressure'], stats['avg_temperature']]
-                bars = ax2.bar(params, avg_vals, color=['#58a6ff', '#2ea043', '#f85149'])
+                # Chart 2: Parameter Averages (Bar), one bar per parameter
+                params = [self.parameter_label(parameter) for parameter in parameters]
+                avg_vals = [parameter.get('mean') or 0 for parameter in parameters]
+                chart_colors = [self.CHART_COLORS[i % len(self.CHART_COLORS)] for i in range(len(params))]
+                bars = ax2.bar(params, avg_vals, color=chart_colors)
                 ax2.set_title('Average Parameters', fontweight='bold')
                 ax2.set_ylabel('Value')
+                if len(params) > 3:
+                    ax2.tick_params(axis='x', labelrotation=45)
                 ax2.grid(axis='y', alpha=0.3)
                 
-                # Chart 3: Type Comparison
+                # Chart 3: Type Comparison (the first few parameters, grouped bars)
                 if stats.get('type_comparison') and len(stats['type_comparison']) > 0:
                     types = list(stats['type_comparison'].keys())
-                    flow_avgs = [stats['type_comparison'][t]['avg_flowrate'] for t in types]
-                    press_avgs = [stats['type_comparison'][t]['avg_pressure'] for t in types]
+                    compared = parameters[:self.MAX_TYPE_CHART_PARAMETERS]
                     
                     x = np.arange(len(types))
-                    width_bar = 0.35
-                    ax3.bar(x - width_bar/2, flow_avgs, width_bar, label='Flowrate', color='#58a6ff')
-                    ax3.bar(x + width_bar/2, press_avgs, width_bar, label='Pressure', color='#ee82ee')
+                    width_bar = 0.8 / max(len(compared), 1)
+                    for i, parameter in enumerate(compared):
+                        key = f"avg_{parameter['name'].lower()}"
+                        avgs = [stats['type_comparison'][t].get(key) or 0 for t in types]
+                        offset = (i - (len(compared) - 1) / 2) * width_bar
+                        ax3.bar(x + offset, avgs, width_bar, label=parameter['name'], color=self.CHART_COLORS[i % len(self.CHART_COLORS)])
                     ax3.set_title('Parameter by Type', fontweight='bold')
                     ax3.set_xticks(x)
                     ax3.set_xticklabels(types, rotation=45, ha='right')
@@ -810,8 +1834,9 @@ class PDFReportView(APIView):
                     ax4.text(0.5, 0.5, 'No Data', ha='center', va='center', transform=ax4.transAxes)
                     ax4.axis('off')
 
-                plt.tight_layout(pad=3.0)
-                plt.savefig(chart_buffer, format='png', dpi=300, bbox_inches='tight', facecolor='white')
+                with span('charts'):
+                    plt.tight_layout(pad=3.0)
+                    plt.savefig(chart_buffer, format='png', dpi=300, bbox_inches='tight', facecolor='white')
                 
                 chart_buffer.seek(0)
                 img = ImageReader(chart_buffer)
@@ -827,10 +1852,16 @@ class PDFReportView(APIView):
                 if fig:
                     plt.close(fig)
 
-            self.draw_footer(p, width, 2)
+            self.draw_footer(p, width, 2, total_pages)
             p.showPage()
+
+            # --- PAGE 3: Operating Regimes (clustered uploads only) ---
+            if clusters:
+                self.draw_clusters_page(p, width, height, clusters, df)
+                self.draw_footer(p, width, 3, total_pages)
+                p.showPage()
             
-            # --- PAGE 3: Data Table ---
+            # --- LAST PAGE: Data Table ---
             current_y = self.draw_header(p, width, height, "Equipment Data Table")
             
             # Prepare table data
@@ -860,12 +1891,13 @@ class PDFReportView(APIView):
             
             if len(df) > 25:
                 p.setFillColor(self.COLORS['text_light'])
-                p.setFont("Helvetica-Italic", 9)
+                p.setFont("Helvetica-Oblique", 9)
                 p.drawString(50, current_y - h - 15, f"Showing first 25 of {len(df)} equipment items")
             
-            self.draw_footer(p, width, 3)
+            self.draw_footer(p, width, total_pages, total_pages)
             p.showPage()
-            p.save()
+            with span('pdf_render'):
+                p.save()
             return response
             
         except UploadedFile.DoesNotExist:
@@ -0,0 +1,337 @@
+"""
+HTTP load-testing harness for the API.
+
+Simulates N desktop clients against a local server. Each client follows
+the desktop pattern: login -> upload -> poll /api/history/ every
+poll interval -> download a PDF report. The actions after the first
+upload are drawn from a configurable weighted mix. The harness reports
+throughput and p50/p95/p99 latency per endpoint.
+
+It can target a server that is already running (runserver or gunicorn),
+or start gunicorn itself for each worker count to build a saturation
+curve (throughput and p95 vs workers x clients).
+
+Usage (from backend/):
+    # Against a running server; users are created through the ORM first
+    python -m benchmarks.load_test --base-url http://127.0.0.1:8000 --clients 10 --duration 60 --create-users
+
+    # Saturation curve: start gunicorn with 1..4 workers, 5/10/20 clients each
+    python -m benchmarks.load_test --workers 1 2 3 4 --clients 5 10 20 --duration 60 --create-users --output load.json
+
+The default anonymous throttle (20/minute) limits logins. Started servers
+get ANON_THROTTLE_RATE raised automatically. For an external server, start
+it with ANON_THROTTLE_RATE=100000/minute.
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import defaultdict
+
+import numpy as np
+
+from benchmarks.synthetic import generate_equipment_csv
+
+DEFAULT_MIX = {'history': 8, 'upload': 1, 'report': 1}
+USER_PREFIX = 'loadtest'
+USER_PASSWORD = 'loadtest-password'
+
+
+class Recorder:
+    """Thread-safe latency / status collection keyed by endpoint label."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def record(self, endpoint, seconds, status_code, ok):
+        with self._lock:
+            self.latencies[endpoint].append(seconds)
+            self.statuses[endpoint][status_code] += 1
+            if not ok:
+                self.errors[endpoint] += 1
+
+    def summary(self, elapsed):
+        report = {}
+        total = 0
+        for endpoint, samples in sorted(self.latencies.items()):
+            arr = np.array(samples) * 1000.0
+            total += len(samples)
+            report[endpoint] = {
+                'requests': len(samples),
+                'errors': self.errors[endpoint],
+                'throughput_rps': len(samples) / elapsed if elapsed else 0.0,
+                'p50_ms': float(np.percentile(arr, 50)),
+                'p95_ms': float(np.percentile(arr, 95)),
+                'p99_ms': float(np.percentile(arr, 99)),
+                'max_ms': float(arr.max()),
+                'status_codes': {str(k): v for k, v in self.statuses[endpoint].items()},
+            }
+        report['_all'] = {
+            'requests': total,
+            'errors': sum(self.errors.values()),
+            'throughput_rps': total / elapsed if elapsed else 0.0,
+            'elapsed_seconds': elapsed,
+        }
+        return report
+
+
+def _multipart(field, filename, content, content_type='text/csv'):
+    boundary = uuid.uuid4().hex
+    body = (
+        f'--{boundary}\r\n'
+        f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+        f'Content-Type: {content_type}\r\n\r\n'
+    ).encode() + content + f'\r\n--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+class DesktopClient:
+    """One simulated desktop app session."""
+
+    def __init__(self, base_url, username, password, csv_bytes, recorder, timeout=120):
+        self.base_url = base_url.rstrip('/') + '/api/'
+        self.username = username
+        self.password = password
+        self.csv_bytes = csv_bytes
+        self.recorder = recorder
+        self.timeout = timeout
+        self.token = None
+        self.upload_ids = []
+
+    def _request(self, endpoint, method, path, body=None, content_type=None):
+        headers = {}
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        if content_type:
+            headers['Content-Type'] = content_type
+        req = urllib.request.Request(self.base_url + path, data=body, method=method, headers=headers)
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as res:
+                payload = res.read()
+                status = res.status
+        except urllib.error.HTTPError as e:
+            payload = e.read()
+            status = e.code
+        except (urllib.error.URLError, socket.timeout, ConnectionError) as e:
+            self.recorder.record(endpoint, time.perf_counter() - start, type(e).__name__, False)
+            return None, None
+        elapsed = time.perf_counter() - start
+        self.recorder.record(endpoint, elapsed, status, 200 <= status < 300)
+        return status, payload
+
+    def login(self):
+        body = json.dumps({'username': self.username, 'password': self.password}).encode()
+        status, payload = self._request('login', 'POST', 'login/', body, 'application/json')
+        if status == 200:
+            self.token = json.loads(payload)['access']
+        return self.token is not None
+
+    def upload(self):
+        body, content_type = _multipart('file', 'loadtest.csv', self.csv_bytes)
+        status, payload = self._request('upload', 'POST', 'upload/', body, content_type)
+        if status == 201:
+            self.upload_ids.append(json.loads(payload)['id'])
+            self.upload_ids = self.upload_ids[-5:]  # server keeps the last 5
+
+    def history(self):
+        self._request('history', 'GET', 'history/')
+
+    def report(self):
+        if self.upload_ids:
+            self._request('report', 'GET', f'report/{self.upload_ids[-1]}/')
+
+    def run(self, deadline, poll_interval, mix, rng):
+        if not self.login():
+            return
+        self.upload()
+        actions = list(mix)
+        weights = [mix[a] for a in actions]
+        while time.monotonic() < deadline:
+            getattr(self, rng.choices(actions, weights)[0])()
+            # Desktop clients poll on a fixed timer; jitter avoids lock-step bursts
+            sleep_for = poll_interval * rng.uniform(0.8, 1.2)
+            time.sleep(max(0.0, min(sleep_for, deadline - time.monotonic())))
+
+
+def create_users(count):
+    """Create (or reset) loadtest-<i> accounts through the ORM."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+    import django
+    django.setup()
+    from django.contrib.auth.models import User
+
+    names = []
+    for i in range(count):
+        username = f'{USER_PREFIX}-{i}'
+        user, _ = User.objects.get_or_create(username=username, defaults={'email': f'{username}@example.com'})
+        user.set_password(USER_PASSWORD)
+        user.save()
+        names.append(username)
+    return names
+
+
+def run_load(base_url, clients, duration, poll_interval, mix, rows, seed=42, usernames=None, password=USER_PASSWORD):
+    """Run one load phase and return the per-endpoint summary."""
+    csv_bytes = generate_equipment_csv(rows, seed=seed)
+    recorder = Recorder()
+    deadline = time.monotonic() + duration
+    usernames = usernames or [f'{USER_PREFIX}-{i}' for i in range(clients)]
+
+    threads = []
+    start = time.perf_counter()
+    for i in range(clients):
+        client = DesktopClient(base_url, usernames[i % len(usernames)], password, csv_bytes, recorder)
+        rng = random.Random(seed + i)
+        t = threading.Thread(target=client.run, args=(deadline, poll_interval, mix, rng), daemon=True)
+        t.start()
+        threads.append(t)
+    for t in threads:
+        t.join()
+    return recorder.summary(time.perf_counter() - start)
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _wait_for_port(port, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as s:
+            if s.connect_ex(('127.0.0.1', port)) == 0:
+                return True
+        time.sleep(0.2)
+    return False
+
+
+def start_gunicorn(workers, port):
+    """Start gunicorn for core.wsgi on localhost with the throttle lifted."""
+    env = {**os.environ, 'ANON_THROTTLE_RATE': '1000000/minute'}
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'core.wsgi:application',
+         '--workers', str(workers), '--bind', f'127.0.0.1:{port}', '--timeout', '300'],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    if not _wait_for_port(port):
+        proc.terminate()
+        raise RuntimeError(f"gunicorn did not start: {proc.stderr.read().decode(errors='replace')[-2000:]}")
+    return proc
+
+
+def parse_mix(value):
+    """'history=8,upload=1,report=1' -> dict"""
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"Unknown action '{name}'. Expected: {', '.join(DEFAULT_MIX)}")
+        mix[name] = float(weight)
+    return mix
+
+
+def _print_summary(label, summary):
+    print(f"\n== {label} ==", file=sys.stderr)
+    print(f"{'endpoint':<10}{'reqs':>7}{'errs':>6}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}", file=sys.stderr)
+    for endpoint, s in summary.items():
+        if endpoint == '_all':
+            continue
+        print(
+            f"{endpoint:<10}{s['requests']:>7}{s['errors']:>6}{s['throughput_rps']:>9.2f}"
+            f"{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}{s['p99_ms']:>10.1f}",
+            file=sys.stderr,
+        )
+    print(f"total: {summary['_all']['requests']} requests, {summary['_all']['throughput_rps']:.2f} req/s", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', help='Target an already running server (skips --workers)')
+    parser.add_argument('--workers', type=int, nargs='+', default=[3], help='Gunicorn worker counts to sweep')
+    parser.add_argument('--clients', type=int, nargs='+', default=[10], help='Concurrent desktop clients')
+    parser.add_argument('--duration', type=float, default=60.0, help='Seconds per load phase')
+    parser.add_argument('--poll-interval', type=float, default=30.0, help='Seconds between client actions')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX, help='Action weights, e.g. history=8,upload=1,report=1')
+    parser.add_argument('--rows', type=int, default=100, help='Rows in the uploaded synthetic CSV')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--create-users', action='store_true', help='Create loadtest-<i> users through the ORM first')
+    parser.add_argument('--output', help='Write the JSON report to this path')
+    args = parser.parse_args(argv)
+
+    if args.create_users:
+        create_users(max(args.clients))
+
+    phases = []
+    if args.base_url:
+        for clients in args.clients:
+            summary = run_load(args.base_url, clients, args.duration, args.poll_interval, args.mix, args.rows, args.seed)
+            _print_summary(f"{clients} clients @ {args.base_url}", summary)
+            phases.append({'workers': None, 'clients': clients, 'endpoints': summary})
+    else:
+        for workers in args.workers:
+            port = _free_port()
+            proc = start_gunicorn(workers, port)
+            try:
+                for clients in args.clients:
+                    summary = run_load(
+                        f'http://127.0.0.1:{port}', clients, args.duration,
+                        args.poll_interval, args.mix, args.rows, args.seed,
+                    )
+                    _print_summary(f"{workers} workers / {clients} clients", summary)
+                    phases.append({'workers': workers, 'clients': clients, 'endpoints': summary})
+            finally:
+                proc.terminate()
+                proc.wait(timeout=30)
+
+    curve = [
+        {
+            'workers': p['workers'],
+            'clients': p['clients'],
+            'throughput_rps': p['endpoints']['_all']['throughput_rps'],
+            'error_rate': p['endpoints']['_all']['errors'] / max(p['endpoints']['_all']['requests'], 1),
+            'p95_ms': max((s['p95_ms'] for k, s in p['endpoints'].items() if k != '_all'), default=0.0),
+        }
+        for p in phases
+    ]
+    print("\n== saturation curve ==", file=sys.stderr)
+    for point in curve:
+        print(
+            f"workers={point['workers']} clients={point['clients']:>4}  "
+            f"{point['throughput_rps']:8.2f} req/s  worst p95 {point['p95_ms']:8.1f} ms  errors {point['error_rate']:.1%}",
+            file=sys.stderr,
+        )
+
+    report = {
+        'config': {
+            'duration': args.duration,
+            'poll_interval': args.poll_interval,
+            'mix': args.mix,
+            'rows': args.rows,
+        },
+        'phases': phases,
+        'saturation_curve': curve,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
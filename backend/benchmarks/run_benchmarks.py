@@ -0,0 +1,271 @@
+"""
+Upload pipeline benchmark suite.
+
+Runs synthetic plant data through the real upload pipeline
+(`api.views.analyze_and_store_upload`) and reports the time spent in each
+of its `span()` stages - parse, quality, validate, stats, groupby,
+correlation, outliers, health, rules, baseline, clusters, save, index
+(the time-series, rollup and baseline writes), retention and serialize -
+plus SQL time and peak memory per stage, as machine-readable JSON that
+can be compared against a stored baseline.
+
+Each size runs as a benchmark user with one alert rule, after an untimed
+warm-up upload that creates the equipment tags and seeds their baselines.
+Everything is written to a throwaway test database and media directory,
+and each timed upload is rolled back so every repeat sees the same state.
+
+Usage (from backend/):
+    python -m benchmarks.run_benchmarks --sizes 1000 10000 100000 --output bench.json
+    python -m benchmarks.run_benchmarks --baseline bench_baseline.json --tolerance 0.25
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import django
+from django.apps import apps
+
+if not apps.ready:
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+    django.setup()
+
+import numpy as np
+import pandas as pd
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test.utils import override_settings, setup_databases, teardown_databases
+
+from api.instrumentation import collect_timing, memory_profile
+from api.models import AlertRule
+from api.views import analyze_and_store_upload
+from benchmarks.synthetic import generate_equipment_csv
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+DEFAULT_CLUSTERS = 4
+BENCHMARK_USER = 'benchmark'
+BENCHMARK_RULE = "Type == 'Reactor' and Temperature > 150"
+
+
+def _upload(csv_bytes, user):
+    """Run one upload through the pipeline; raise if it was not stored."""
+    response = analyze_and_store_upload(user, SimpleUploadedFile('benchmark.csv', csv_bytes, 'text/csv'))
+    if response.status_code != 201:
+        raise RuntimeError(f"Upload failed ({response.status_code}): {response.data}")
+
+
+@contextmanager
+def benchmark_user(warm_up=None):
+    """
+    A user with one alert rule, so the rules stage runs. Created inside a
+    transaction that is rolled back on exit, with uploads saved to a
+    temporary MEDIA_ROOT. The CSV bytes `warm_up`, if given, are uploaded
+    once first, creating the tags and seeding their baselines.
+    """
+    with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+        with transaction.atomic():
+            user = User.objects.create_user(username=BENCHMARK_USER)
+            AlertRule.objects.create(user=user, name='Hot reactor', expression=BENCHMARK_RULE)
+            if warm_up is not None:
+                _upload(warm_up, user)
+            yield user
+            transaction.set_rollback(True)
+
+
+def _timed_upload(csv_bytes, user):
+    """One rolled-back upload; returns (wall seconds, RequestTiming)."""
+    with transaction.atomic(), collect_timing() as timing:
+        with connection.execute_wrapper(timing.query_wrapper):
+            _upload(csv_bytes, user)
+        transaction.set_rollback(True)
+    return timing.elapsed(), timing
+
+
+def run_pipeline(csv_bytes, user, repeat=3, measure_memory=True):
+    """
+    Benchmark one input as `user`. Stage timings are the best of `repeat`
+    uploads without tracemalloc; peak memory per stage comes from one
+    extra traced upload so tracing overhead does not distort the timings.
+    """
+    totals, stages, db = [], {}, []
+    for _ in range(repeat):
+        elapsed, timing = _timed_upload(csv_bytes, user)
+        totals.append(elapsed)
+        for name, seconds in timing.spans.items():
+            stages.setdefault(name, []).append(seconds)
+        db.append((timing.db_seconds, timing.db_queries))
+
+    results = {
+        name: {'seconds': min(samples), 'mean_seconds': float(np.mean(samples))}
+        for name, samples in stages.items()
+    }
+    results['db'] = {'seconds': min(s for s, _ in db), 'queries': max(q for _, q in db)}
+
+    if measure_memory:
+        with memory_profile(top=0) as profile:
+            _timed_upload(csv_bytes, user)
+        for name, stage in profile.stages.items():
+            results.setdefault(name, {})['peak_memory_bytes'] = stage['peak_bytes']
+        results['peak_memory_bytes'] = profile.peak_bytes
+
+    results['total'] = {'seconds': min(totals), 'mean_seconds': float(np.mean(totals))}
+    return results
+
+
+def run_suite(sizes, type_cardinality=6, outlier_rate=0.02, seed=42, repeat=3, measure_memory=True,
+              clusters=DEFAULT_CLUSTERS, log=None):
+    """Run every size and return the JSON-serializable report."""
+    report = {
+        'generated_at': datetime.now(timezone.utc).isoformat(),
+        'environment': {
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+        },
+        'config': {
+            'type_cardinality': type_cardinality,
+            'outlier_rate': outlier_rate,
+            'seed': seed,
+            'repeat': repeat,
+            'clusters': clusters,
+        },
+        'results': {},
+    }
+    # Score against the warm-up upload's baselines instead of waiting for BASELINE_MIN_UPDATES uploads
+    with override_settings(CLUSTER_COUNT=clusters, BASELINE_MIN_UPDATES=1):
+        for rows in sizes:
+            csv_bytes = generate_equipment_csv(rows, type_cardinality=type_cardinality, outlier_rate=outlier_rate, seed=seed)
+            with benchmark_user(warm_up=csv_bytes) as user:
+                result = run_pipeline(csv_bytes, user, repeat=repeat, measure_memory=measure_memory)
+            result['input_bytes'] = len(csv_bytes)
+            report['results'][str(rows)] = result
+            if log:
+                log(f"{rows:>10} rows  total {result['total']['seconds']:.3f}s  " + "  ".join(
+                    f"{name} {values['seconds']:.3f}s" for name, values in result.items()
+                    if isinstance(values, dict) and name != 'total'
+                ))
+    return report
+
+
+def compare_to_baseline(report, baseline, tolerance=0.25, min_seconds=0.005):
+    """
+    List stages that got slower than baseline by more than `tolerance`
+    (fractional). Stages faster than `min_seconds` in the baseline are
+    ignored as timer noise.
+    """
+    regressions = []
+    for size, stages in report['results'].items():
+        base_stages = baseline.get('results', {}).get(size)
+        if not base_stages:
+            continue
+        for stage, values in stages.items():
+            if not isinstance(values, dict) or stage not in base_stages:
+                continue
+            before = base_stages[stage]['seconds']
+            after = values['seconds']
+            if before >= min_seconds and after > before * (1 + tolerance):
+                regressions.append({
+                    'rows': int(size),
+                    'stage': stage,
+                    'baseline_seconds': before,
+                    'seconds': after,
+                    'ratio': after / before,
+                })
+    return regressions
+
+
+def scaling_violations(report, max_ratio=2.0, min_seconds=0.05):
+    """
+    List stages whose cost per row at the largest size is more than
+    `max_ratio` times their cost per row at the smallest, i.e. stages that
+    grow clearly faster than linearly. Stages under `min_seconds` at the
+    largest size are ignored as noise.
+    """
+    sizes = sorted(int(size) for size in report['results'])
+    if len(sizes) < 2:
+        return []
+    small, large = report['results'][str(sizes[0])], report['results'][str(sizes[-1])]
+    violations = []
+    for stage, values in large.items():
+        if not isinstance(values, dict) or 'seconds' not in values or stage not in small or stage == 'total':
+            continue
+        if values['seconds'] < min_seconds or not small[stage]['seconds']:
+            continue
+        ratio = (values['seconds'] / sizes[-1]) / (small[stage]['seconds'] / sizes[0])
+        if ratio > max_ratio:
+            violations.append({'stage': stage, 'rows': [sizes[0], sizes[-1]], 'per_row_ratio': ratio})
+    return violations
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='Row counts to benchmark')
+    parser.add_argument('--types', type=int, default=6, help='Equipment type cardinality')
+    parser.add_argument('--outlier-rate', type=float, default=0.02, help='Fraction of injected outlier rows')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=3, help='Timing runs per size (best is reported)')
+    parser.add_argument('--no-memory', action='store_true', help='Skip the tracemalloc peak-memory pass')
+    parser.add_argument('--clusters', type=int, default=DEFAULT_CLUSTERS, help='CLUSTER_COUNT for the run (0 skips clustering)')
+    parser.add_argument('--output', help='Write the JSON report to this path (default: stdout)')
+    parser.add_argument('--baseline', help='Compare against a previous JSON report')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed slowdown vs baseline (0.25 = 25%%)')
+    parser.add_argument(
+        '--max-scaling', type=float, default=2.0,
+        help='Allowed growth of any stage\'s per-row cost from the smallest to the largest size',
+    )
+    args = parser.parse_args(argv)
+
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        report = run_suite(
+            args.sizes,
+            type_cardinality=args.types,
+            outlier_rate=args.outlier_rate,
+            seed=args.seed,
+            repeat=args.repeat,
+            measure_memory=not args.no_memory,
+            clusters=args.clusters,
+            log=lambda line: print(line, file=sys.stderr),
+        )
+    finally:
+        teardown_databases(old_config, verbosity=0)
+
+    violations = scaling_violations(report, args.max_scaling)
+    report['scaling_violations'] = violations
+    for v in violations:
+        print(
+            f"SUPERLINEAR {v['stage']}: per-row cost x{v['per_row_ratio']:.2f} from {v['rows'][0]} to {v['rows'][1]} rows",
+            file=sys.stderr,
+        )
+    exit_code = 1 if violations else 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(report, baseline, args.tolerance)
+        report['regressions'] = regressions
+        for r in regressions:
+            print(
+                f"REGRESSION {r['rows']} rows / {r['stage']}: "
+                f"{r['baseline_seconds']:.4f}s -> {r['seconds']:.4f}s ({r['ratio']:.2f}x)",
+                file=sys.stderr,
+            )
+        exit_code = 1 if regressions or violations else 0
+
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(payload)
+    else:
+        print(payload)
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""
+Seeded synthetic plant-data generator.
+
+Produces DataFrames with the same schema as the files in `sample_csv/`
+(Equipment Name, Type, Flowrate, Pressure, Temperature) and similar
+per-type distributions, at any row count. Extra types beyond the six
+standard ones are named `Type-<n>` so cardinality can be pushed up.
+"""
+import numpy as np
+import pandas as pd
+
+BASE_TYPES = ['Pump', 'Compressor', 'Valve', 'HeatExchanger', 'Reactor', 'Condenser']
+
+# Fleet-wide (mean, std) per parameter, taken from sample_csv/extended_equipment_list.csv
+PARAMETER_PROFILES = {
+    'Flowrate': (125.0, 40.0),
+    'Pressure': (5.8, 2.5),
+    'Temperature': (116.0, 20.0),
+}
+
+# Decimal places used by the sample exports
+PARAMETER_DECIMALS = {'Flowrate': 2, 'Pressure': 1, 'Temperature': 1}
+
+
+def type_names(cardinality):
+    """The first `cardinality` type labels: the standard six, then Type-7, Type-8, ..."""
+    names = BASE_TYPES[:cardinality]
+    names += [f'Type-{i}' for i in range(len(BASE_TYPES) + 1, cardinality + 1)]
+    return names
+
+
+def generate_equipment_frame(rows, type_cardinality=6, outlier_rate=0.02, seed=42):
+    """
+    Build a synthetic equipment export.
+
+    :param rows: number of rows (one per equipment unit)
+    :param type_cardinality: number of distinct equipment types
+    :param outlier_rate: fraction of rows with one parameter pushed 3-6 std devs out
+    :param seed: RNG seed; the same arguments always give the same frame
+    """
+    rng = np.random.default_rng(seed)
+    types = np.array(type_names(type_cardinality))
+    type_idx = rng.integers(0, len(types), size=rows)
+    row_types = types[type_idx]
+
+    frame = {
+        'Equipment Name': pd.Series(row_types).str.cat(np.arange(1, rows + 1).astype(str), sep='-'),
+        'Type': row_types,
+    }
+
+    for param, (mean, std) in PARAMETER_PROFILES.items():
+        # Each type runs at its own operating point around the fleet profile
+        type_means = rng.normal(mean, std * 0.15, size=len(types))
+        values = rng.normal(type_means[type_idx], std * 0.85)
+        frame[param] = np.clip(values, mean * 0.05, None)
+
+    df = pd.DataFrame(frame)
+
+    n_outliers = int(round(rows * outlier_rate))
+    if n_outliers:
+        positions = rng.choice(rows, size=n_outliers, replace=False)
+        params = list(PARAMETER_PROFILES)
+        chosen = rng.integers(0, len(params), size=n_outliers)
+        signs = rng.choice([-1.0, 1.0], size=n_outliers, p=[0.2, 0.8])
+        magnitudes = rng.uniform(3.0, 6.0, size=n_outliers)
+        for p_idx, param in enumerate(params):
+            hit = chosen == p_idx
+            std = PARAMETER_PROFILES[param][1]
+            col = df.columns.get_loc(param)
+            shifted = df.iloc[positions[hit], col] + signs[hit] * magnitudes[hit] * std
+            df.iloc[positions[hit], col] = np.clip(shifted, 0.0, None)
+
+    for param, decimals in PARAMETER_DECIMALS.items():
+        df[param] = df[param].round(decimals)
+    return df
+
+
+def generate_equipment_csv(rows, **kwargs):
+    """Same as generate_equipment_frame, serialized to CSV bytes."""
+    return generate_equipment_frame(rows, **kwargs).to_csv(index=False).encode()
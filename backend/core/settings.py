@@ -10,7 +10,9 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import json
 import os
+import sys
 from dotenv import load_dotenv
 from pathlib import Path
 
@@ -57,6 +59,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    'api.metrics.MetricsMiddleware',
+    'api.instrumentation.ServerTimingMiddleware',
+    'api.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -127,6 +132,9 @@ USE_I18N = True
 
 USE_TZ = True
 
+# Matches the primary keys in the existing migrations (Django 6 default).
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/6.0/howto/static-files/
@@ -161,7 +169,8 @@ REST_FRAMEWORK = {
         'rest_framework.throttling.AnonRateThrottle',
     ],
     'DEFAULT_THROTTLE_RATES': {
-        'anon': '20/minute',  # Slightly higher than 10 to allow generic usage
+        # Slightly higher than 10 to allow generic usage; load tests raise it via env
+        'anon': os.getenv('ANON_THROTTLE_RATE', '20/minute'),
     }
 }
 
@@ -172,6 +181,86 @@ REST_FRAMEWORK = {
 DATA_UPLOAD_MAX_MEMORY_SIZE = 5242880  
 FILE_UPLOAD_MAX_MEMORY_SIZE = 5242880
 
+# Compressed uploads (.csv.gz, .csv.zst, Content-Encoding: gzip) may not
+# expand beyond this many bytes.
+UPLOAD_MAX_DECOMPRESSED_SIZE = int(os.getenv('UPLOAD_MAX_DECOMPRESSED_SIZE', str(500 * 1024 * 1024)))
+
+# Resumable chunked uploads (/api/uploads/chunked/): larger files arrive as
+# checksummed chunks, each well under DATA_UPLOAD_MAX_MEMORY_SIZE.
+CHUNKED_UPLOAD_DIR = os.getenv('CHUNKED_UPLOAD_DIR', str(BASE_DIR / 'chunked_uploads'))
+CHUNKED_UPLOAD_CHUNK_SIZE = int(os.getenv('CHUNKED_UPLOAD_CHUNK_SIZE', str(1024 * 1024)))
+CHUNKED_UPLOAD_MAX_SIZE = int(os.getenv('CHUNKED_UPLOAD_MAX_SIZE', str(200 * 1024 * 1024)))
+CHUNKED_UPLOAD_EXPIRY_HOURS = int(os.getenv('CHUNKED_UPLOAD_EXPIRY_HOURS', '24'))
+
+# Time-series mode (CSV with a Timestamp column): each equipment is judged on
+# its readings within TIMESERIES_WINDOW of its latest one (a pandas offset,
+# e.g. 15min, 1h, 1D); fleet-wide means are resampled into at most
+# TIMESERIES_MAX_POINTS buckets. TIMESERIES_COLUMN names the timestamp column
+# explicitly; when empty, a Timestamp/DateTime/Time/Date/Recorded_At column is
+# used if at least TIMESERIES_MIN_PARSED of its values parse as dates.
+TIMESERIES_WINDOW = os.getenv('TIMESERIES_WINDOW', '1h')
+TIMESERIES_MAX_POINTS = int(os.getenv('TIMESERIES_MAX_POINTS', '500'))
+TIMESERIES_COLUMN = os.getenv('TIMESERIES_COLUMN', '')
+TIMESERIES_MIN_PARSED = float(os.getenv('TIMESERIES_MIN_PARSED', '0.9'))
+
+# Numeric parameters analysed per upload (see api/parameters.py): a JSON list
+# of {"name", "unit", "required", "warning_percentile", "outlier_iqr_multiplier",
+# "physical_min", "physical_max"} objects. Unset = Flowrate, Pressure and
+# Temperature, all required.
+PARAMETER_SCHEMA = json.loads(os.environ['PARAMETER_SCHEMA']) if os.getenv('PARAMETER_SCHEMA') else None
+
+# Per-equipment baselines (see api/baselines.py): each upload moves a tag's
+# EWMA mean / variance by BASELINE_ALPHA, and rows are scored against it once
+# the tag has BASELINE_MIN_UPDATES uploads behind it.
+BASELINE_ALPHA = float(os.getenv('BASELINE_ALPHA', '0.2'))
+BASELINE_MIN_UPDATES = int(os.getenv('BASELINE_MIN_UPDATES', '3'))
+
+# Operating-point clustering: group each upload's rows into CLUSTER_COUNT
+# regimes with mini-batch k-means on the standardized parameters (0 = off).
+CLUSTER_COUNT = int(os.getenv('CLUSTER_COUNT', '0'))
+
+# --------------------------
+# Request Instrumentation
+# --------------------------
+# Structured timing logs + Server-Timing header (see api/instrumentation.py).
+# The header shows stage and SQL timings, so by default only staff (or DEBUG) get it.
+SERVER_TIMING_ENABLED = os.getenv('SERVER_TIMING_ENABLED', 'True') == 'True'
+SERVER_TIMING_SAMPLE_RATE = float(os.getenv('SERVER_TIMING_SAMPLE_RATE', '0.05'))
+SERVER_TIMING_LOG_MS = float(os.getenv('SERVER_TIMING_LOG_MS', '500'))
+SERVER_TIMING_HEADER = os.getenv('SERVER_TIMING_HEADER', 'staff')
+
+# Prometheus metrics at /api/metrics (see api/metrics.py): staff users, or
+# unauthenticated scrapes from these client addresses. Behind nginx the
+# client address is taken from X-Real-IP (set by proxy_params), but only on
+# connections from METRICS_TRUSTED_PROXIES or a unix socket.
+METRICS_ALLOWED_IPS = [ip.strip() for ip in os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',') if ip.strip()]
+METRICS_TRUSTED_PROXIES = [ip.strip() for ip in os.getenv('METRICS_TRUSTED_PROXIES', '127.0.0.1,::1').split(',') if ip.strip()]
+
+# Peak-memory budget enforced by `manage.py memory_profile` (bytes per CSV row, unset = report only)
+MEMORY_BUDGET_BYTES_PER_ROW = float(os.environ['MEMORY_BUDGET_BYTES_PER_ROW']) if os.getenv('MEMORY_BUDGET_BYTES_PER_ROW') else None
+
+# Sampled cProfile capture (see api/profiling.py); inspect with `manage.py profiles`
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'False') == 'True'
+PROFILING_VIEWS = [v.strip() for v in os.getenv('PROFILING_VIEWS', 'PDFReportView,FileUploadView').split(',') if v.strip()]
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', '0.0'))
+PROFILING_SLOW_MS = float(os.getenv('PROFILING_SLOW_MS', '5000'))
+PROFILING_DIR = os.getenv('PROFILING_DIR', str(BASE_DIR / 'profiles'))
+PROFILING_MAX_FILES = int(os.getenv('PROFILING_MAX_FILES', '50'))
+
+TESTING = sys.argv[1:2] == ['test']
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        # Quiet under `manage.py test` (assertLogs still captures it)
+        'api.timing': {'handlers': [] if TESTING else ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
 # Simple JWT Settings
 from datetime import timedelta
 SIMPLE_JWT = {
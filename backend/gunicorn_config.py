@@ -1,4 +1,25 @@
+import os
+import shutil
+
 command = '/home/ubuntu/chemical_app/backend/venv/bin/gunicorn'
 pythonpath = '/home/ubuntu/chemical_app/backend'
 bind = '127.0.0.1:8000'
 workers = 3
+
+# Prometheus multiprocess mode: workers write their metrics to this shared
+# directory and /api/metrics aggregates them (see api/metrics.py).
+# Set before the workers fork so they all inherit it.
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/chemical_app_metrics')
+
+
+def on_starting(server):
+    # Stale files from a previous run would be summed into the new totals
+    metrics_dir = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    # Drop the dead worker's live gauges (in-flight requests)
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -2,12 +2,23 @@
 API Client for the Desktop App.
 Handles all HTTP requests to the Django backend.
 """
+import gzip
+import hashlib
+import os
+import shutil
+import tempfile
+import time
 import requests
-from typing import Optional, Tuple, Dict, Any
+from typing import Optional, Tuple, Dict, Any, Callable
 
 # Default API URL (local development)
 DEFAULT_API_URL = "http://127.0.0.1:8000/api/"
 
+# Files above this go through the resumable chunked upload API
+CHUNKED_UPLOAD_THRESHOLD = 4 * 1024 * 1024
+CHUNK_SIZE = 1024 * 1024
+CHUNK_RETRIES = 5
+
 
 class ApiClient:
     """
@@ -91,16 +102,43 @@ class ApiClient:
 
     # --- Data Endpoints ---
 
-    def upload_file(self, file_path: str) -> Tuple[bool, Dict[str, Any]]:
+    def upload_file(self, file_path: str, progress: Optional[Callable[[int, int], None]] = None,
+                    compress: bool = True) -> Tuple[bool, Dict[str, Any]]:
         """
         Upload a CSV file to the backend.
+        The file is gzipped first (the server accepts .csv.gz; plant CSVs
+        shrink 5-10x). If it is still large it goes through the resumable
+        chunked API; `progress(sent_bytes, total_bytes)` is called after each chunk.
         Returns (success, response_data).
         """
+        upload_path = file_path
+        if compress and file_path.lower().endswith('.csv'):
+            try:
+                upload_path = self._gzip_copy(file_path)
+            except OSError as e:
+                return False, {'error': f'Could not compress file: {e}'}
+        try:
+            return self._send_file(upload_path, progress)
+        finally:
+            if upload_path != file_path:
+                shutil.rmtree(os.path.dirname(upload_path), ignore_errors=True)
+
+    def _gzip_copy(self, file_path: str) -> str:
+        """Gzip `file_path` into a temp `<name>.csv.gz` and return its path."""
+        tmp_dir = tempfile.mkdtemp()
+        gz_path = os.path.join(tmp_dir, os.path.basename(file_path) + '.gz')
+        with open(file_path, 'rb') as src, gzip.open(gz_path, 'wb', compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        return gz_path
+
+    def _send_file(self, file_path: str, progress: Optional[Callable[[int, int], None]]) -> Tuple[bool, Dict[str, Any]]:
+        if os.path.getsize(file_path) > CHUNKED_UPLOAD_THRESHOLD:
+            return self.upload_file_chunked(file_path, progress=progress)
         try:
             with open(file_path, 'rb') as f:
                 res = requests.post(
                     f"{self.base_url}upload/",
-                    files={'file': f},
+                    files={'file': (os.path.basename(file_path), f)},
                     headers=self._get_headers()
                 )
             if res.status_code == 201:
@@ -111,6 +149,82 @@ class ApiClient:
         except Exception as e:
             return False, {'error': str(e)}
 
+    def upload_file_chunked(self, file_path: str, progress: Optional[Callable[[int, int], None]] = None,
+                            chunk_size: int = CHUNK_SIZE) -> Tuple[bool, Dict[str, Any]]:
+        """
+        Upload a CSV (or .csv.gz) in checksummed chunks. A dropped connection is retried
+        with backoff; after reconnecting, only the chunks the server reports
+        as missing are sent again. Finalize runs the normal analysis.
+        Returns (success, response_data) like upload_file.
+        """
+        total_size = os.path.getsize(file_path)
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(chunk_size), b''):
+                digest.update(block)
+
+        try:
+            res = requests.post(
+                f"{self.base_url}uploads/chunked/",
+                json={
+                    'file_name': os.path.basename(file_path),
+                    'total_size': total_size,
+                    'chunk_size': chunk_size,
+                    'sha256': digest.hexdigest(),
+                },
+                headers=self._get_headers()
+            )
+            if res.status_code != 201:
+                return False, self._parse_json(res)
+            session = self._parse_json(res)
+            session_url = f"{self.base_url}uploads/chunked/{session['upload_id']}/"
+            pending = list(range(session['total_chunks']))
+
+            attempt = 0
+            with open(file_path, 'rb') as f:
+                while pending:
+                    try:
+                        for number in list(pending):
+                            f.seek(number * chunk_size)
+                            data = f.read(chunk_size)
+                            res = requests.put(
+                                f"{session_url}chunks/{number}/",
+                                data=data,
+                                headers={
+                                    **self._get_headers(),
+                                    'Content-Type': 'application/octet-stream',
+                                    'X-Chunk-SHA256': hashlib.sha256(data).hexdigest(),
+                                },
+                                timeout=60
+                            )
+                            if res.status_code == 400 and 'Checksum mismatch' in res.text:
+                                # Corrupted in transit: retry like a dropped connection
+                                raise requests.exceptions.ConnectionError(self._parse_json(res).get('error'))
+                            if res.status_code != 200:
+                                return False, self._parse_json(res)
+                            pending.remove(number)
+                            attempt = 0
+                            if progress:
+                                progress(min((session['total_chunks'] - len(pending)) * chunk_size, total_size), total_size)
+                    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                        attempt += 1
+                        if attempt > CHUNK_RETRIES:
+                            raise
+                        time.sleep(min(2 ** attempt, 30))
+                        # Resume from what the server actually has
+                        status_res = requests.get(session_url, headers=self._get_headers(), timeout=30)
+                        if status_res.status_code == 200:
+                            pending = self._parse_json(status_res).get('missing_chunks', pending)
+
+            res = requests.post(f"{session_url}finalize/", headers=self._get_headers())
+            if res.status_code == 201:
+                return True, self._parse_json(res)
+            return False, self._parse_json(res)
+        except requests.exceptions.ConnectionError as e:
+            return False, {'error': f'Connection failed: {e}'}
+        except Exception as e:
+            return False, {'error': str(e)}
+
     def get_history(self) -> Tuple[bool, Any]:
         """
         Fetch the last 5 uploads for the current user.
@@ -124,6 +238,42 @@ class ApiClient:
         except Exception as e:
             return False, {'error': str(e)}
 
+    def get_rows(self, upload_id: int, **params: Any) -> Tuple[bool, Dict[str, Any]]:
+        """
+        Fetch one page of an upload's rows, filtered and sorted server-side.
+        Accepts the endpoint's query params, e.g. health_status='critical',
+        ordering='-pressure', pressure__gt=30, page_size=100, offset=200
+        Returns (success, {'count', 'next', 'previous', 'results'}).
+        """
+        try:
+            res = requests.get(
+                f"{self.base_url}upload/{upload_id}/rows/",
+                params=params,
+                headers=self._get_headers()
+            )
+            if res.status_code == 200:
+                return True, self._parse_json(res)
+            return False, self._parse_json(res)
+        except Exception as e:
+            return False, {'error': str(e)}
+
+    def search_equipment(self, query: str, limit: int = 20) -> Tuple[bool, Dict[str, Any]]:
+        """
+        Search equipment names/types across all uploads.
+        Returns (success, {'query', 'count', 'results': [{equipment, type, health_status, latest, ...}]}).
+        """
+        try:
+            res = requests.get(
+                f"{self.base_url}search/",
+                params={'q': query, 'limit': limit},
+                headers=self._get_headers()
+            )
+            if res.status_code == 200:
+                return True, self._parse_json(res)
+            return False, self._parse_json(res)
+        except Exception as e:
+            return False, {'error': str(e)}
+
     # --- Threshold Endpoints ---
 
     def get_thresholds(self) -> Tuple[bool, Dict[str, Any]]:
@@ -136,12 +286,38 @@ class ApiClient:
         except Exception as e:
             return False, {'error': str(e)}
 
-    def save_thresholds(self, warning_percentile: float, iqr_multiplier: float) -> Tuple[bool, Dict[str, Any]]:
-        """Save custom threshold settings."""
+    def save_thresholds(self, warning_percentile: float, iqr_multiplier: float,
+                        detection_mode: Optional[str] = None,
+                        per_type_bounds: Optional[bool] = None) -> Tuple[bool, Dict[str, Any]]:
+        """Save custom threshold settings (detection_mode: 'iqr', 'robust_z' or 'mahalanobis')."""
+        payload = {'warning_percentile': warning_percentile, 'outlier_iqr_multiplier': iqr_multiplier}
+        if detection_mode:
+            payload['detection_mode'] = detection_mode
+        if per_type_bounds is not None:
+            payload['per_type_bounds'] = per_type_bounds
         try:
             res = requests.put(
                 f"{self.base_url}thresholds/",
-                json={'warning_percentile': warning_percentile, 'outlier_iqr_multiplier': iqr_multiplier},
+                json=payload,
+                headers={**self._get_headers(), 'Content-Type': 'application/json'}
+            )
+            if res.status_code == 200:
+                return True, self._parse_json(res)
+            return False, self._parse_json(res)
+        except Exception as e:
+            return False, {'error': str(e)}
+
+    def threshold_sweep(self, upload_id: int, warning_percentiles: list, iqr_multipliers: list,
+                        changed_limit: int = 20) -> Tuple[bool, Dict[str, Any]]:
+        """Preview health counts for a grid of threshold pairs on one upload (nothing is saved)."""
+        try:
+            res = requests.post(
+                f"{self.base_url}upload/{upload_id}/threshold-sweep/",
+                json={
+                    'warning_percentiles': warning_percentiles,
+                    'outlier_iqr_multipliers': iqr_multipliers,
+                    'changed_limit': changed_limit,
+                },
                 headers={**self._get_headers(), 'Content-Type': 'application/json'}
             )
             if res.status_code == 200:
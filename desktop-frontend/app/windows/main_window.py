@@ -39,6 +39,25 @@ class MainWindow(QMainWindow):
         'border': '#1f2833'
     }
 
+    # Bar colours cycled over the analysed parameters
+    PARAMETER_COLORS = ['accent_blue', 'accent_purple', 'accent_red', 'accent_teal']
+
+    # Parameters with a stat card (the rest are listed in the statistical summary)
+    STAT_CARD_PARAMETERS = 3
+
+    # Rows drawn in the operating-regime scatter
+    MAX_CLUSTER_POINTS = 5000
+
+    # Max rows requested from the server when the status filter is applied
+    TABLE_PAGE_SIZE = 500
+
+    # Outlier detection modes offered in the threshold panel (value, label)
+    DETECTION_MODES = [
+        ('iqr', 'IQR (per parameter)'),
+        ('robust_z', 'Robust z-score (per parameter)'),
+        ('mahalanobis', 'Mahalanobis (multivariate)'),
+    ]
+
     def __init__(self, api_client: ApiClient, username: str = "", logout_callback=None):
         super().__init__()
         self.api_client = api_client
@@ -261,12 +280,9 @@ class MainWindow(QMainWindow):
 
         # Stats cards
         stats_layout = QHBoxLayout()
-        self.stat_labels = {
-            "total": QLabel("Total\n-"),
-            "flow": QLabel("Avg Flowrate\n-\n(Min: - | Max: -)"),
-            "pressure": QLabel("Avg Pressure\n-\n(Min: - | Max: -)"),
-            "temp": QLabel("Avg Temp\n-\n(Min: - | Max: -)")
-        }
+        self.stat_labels = {"total": QLabel("Total\n-")}
+        for i, name in enumerate(['Flowrate', 'Pressure', 'Temp'][:self.STAT_CARD_PARAMETERS]):
+            self.stat_labels[i] = QLabel(f"Avg {name}\n-\n(Min: - | Max: -)")
         for lbl in self.stat_labels.values():
             lbl.setAlignment(Qt.AlignCenter)
             lbl.setStyleSheet(styles.STAT_CARD_STYLE)
@@ -407,6 +423,26 @@ class MainWindow(QMainWindow):
         iqr_desc.setStyleSheet("margin-left: 130px; font-size: 10px;")
         content_layout.addWidget(iqr_desc)
 
+        # Detection mode
+        mode_layout = QHBoxLayout()
+        mode_label = QLabel("<b style='color: #66fcf1;'>Detection Mode:</b>")
+        mode_label.setStyleSheet("color: #66fcf1; min-width: 120px;")
+        self.detection_mode_combo = QComboBox()
+        self.detection_mode_combo.setStyleSheet("background: #0d1117; color: white; border: 1px solid #444c56; padding: 4px; border-radius: 4px;")
+        for mode, text in self.DETECTION_MODES:
+            self.detection_mode_combo.addItem(text, mode)
+        mode_layout.addWidget(mode_label)
+        mode_layout.addWidget(self.detection_mode_combo)
+        content_layout.addLayout(mode_layout)
+
+        mode_desc = QLabel("<span style='color: #8b949e;'>Mahalanobis checks all parameters together → unusual combinations</span>")
+        mode_desc.setStyleSheet("margin-left: 130px; font-size: 10px;")
+        content_layout.addWidget(mode_desc)
+
+        self.per_type_check = QCheckBox("Bounds per equipment type")
+        self.per_type_check.setStyleSheet("color: #c5c6c7; margin-left: 130px;")
+        content_layout.addWidget(self.per_type_check)
+
         # Buttons
         btn_layout = QHBoxLayout()
         self.save_threshold_btn = QPushButton("💾 Save Settings")
@@ -567,9 +603,32 @@ class MainWindow(QMainWindow):
                      self.status_filter.setCurrentText(term.capitalize())
                      self.tabs.setCurrentWidget(self.data_tab) # Switch to data tab
                      QMessageBox.information(dlg, "AI Action", f"Filtered table for '{term}' status.")
+                else:
+                     self._show_equipment_search(dlg, term)
             
             dlg.exec_()
 
+    def _show_equipment_search(self, parent, term: str) -> None:
+        """Look up an equipment tag across all uploads and show its latest readings."""
+        success, data = self.api_client.search_equipment(term, limit=10)
+        if not success:
+            QMessageBox.warning(parent, "Search Failed", data.get('error', 'Unknown error'))
+            return
+
+        results = data.get('results', [])
+        if not results:
+            QMessageBox.information(parent, "AI Action", f"No equipment matching '{term}'.")
+            return
+
+        lines = []
+        for r in results:
+            latest = r.get('latest', {})
+            readings = ", ".join(
+                f"{k.capitalize()}: {v:.1f}" for k, v in latest.items() if v is not None
+            )
+            lines.append(f"<b>{r['equipment']}</b> ({r['type']}) - {(r.get('health_status') or 'unknown').upper()}<br>{readings}")
+        QMessageBox.information(parent, "AI Action", f"Equipment matching '{term}':<br><br>" + "<br><br>".join(lines))
+
     # --- Prediction Tab ---
 
     def _setup_prediction_tab(self) -> None:
@@ -799,6 +858,10 @@ class MainWindow(QMainWindow):
         self.iqr_slider.blockSignals(False)
         self.iqr_value_label.setText(f"{iqr:.1f}× IQR")
 
+        mode_index = self.detection_mode_combo.findData(self.threshold_settings.get('detection_mode', 'iqr'))
+        self.detection_mode_combo.setCurrentIndex(max(mode_index, 0))
+        self.per_type_check.setChecked(bool(self.threshold_settings.get('per_type_bounds', False)))
+
         # Update status
         if is_custom:
             self.threshold_status_label.setText("<b style='color: #66fcf1;'>[CUSTOM SETTINGS ACTIVE]</b>")
@@ -811,12 +874,14 @@ class MainWindow(QMainWindow):
         """Save custom threshold settings to backend."""
         warning = self.warning_slider.value() / 100.0
         iqr = self.iqr_slider.value() / 10.0
+        detection_mode = self.detection_mode_combo.currentData()
+        per_type = self.per_type_check.isChecked()
 
         self.save_threshold_btn.setEnabled(False)
         self.threshold_msg_label.setText("<span style='color: #8b949e;'>Saving...</span>")
         QApplication.processEvents()
 
-        success, data = self.api_client.save_thresholds(warning, iqr)
+        success, data = self.api_client.save_thresholds(warning, iqr, detection_mode, per_type)
         if success:
             self.threshold_settings = data
             self._update_threshold_display()
@@ -848,7 +913,9 @@ class MainWindow(QMainWindow):
 
     def _upload_file(self) -> None:
         """Handle CSV file upload."""
-        MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
+        # Files are gzipped before sending; anything still over 4 MB goes through the
+        # resumable chunked upload (see ApiClient.upload_file)
+        MAX_FILE_SIZE = 500 * 1024 * 1024  # 500MB, the server's UPLOAD_MAX_DECOMPRESSED_SIZE default
 
         fname, _ = QFileDialog.getOpenFileName(
             self, 'Open CSV', os.getenv('HOME'), "CSV Files (*.csv)"
@@ -861,7 +928,7 @@ class MainWindow(QMainWindow):
             size_mb = file_size / (1024 * 1024)
             QMessageBox.warning(
                 self, "File Too Large",
-                f"Selected file is {size_mb:.2f} MB.\nMaximum allowed size is 5 MB."
+                f"Selected file is {size_mb:.2f} MB.\nMaximum allowed size is 500 MB."
             )
             return
 
@@ -869,7 +936,11 @@ class MainWindow(QMainWindow):
         self.upload_btn.setEnabled(False)
         QApplication.processEvents()
 
-        success, data = self.api_client.upload_file(fname)
+        def on_progress(sent: int, total: int) -> None:
+            self.status_label.setText(f"Uploading... {sent * 100 // total}% of {total / (1024 * 1024):.1f} MB")
+            QApplication.processEvents()
+
+        success, data = self.api_client.upload_file(fname, progress=on_progress)
         if success:
             self._update_ui(data)
             self.status_label.setText("✓ Upload Successful")
@@ -979,6 +1050,31 @@ class MainWindow(QMainWindow):
 
     # --- UI Updates ---
 
+    @staticmethod
+    def _parameters(summary: dict) -> list:
+        """Analysed parameters from the summary (the core three for older servers)."""
+        if summary.get('parameters'):
+            return summary['parameters']
+        return [
+            {
+                'name': name, 'unit': '',
+                'mean': summary.get(f'avg_{name.lower()}'), 'min': summary.get(f'min_{name.lower()}'),
+                'max': summary.get(f'max_{name.lower()}'), 'std': summary.get(f'std_{name.lower()}'),
+            }
+            for name in ['Flowrate', 'Pressure', 'Temperature']
+        ]
+
+    @staticmethod
+    def _parameter_label(parameter: dict) -> str:
+        return f"{parameter['name']} ({parameter['unit']})" if parameter.get('unit') else parameter['name']
+
+    @staticmethod
+    def _fmt(value) -> str:
+        return '-' if value is None else f"{value:.1f}"
+
+    def _parameter_colors(self, count: int) -> list:
+        return [self.CHART_COLORS[self.PARAMETER_COLORS[i % len(self.PARAMETER_COLORS)]] for i in range(count)]
+
     def _update_ui(self, data: dict) -> None:
         """Update dashboard and table with new data."""
         self.current_data = data
@@ -987,18 +1083,16 @@ class MainWindow(QMainWindow):
 
         # Update stats cards
         self.stat_labels['total'].setText(f"Total\n{summary['total_count']}")
-        self.stat_labels['flow'].setText(
-            f"Avg Flowrate\n{summary['avg_flowrate']:.1f}\n"
-            f"(Min: {summary.get('min_flowrate', 0):.1f} | Max: {summary.get('max_flowrate', 0):.1f})"
-        )
-        self.stat_labels['pressure'].setText(
-            f"Avg Pressure\n{summary['avg_pressure']:.1f}\n"
-            f"(Min: {summary.get('min_pressure', 0):.1f} | Max: {summary.get('max_pressure', 0):.1f})"
-        )
-        self.stat_labels['temp'].setText(
-            f"Avg Temp\n{summary['avg_temperature']:.1f}\n"
-            f"(Min: {summary.get('min_temperature', 0):.1f} | Max: {summary.get('max_temperature', 0):.1f})"
-        )
+        parameters = self._parameters(summary)
+        for i in range(self.STAT_CARD_PARAMETERS):
+            label = self.stat_labels[i]
+            label.setVisible(i < len(parameters))
+            if i < len(parameters):
+                p = parameters[i]
+                label.setText(
+                    f"Avg {self._parameter_label(p)}\n{self._fmt(p.get('mean'))}\n"
+                    f"(Min: {self._fmt(p.get('min'))} | Max: {self._fmt(p.get('max'))})"
+                )
 
         # Update outlier alert
         outliers = summary.get('outliers', [])
@@ -1032,10 +1126,19 @@ class MainWindow(QMainWindow):
         if not processed:
             return
             
-        # Apply Filter
+        # Apply Filter (server-side when the upload is stored, so only matching rows are sent)
         filtered_data = processed
         if self.table_filter != 'all':
-             filtered_data = [row for row in processed if row.get('health_status') == self.table_filter]
+            upload_id = self.current_data.get('id') if self.current_data else None
+            success, page = (False, None)
+            if upload_id:
+                success, page = self.api_client.get_rows(
+                    upload_id, health_status=self.table_filter, page_size=self.TABLE_PAGE_SIZE
+                )
+            if success:
+                filtered_data = page.get('results', [])
+            else:
+                filtered_data = [row for row in processed if row.get('health_status') == self.table_filter]
 
         if not filtered_data and processed:
             # If filtered result is empty but original is not, show placeholder or empty
@@ -1101,11 +1204,14 @@ class MainWindow(QMainWindow):
 
         # Bar chart: Average parameters
         ax2 = self.figure.add_subplot(122)
-        params = ['Flowrate', 'Pressure', 'Temp']
-        vals = [summary['avg_flowrate'], summary['avg_pressure'], summary['avg_temperature']]
-        ax2.bar(params, vals, color=[colors['accent_blue'], colors['accent_teal'], colors['accent_red']])
+        parameters = self._parameters(summary)
+        params = [p['name'] for p in parameters]
+        vals = [p.get('mean') or 0 for p in parameters]
+        ax2.bar(params, vals, color=self._parameter_colors(len(params)))
         ax2.set_title("Average Parameters", color=colors['text'], fontsize=11)
         ax2.tick_params(colors=colors['text'], labelsize=9)
+        if len(params) > 3:
+            ax2.tick_params(axis='x', labelrotation=45)
         ax2.spines['bottom'].set_color(colors['border'])
         ax2.spines['left'].set_color(colors['border'])
         ax2.spines['top'].set_color('none')
@@ -1115,26 +1221,53 @@ class MainWindow(QMainWindow):
         self.figure.tight_layout()
         self.canvas.draw()
 
+    def _draw_clusters(self, ax, clusters: dict, processed: list) -> None:
+        """Scatter of the rows coloured by operating regime, on the first two clustered parameters."""
+        colors = self.CHART_COLORS
+        parameters = clusters['parameters']
+        if len(parameters) < 2:
+            ax.axis('off')
+            return
+        x_name, y_name = parameters[:2]
+        palette = self._parameter_colors(clusters['k'])
+        # Large uploads: every n-th row is enough to show the regimes
+        step = max(1, len(processed) // self.MAX_CLUSTER_POINTS)
+        points = [r for r in processed[::step] if r.get('cluster') is not None and r.get(x_name) is not None and r.get(y_name) is not None]
+        for i, centroid in enumerate(clusters['centroids']):
+            members = [r for r in points if r['cluster'] == i]
+            ax.scatter([r[x_name] for r in members], [r[y_name] for r in members], s=6, alpha=0.5,
+                       color=palette[i], label=f"#{i + 1} ({clusters['sizes'][i]})")
+            ax.scatter([centroid[x_name]], [centroid[y_name]], s=120, marker='X', color=palette[i], edgecolors=colors['text'])
+        ax.set_xlabel(x_name, color=colors['text'], fontsize=8)
+        ax.set_ylabel(y_name, color=colors['text'], fontsize=8)
+        ax.set_title('Operating Regimes', color=colors['text'], fontsize=10)
+        ax.tick_params(colors=colors['text'], labelsize=8)
+        ax.legend(fontsize=7, facecolor=colors['border'], edgecolor=colors['accent_teal'], labelcolor=colors['text'])
+        ax.set_facecolor(colors['bg'])
+        for spine in ax.spines.values():
+            spine.set_color(colors['border'])
+
     def _update_advanced_charts(self, summary: dict, processed: list) -> None:
         """Update the advanced analytics charts."""
         self.advanced_figure.clear()
         colors = self.CHART_COLORS
+        # Clustered uploads get a third row for the operating-regime chart
+        clusters = summary.get('clusters')
+        rows = 3 if clusters else 2
 
         # Type comparison bar chart
         if 'type_comparison' in summary and self.view_settings['show_efficiency']:
-            ax1 = self.advanced_figure.add_subplot(221)
+            ax1 = self.advanced_figure.add_subplot(rows, 2, 1)
             type_comp = summary['type_comparison']
             types = list(type_comp.keys())
             x = np.arange(len(types))
-            width = 0.25
+            compared = self._parameters(summary)[:len(self.PARAMETER_COLORS)]
+            width = 0.75 / max(len(compared), 1)
 
-            flowrates = [type_comp[t]['avg_flowrate'] for t in types]
-            pressures = [type_comp[t]['avg_pressure'] for t in types]
-            temps = [type_comp[t]['avg_temperature'] for t in types]
-
-            ax1.bar(x - width, flowrates, width, label='Flowrate', color=colors['accent_blue'])
-            ax1.bar(x, pressures, width, label='Pressure', color=colors['accent_purple'])
-            ax1.bar(x + width, temps, width, label='Temperature', color=colors['accent_red'])
+            for i, (p, color) in enumerate(zip(compared, self._parameter_colors(len(compared)))):
+                avgs = [type_comp[t].get(f"avg_{p['name'].lower()}") or 0 for t in types]
+                offset = (i - (len(compared) - 1) / 2) * width
+                ax1.bar(x + offset, avgs, width, label=p['name'], color=color)
 
             ax1.set_title('Type Comparison', color=colors['text'], fontsize=10)
             ax1.set_xticks(x)
@@ -1147,9 +1280,9 @@ class MainWindow(QMainWindow):
 
         # Correlation heatmap
         if 'correlation_matrix' in summary and self.view_settings['show_correlation']:
-            ax2 = self.advanced_figure.add_subplot(222)
+            ax2 = self.advanced_figure.add_subplot(rows, 2, 2)
             corr_matrix = summary['correlation_matrix']
-            params = ['Flowrate', 'Pressure', 'Temperature']
+            params = [p['name'] for p in self._parameters(summary) if p['name'] in corr_matrix]
             corr_data = np.array([[corr_matrix[row][col] for col in params] for row in params])
 
             im = ax2.imshow(corr_data, cmap='RdBu_r', vmin=-1, vmax=1, aspect='auto')
@@ -1159,7 +1292,8 @@ class MainWindow(QMainWindow):
             ax2.set_yticklabels(params, fontsize=8)
             ax2.tick_params(colors=colors['text'], labelsize=8)
 
-            for i in range(len(params)):
+            # Values only fit in the cells of small matrices
+            for i in range(len(params) if len(params) <= 6 else 0):
                 for j in range(len(params)):
                     text_color = 'white' if abs(corr_data[i, j]) > 0.5 else colors['bg']
                     ax2.text(j, i, f'{corr_data[i, j]:.2f}', ha="center", va="center", color=text_color, fontsize=9)
@@ -1170,14 +1304,13 @@ class MainWindow(QMainWindow):
             cbar.ax.tick_params(colors=colors['text'], labelsize=7)
 
         # Standard deviation bars
-        ax3 = self.advanced_figure.add_subplot(223)
-        std_params = ['Flowrate', 'Pressure', 'Temp']
-        std_vals = [
-            summary.get('std_flowrate', 0),
-            summary.get('std_pressure', 0),
-            summary.get('std_temperature', 0)
-        ]
-        ax3.bar(std_params, std_vals, color=[colors['accent_blue'], colors['accent_purple'], colors['accent_red']])
+        ax3 = self.advanced_figure.add_subplot(rows, 2, 3)
+        parameters = self._parameters(summary)
+        std_params = [p['name'] for p in parameters]
+        std_vals = [p.get('std') or 0 for p in parameters]
+        ax3.bar(std_params, std_vals, color=self._parameter_colors(len(std_params)))
+        if len(std_params) > 3:
+            ax3.tick_params(axis='x', labelrotation=45)
         ax3.set_title('Standard Deviation', color=colors['text'], fontsize=10)
         ax3.tick_params(colors=colors['text'], labelsize=8)
         ax3.set_facecolor(colors['bg'])
@@ -1185,7 +1318,7 @@ class MainWindow(QMainWindow):
             spine.set_color(colors['border'])
 
         # Health status pie chart
-        ax4 = self.advanced_figure.add_subplot(224)
+        ax4 = self.advanced_figure.add_subplot(rows, 2, 4)
         if processed:
             health_counts = {'normal': 0, 'warning': 0, 'critical': 0}
             for row in processed:
@@ -1201,16 +1334,20 @@ class MainWindow(QMainWindow):
                     textprops={'color': colors['text'], 'size': 8})
             ax4.set_title('Health Status Distribution', color=colors['text'], fontsize=10)
 
+        # Operating regimes: rows on the first two clustered parameters, centroids marked
+        if clusters:
+            self._draw_clusters(self.advanced_figure.add_subplot(rows, 1, 3), clusters, processed)
+
         self.advanced_figure.tight_layout()
         self.advanced_canvas.draw()
 
         # Update stats summary text
         stats_text = (
             f"<b>Statistical Summary:</b><br>"
-            f"Flowrate StdDev: {summary.get('std_flowrate', 0):.2f} | "
-            f"Pressure StdDev: {summary.get('std_pressure', 0):.2f} | "
-            f"Temperature StdDev: {summary.get('std_temperature', 0):.2f}<br>"
+            + " | ".join(f"{p['name']} StdDev: {p.get('std') or 0:.2f}" for p in parameters)
+            + "<br>"
             f"<b>Equipment Types:</b> {len(summary.get('type_comparison', {}))} types | "
             f"<b>Outliers:</b> {len(summary.get('outliers', []))} detected"
+            + (f" | <b>Regimes:</b> {clusters['k']}" if clusters else "")
         )
         self.stats_summary_label.setText(stats_text)
@@ -22,6 +22,12 @@ api.saveAISummary = (uploadId, summaryText) => {
   return api.post(`/upload/${uploadId}/summary/`, { summary: summaryText });
 };
 
+// Server-side filtered/sorted/paginated rows of one upload.
+// params: { health_status, type, ordering, page_size, cursor, pressure__gt, ... }
+api.getUploadRows = (uploadId, params = {}) => {
+  return api.get(`/upload/${uploadId}/rows/`, { params });
+};
+
 // Token refresh interceptor
 api.interceptors.response.use(
   (response) => response,
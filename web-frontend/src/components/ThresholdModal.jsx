@@ -7,6 +7,8 @@ const ThresholdModal = ({ onClose }) => {
     const [settings, setSettings] = useState({
         warning_percentile: 0.75,
         outlier_iqr_multiplier: 1.5,
+        detection_mode: 'iqr',
+        per_type_bounds: false,
     });
     const [error, setError] = useState(null);
     const [success, setSuccess] = useState(null);
@@ -22,6 +24,8 @@ const ThresholdModal = ({ onClose }) => {
             setSettings({
                 warning_percentile: response.data.warning_percentile,
                 outlier_iqr_multiplier: response.data.outlier_iqr_multiplier,
+                detection_mode: response.data.detection_mode || 'iqr',
+                per_type_bounds: !!response.data.per_type_bounds,
             });
             setError(null);
         } catch (err) {
@@ -53,7 +57,9 @@ const ThresholdModal = ({ onClose }) => {
             // Send sanitized numbers
             const payload = {
                 warning_percentile: wp,
-                outlier_iqr_multiplier: iqr
+                outlier_iqr_multiplier: iqr,
+                detection_mode: settings.detection_mode,
+                per_type_bounds: settings.per_type_bounds
             };
 
             await api.put('thresholds/', payload);
@@ -145,6 +151,39 @@ const ThresholdModal = ({ onClose }) => {
                                     Controls sensitivity of anomaly detection (Lower = More Sensitive).
                                 </p>
                             </div>
+
+                            <div>
+                                <label className="block text-sm font-medium text-slate-700 dark:text-slate-300 mb-2">
+                                    Detection Mode
+                                </label>
+                                <select
+                                    value={settings.detection_mode}
+                                    onChange={(e) => setSettings({ ...settings, detection_mode: e.target.value })}
+                                    className="w-full px-3 py-2 bg-slate-50 dark:bg-slate-800 border border-slate-300 dark:border-slate-700 rounded-lg text-slate-900 dark:text-white focus:ring-2 focus:ring-primary focus:border-transparent outline-none transition-all"
+                                >
+                                    <option value="iqr">IQR (per parameter)</option>
+                                    <option value="robust_z">Robust z-score (per parameter)</option>
+                                    <option value="mahalanobis">Mahalanobis (multivariate)</option>
+                                </select>
+                                <p className="text-xs text-slate-500 mt-1">
+                                    Mahalanobis checks all parameters together and catches unusual combinations.
+                                </p>
+                            </div>
+
+                            <div>
+                                <label className="flex items-center gap-2 text-sm font-medium text-slate-700 dark:text-slate-300">
+                                    <input
+                                        type="checkbox"
+                                        checked={settings.per_type_bounds}
+                                        onChange={(e) => setSettings({ ...settings, per_type_bounds: e.target.checked })}
+                                        className="accent-primary"
+                                    />
+                                    Bounds per equipment type
+                                </label>
+                                <p className="text-xs text-slate-500 mt-1">
+                                    Judge each unit against its own Type instead of the whole file.
+                                </p>
+                            </div>
                         </div>
                     )}
                 </div>